@@ -0,0 +1,84 @@
+"""
+Tiempo de planificación de extremo a extremo contra número de entregas:
+VRP completo (matriz N×N + solve_cvrp) contra agrupar por vehículo
+(clustering.agrupar) + matriz y VRP por grupo (clustering.resolver_grupos).
+
+La flota crece con las entregas (un vehículo cada --por-vehiculo entregas),
+así que el tamaño de cada grupo se mantiene y el tiempo por entrega debería
+quedarse casi constante (escala casi lineal).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_clustering --entregas 250 500 1000 2000 4000 --completo-hasta 1000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.bench_tsp import _instancia
+from src.IA.clustering import METODOS, agrupar, resolver_grupos
+from src.IA.multistart import close_pool
+from src.IA.vrp import costo_total, solve_cvrp
+from src.services.matrix import compute_local_matrix
+
+
+def _flota(n, por_vehiculo, demanda):
+    k = max(1, -(-n // por_vehiculo))
+    # 15 % de holgura sobre la carga media por vehículo
+    capacidad = sum(demanda) / k * 1.15
+    return [capacidad] * k
+
+
+def _completo(puntos, demanda, capacidades, budget):
+    d = compute_local_matrix(puntos, puntos).distances
+    solucion = solve_cvrp(d, demanda, capacidades, time_budget_s=budget)
+    return costo_total(d, solucion["rutas"]), len(solucion["sin_asignar"])
+
+
+def _por_grupos(puntos, demanda, capacidades, metodo, budget):
+    particion = agrupar(puntos[1:], puntos[0], demanda[1:], capacidades, metodo)
+    grupos, problemas = [], []
+    for v, miembros in sorted(particion["grupos"].items()):
+        nodos = [0] + [i + 1 for i in miembros]
+        sub = [puntos[i] for i in nodos]
+        d = compute_local_matrix(sub, sub).distances
+        grupos.append(d)
+        problemas.append({"d": d, "demanda": [demanda[i] for i in nodos], "capacidad": capacidades[v]})
+    soluciones = resolver_grupos(problemas, budget)
+    costo = sum(costo_total(d, s["rutas"]) for d, s in zip(grupos, soluciones))
+    sin = len(particion["sin_asignar"]) + sum(len(s["sin_asignar"]) for s in soluciones)
+    return costo, sin
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entregas", type=int, nargs="+", default=[250, 500, 1000, 2000, 4000])
+    parser.add_argument("--por-vehiculo", type=int, default=60)
+    parser.add_argument("--metodos", nargs="+", default=list(METODOS), choices=METODOS)
+    parser.add_argument("--completo-hasta", type=int, default=1000, help="N máximo para el VRP completo")
+    parser.add_argument("--budget", type=float, default=None, help="presupuesto total de búsqueda (s)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'n':>6} {'metodo':>9} {'km':>9} {'sin asig':>8} {'tiempo':>8} {'ms/entrega':>10}")
+    try:
+        for n in args.entregas:
+            rng = random.Random(args.seed)
+            # Radio mayor con más entregas: densidad parecida
+            puntos = _instancia(n, rng, radio=0.08 * (n / 500) ** 0.5)
+            demanda = [0.0] + [rng.uniform(1, 20) for _ in range(n)]
+            capacidades = _flota(n, args.por_vehiculo, demanda[1:])
+
+            casos = [(m, lambda m=m: _por_grupos(puntos, demanda, capacidades, m, args.budget)) for m in args.metodos]
+            if n <= args.completo_hasta:
+                casos.insert(0, ("completo", lambda: _completo(puntos, demanda, capacidades, args.budget)))
+            for nombre, resolver in casos:
+                t0 = time.perf_counter()
+                costo, sin = resolver()
+                t = time.perf_counter() - t0
+                print(f"{n:>6} {nombre:>9} {costo / 1000:>9.1f} {sin:>8} {t:>7.2f}s {t / n * 1000:>10.2f}")
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
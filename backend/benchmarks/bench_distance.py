@@ -0,0 +1,64 @@
+"""
+Velocidad y error de los niveles de precisión de src.services.distance
+frente a geopy geodesic (elipsoide), con pares a escala de ciudad.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_distance --pares 2000 --lote 100000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from benchmarks.bench_tsp import BASE_LAT, BASE_LON
+from src.services.distance import PRECISIONS, distance_m, distance_matrix, one_to_many
+
+
+def _medir(fn, repeticiones=1):
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = fn()
+    return (time.perf_counter() - t0) / repeticiones, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pares", type=int, default=2000, help="pares para escalar y error")
+    parser.add_argument("--lote", type=int, default=100_000, help="puntos para uno→muchos")
+    parser.add_argument("--matriz", type=int, default=1000, help="lado de la matriz muchos→muchos")
+    parser.add_argument("--radio", type=float, default=0.15, help="grados alrededor de la base")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+
+    def punto():
+        return (BASE_LAT + rng.uniform(-args.radio, args.radio), BASE_LON + rng.uniform(-args.radio, args.radio))
+
+    pares = [(punto(), punto()) for _ in range(args.pares)]
+    # Los núcleos reciben arrays ya convertidos (como compute_local_matrix)
+    lote = np.array([punto() for _ in range(args.lote)])
+    matriz = np.array([punto() for _ in range(args.matriz)])
+
+    t_ref, ref = _medir(lambda: np.array([distance_m(a, b, "geodesic") for a, b in pares]))
+    print(f"escalar, {args.pares} pares (referencia geodesic: {t_ref / args.pares * 1e6:.1f} µs/par)")
+    print(f"{'precision':>16} {'µs/par':>8} {'vs geodesic':>12} {'error max':>10} {'error medio':>11}")
+    for p in PRECISIONS:
+        t, d = _medir(lambda: np.array([distance_m(a, b, p) for a, b in pares]))
+        error = np.abs(d - ref) / np.maximum(ref, 1.0)
+        print(f"{p:>16} {t / args.pares * 1e6:>8.2f} {t_ref / t:>11.0f}x {error.max():>10.4%} {error.mean():>11.4%}")
+    _, h = _medir(lambda: np.array([distance_m(a, b, "haversine") for a, b in pares]))
+    _, e = _medir(lambda: np.array([distance_m(a, b, "equirectangular") for a, b in pares]))
+    print(f"equirectangular vs haversine: error max {(np.abs(e - h) / np.maximum(h, 1.0)).max():.6%}")
+
+    print(f"\nvectorizado ({args.lote} uno→muchos, matriz {args.matriz}×{args.matriz})")
+    print(f"{'precision':>16} {'ns/punto 1→N':>13} {'ns/celda N×N':>13}")
+    for p in PRECISIONS[:2]:
+        t1, _ = _medir(lambda: one_to_many(lote[0], lote, p), 5)
+        t2, _ = _medir(lambda: distance_matrix(matriz, matriz, p), 3)
+        print(f"{p:>16} {t1 / args.lote * 1e9:>13.1f} {t2 / args.matriz ** 2 * 1e9:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Compara latencia en frío (conexión nueva por llamada, como antes) contra
+latencia en caliente (cliente compartido con keep-alive).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_http_client --calls 500
+"""
+import argparse
+import os
+import statistics
+import time
+
+import requests
+
+# Sin límite de QPS del cliente: aquí solo interesa el coste de la conexión
+os.environ.setdefault("MAPS_QPS_GEOCODE", "100000")
+
+from benchmarks.stub_server import start_stub_server
+from src.services import utils
+
+
+def _medir(fn, calls):
+    tiempos = []
+    for _ in range(calls):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return tiempos
+
+
+def _resumen(nombre, tiempos):
+    tiempos = sorted(tiempos)
+    p95 = tiempos[int(len(tiempos) * 0.95) - 1]
+    print(f"{nombre:<8} media={statistics.mean(tiempos):7.3f} ms  p50={statistics.median(tiempos):7.3f} ms  p95={p95:7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=300)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server()
+    url = f"{base_url}/maps/api/geocode/json"
+
+    def frio():
+        # Lo que hacía utils.get antes: requests.get sin sesión
+        r = requests.get(url, params={"address": "Av. Central 123", "key": "x"}, timeout=5)
+        r.raise_for_status()
+        return r.json()
+
+    def caliente():
+        return utils.get(url, {"address": "Av. Central 123"})
+
+    caliente()  # abre la conexión del pool
+    _resumen("frio", _medir(frio, args.calls))
+    _resumen("caliente", _medir(caliente, args.calls))
+
+    utils.close_client()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
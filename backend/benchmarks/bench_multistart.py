@@ -0,0 +1,69 @@
+"""
+Un arranque (tsp.solve_tsp) contra varios arranques en el pool de procesos
+(multistart.solve_tsp_multistart) con el mismo presupuesto de reloj de pared.
+
+La ganancia depende de los núcleos disponibles: con un solo núcleo los
+trabajadores se reparten la CPU y cada arranque mejora menos.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_multistart --clientes 100 200 400 --starts 8 --workers 4 --budget 2
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+from benchmarks.bench_tsp import _instancia
+from src.IA.multistart import close_pool, get_pool, solve_tsp_multistart
+from src.IA.tsp import _como_lista, solve_tsp
+from src.services.matrix import compute_local_matrix
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clientes", type=int, nargs="+", default=[100, 200, 400])
+    parser.add_argument("--instancias", type=int, default=3)
+    parser.add_argument("--starts", type=int, default=8)
+    # Arranques en vuelo a la vez; el pool tiene MULTISTART_WORKERS procesos
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--budget", type=float, default=2.0, help="segundos de reloj de pared")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    # Arrancar los procesos antes de medir (el pool es persistente en el servidor)
+    get_pool().submit(int).result()
+
+    rng = random.Random(args.seed)
+    print(f"cpus={os.cpu_count()} workers={args.workers} starts={args.starts}")
+    print(f"{'n':>5} {'1 arranque km':>14} {'t':>7} {'multi km':>9} {'t':>7} {'mejora':>7}")
+    try:
+        for n in args.clientes:
+            uno, multi, t_uno, t_multi = [], [], [], []
+            for _ in range(args.instancias):
+                puntos = _instancia(n, rng)
+                d = _como_lista(compute_local_matrix(puntos, puntos).distances)
+
+                t0 = time.perf_counter()
+                _, costo = solve_tsp(d, time_budget_s=args.budget)
+                t_uno.append(time.perf_counter() - t0)
+                uno.append(costo / 1000)
+
+                t0 = time.perf_counter()
+                _, costo = solve_tsp_multistart(
+                    d, starts=args.starts, workers=args.workers, time_budget_s=args.budget, seed=args.seed
+                )
+                t_multi.append(time.perf_counter() - t0)
+                multi.append(costo / 1000)
+
+            a, b = statistics.mean(uno), statistics.mean(multi)
+            print(
+                f"{n:>5} {a:>14.1f} {statistics.mean(t_uno):>6.2f}s {b:>9.1f} "
+                f"{statistics.mean(t_multi):>6.2f}s {1 - b / a:>7.1%}"
+            )
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
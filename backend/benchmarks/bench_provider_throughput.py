@@ -0,0 +1,85 @@
+"""
+Throughput de geocodificación, matriz de distancias y computeRoutes contra
+el stub local (sin cuota ni red).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_provider_throughput --latency-ms 40 --addresses 500 --matrix-size 100
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.stub_server import start_stub_server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--addresses", type=int, default=300)
+    parser.add_argument("--matrix-size", type=int, default=100)
+    parser.add_argument("--routes", type=int, default=50)
+    parser.add_argument("--stops", type=int, default=20)
+    parser.add_argument("--qps", type=float, default=1000.0, help="límite por producto del cliente")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate
+    )
+
+    # La configuración se lee al importar los servicios: fijarla antes
+    tmp = tempfile.mkdtemp()
+    os.environ.update({
+        "MAPS_BASE_URL": base_url,
+        "ROUTES_BASE_URL": base_url,
+        "MAPS_CACHE_PATH": os.path.join(tmp, "bench.sqlite3"),
+        "MAPS_BACKOFF_BASE": "0.01",
+        "GEOCODE_BATCH_QPS": str(args.qps),
+        **{f"MAPS_QPS_{p}": str(args.qps) for p in ("GEOCODE", "DIRECTIONS", "DISTANCEMATRIX", "ROUTES")},
+    })
+    from src.services import utils
+    from src.services.geocoding import geocode_batch
+    from src.services.matrix import compute_matrix
+    from src.services.optimize import optimize_route
+
+    print(f"stub {base_url}  latencia={args.latency_ms}±{args.jitter_ms} ms  errores={args.error_rate:.1%}")
+
+    direcciones = [f"Calle {i} #{i * 7}, Aguascalientes" for i in range(args.addresses)]
+    t0 = time.perf_counter()
+    resueltas = sum(1 for fila in geocode_batch(direcciones) if fila["latitud"] is not None)
+    dt = time.perf_counter() - t0
+    print(f"geocode_batch  {resueltas}/{args.addresses} en {dt:6.2f} s  → {args.addresses / dt:8.1f} dir/s")
+
+    t0 = time.perf_counter()
+    geocode_batch_cache = sum(1 for fila in geocode_batch(direcciones) if fila["cached"])
+    dt_cache = time.perf_counter() - t0
+    print(f"  (repetido)   {geocode_batch_cache} desde caché en {dt_cache * 1000:6.1f} ms")
+
+    n = args.matrix_size
+    puntos = [f"{21.80 + (i % 17) * 0.01:.5f},{-102.35 + (i // 17) * 0.01:.5f}" for i in range(n)]
+    t0 = time.perf_counter()
+    result = compute_matrix(puntos, puntos)
+    dt = time.perf_counter() - t0
+    print(f"compute_matrix {n}x{n} en {dt:6.2f} s  → {n * n / dt:8.0f} elementos/s  (completa={result.complete})")
+
+    t0 = time.perf_counter()
+    ok = 0
+    for r in range(args.routes):
+        ruta = [puntos[(r + k * 7) % n] for k in range(args.stops)]
+        try:
+            optimize_route(ruta)
+            ok += 1
+        except Exception:
+            pass
+    dt = time.perf_counter() - t0
+    print(f"computeRoutes  {ok}/{args.routes} en {dt:6.2f} s  → {args.routes / dt:8.1f} rutas/s")
+
+    print("métricas", utils.metrics())
+    utils.close_client()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
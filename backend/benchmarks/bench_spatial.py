@@ -0,0 +1,69 @@
+"""
+Construcción del recorrido por vecino más cercano: búsqueda lineal con
+geodesic (la versión anterior de IA/routing, O(n²)) contra el índice de
+rejilla de src.IA.spatial sobre coordenadas proyectadas.
+
+También compara la longitud del recorrido: la proyección local no debería
+cambiar la elección del vecino salvo empates prácticos.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_spatial --puntos 1000 10000 50000 --lineal-hasta 1000
+"""
+import argparse
+import random
+import time
+
+from geopy.distance import geodesic
+
+from benchmarks.bench_tsp import BASE_LAT, BASE_LON
+from src.IA.spatial import proyectar, recorrido_vecino_mas_cercano
+
+
+def _lineal(inicio, pendientes):
+    # IA/routing.calcular_ruta_nearest_neighbor antes del índice
+    pendientes = pendientes.copy()
+    ruta = [inicio]
+    while pendientes:
+        last = ruta[-1]
+        siguiente = min(pendientes, key=lambda p: geodesic(last, p).meters)
+        ruta.append(siguiente)
+        pendientes.remove(siguiente)
+    return ruta
+
+
+def _rejilla(inicio, pendientes):
+    puntos = [inicio] + pendientes
+    return [puntos[i] for i in recorrido_vecino_mas_cercano(proyectar(puntos, inicio), 0)]
+
+
+def _longitud_km(ruta):
+    return sum(geodesic(a, b).meters for a, b in zip(ruta, ruta[1:])) / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--puntos", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--lineal-hasta", type=int, default=1000, help="n máximo para la versión O(n²)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'n':>6} {'metodo':>8} {'tiempo':>9} {'µs/punto':>9} {'km':>9}")
+    for n in args.puntos:
+        rng = random.Random(args.seed)
+        # Radio mayor con más puntos: densidad parecida a una ciudad
+        radio = 0.08 * (n / 1000) ** 0.5
+        pendientes = [(BASE_LAT + rng.uniform(-radio, radio), BASE_LON + rng.uniform(-radio, radio)) for _ in range(n)]
+        inicio = (BASE_LAT, BASE_LON)
+
+        casos = [("rejilla", _rejilla)]
+        if n <= args.lineal_hasta:
+            casos.insert(0, ("lineal", _lineal))
+        for nombre, construir in casos:
+            t0 = time.perf_counter()
+            ruta = construir(inicio, pendientes)
+            t = time.perf_counter() - t0
+            print(f"{n:>6} {nombre:>8} {t:>8.3f}s {t / n * 1e6:>9.1f} {_longitud_km(ruta):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
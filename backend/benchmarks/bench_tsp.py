@@ -0,0 +1,62 @@
+"""
+Longitud del recorrido: orden del mock (por latitud) contra vecino más
+cercano y contra vecino más cercano + 2-opt + Or-opt, sobre la matriz local
+(haversine × factor de rodeo) de clientes aleatorios alrededor de la base.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_tsp --clientes 20 50 100 200 --instancias 5 --budget 2
+"""
+import argparse
+import random
+import statistics
+import time
+
+from src.IA.tsp import _como_lista, costo_ruta, mejorar, nearest_neighbor
+from src.services.matrix import compute_local_matrix
+
+# Misma base que crud.mock_optimize_route
+BASE_LAT = 20.9168
+BASE_LON = -101.3508
+
+
+def _instancia(n, rng, radio=0.08):
+    return [(BASE_LAT, BASE_LON)] + [
+        (BASE_LAT + rng.uniform(-radio, radio), BASE_LON + rng.uniform(-radio, radio)) for _ in range(n)
+    ]
+
+
+def _orden_mock(puntos):
+    # crud.mock_optimize_route: clientes por latitud descendente tras la base
+    return [0] + sorted(range(1, len(puntos)), key=lambda i: puntos[i][0], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clientes", type=int, nargs="+", default=[20, 50, 100, 200])
+    parser.add_argument("--instancias", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=2.0, help="segundos de búsqueda local")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'n':>5} {'mock km':>9} {'nn km':>9} {'2opt+or km':>11} {'vs mock':>8} {'vs nn':>7} {'tiempo':>8}")
+    for n in args.clientes:
+        mock, nn, opt, tiempos = [], [], [], []
+        for _ in range(args.instancias):
+            puntos = _instancia(n, rng)
+            d = _como_lista(compute_local_matrix(puntos, puntos).distances)
+            mock.append(costo_ruta(d, _orden_mock(puntos)) / 1000)
+
+            t0 = time.perf_counter()
+            ruta = nearest_neighbor(d)
+            nn.append(costo_ruta(d, ruta) / 1000)
+            ruta = mejorar(d, ruta, args.budget)
+            tiempos.append(time.perf_counter() - t0)
+            opt.append(costo_ruta(d, ruta) / 1000)
+
+        m, a, b = statistics.mean(mock), statistics.mean(nn), statistics.mean(opt)
+        print(f"{n:>5} {m:>9.1f} {a:>9.1f} {b:>11.1f} {1 - b / m:>8.1%} {1 - b / a:>7.1%} {statistics.mean(tiempos):>7.2f}s")
+
+
+if __name__ == "__main__":
+    main()
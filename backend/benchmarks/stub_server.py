@@ -0,0 +1,297 @@
+"""
+Servidor HTTP local que imita a Google Maps (geocode, directions,
+distancematrix y computeRoutes) para pruebas de carga sin cuota ni red.
+
+Modos:
+  synthetic  respuestas calculadas a partir de las coordenadas (por defecto)
+  record     reenvía al proveedor real y guarda las respuestas en el cassette
+  replay     sirve lo grabado; si falta, responde sintético (o 404 con --strict)
+
+Uso (desde backend/):
+    python -m benchmarks.stub_server --mode replay --cassette maps.json \\
+        --port 8765 --latency-ms 40 --jitter-ms 10 --error-rate 0.01
+
+y en el backend:
+    MAPS_BASE_URL=http://127.0.0.1:8765 ROUTES_BASE_URL=http://127.0.0.1:8765
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import polyline
+
+CENTRO = (21.8853, -102.2916)  # Aguascalientes
+VELOCIDAD_MS = 30 / 3.6
+RODEO = 1.3
+
+_COORD_RE = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$")
+
+
+# ============================
+# Respuestas sintéticas
+# ============================
+
+def coord_sintetica(texto):
+    """Coordenadas de una dirección: las explícitas tal cual, el resto por hash estable."""
+    match = _COORD_RE.match(texto or "")
+    if match:
+        return float(match.group(1)), float(match.group(2))
+    h = hashlib.sha1((texto or "").lower().encode()).digest()
+    return (
+        CENTRO[0] + (h[0] / 255 - 0.5) * 0.2,
+        CENTRO[1] + (h[1] / 255 - 0.5) * 0.2,
+    )
+
+
+def _haversine(a, b):
+    lat1, lng1, lat2, lng2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6_371_008.8 * math.asin(math.sqrt(h))
+
+
+def _tramo(a, b):
+    metros = int(_haversine(a, b) * RODEO)
+    return metros, int(metros / VELOCIDAD_MS)
+
+
+def geocode_sintetico(params):
+    lat, lng = coord_sintetica(params.get("address"))
+    return {"status": "OK", "results": [{"geometry": {"location": {"lat": lat, "lng": lng}}}]}
+
+
+def directions_sintetico(params):
+    a, b = coord_sintetica(params.get("origin")), coord_sintetica(params.get("destination"))
+    metros, segundos = _tramo(a, b)
+    return {
+        "status": "OK",
+        "routes": [{
+            "overview_polyline": {"points": polyline.encode([a, b])},
+            "legs": [{"distance": {"value": metros}, "duration": {"value": segundos}}],
+        }],
+    }
+
+
+def matrix_sintetico(params):
+    origins = [coord_sintetica(o) for o in params.get("origins", "").split("|")]
+    destinations = [coord_sintetica(d) for d in params.get("destinations", "").split("|")]
+    rows = []
+    for a in origins:
+        elements = []
+        for b in destinations:
+            metros, segundos = _tramo(a, b)
+            elements.append({"status": "OK", "distance": {"value": metros}, "duration": {"value": segundos}})
+        rows.append({"elements": elements})
+    return {"status": "OK", "rows": rows}
+
+
+def _waypoint(w):
+    if "location" in w:
+        ll = w["location"]["latLng"]
+        return ll["latitude"], ll["longitude"]
+    return coord_sintetica(w.get("address", {}).get("formattedAddress") or w.get("address"))
+
+
+def compute_routes_sintetico(body):
+    puntos = [_waypoint(body["origin"])]
+    puntos += [_waypoint(w) for w in body.get("intermediates", [])]
+    puntos.append(_waypoint(body["destination"]))
+
+    legs, total_m, total_s = [], 0, 0
+    for a, b in zip(puntos, puntos[1:]):
+        metros, segundos = _tramo(a, b)
+        total_m += metros
+        total_s += segundos
+        legs.append({
+            "distanceMeters": metros,
+            "duration": f"{segundos}s",
+            "startLocation": {"latLng": {"latitude": a[0], "longitude": a[1]}},
+            "endLocation": {"latLng": {"latitude": b[0], "longitude": b[1]}},
+            "polyline": {"encodedPolyline": polyline.encode([a, b])},
+        })
+    return {"routes": [{
+        "legs": legs,
+        "distanceMeters": total_m,
+        "duration": f"{total_s}s",
+        "polyline": {"encodedPolyline": polyline.encode(puntos)},
+        "optimizedIntermediateWaypointIndex": list(range(len(body.get("intermediates", [])))),
+    }]}
+
+
+SINTETICOS_GET = {
+    "/maps/api/geocode/json": geocode_sintetico,
+    "/maps/api/directions/json": directions_sintetico,
+    "/maps/api/distancematrix/json": matrix_sintetico,
+}
+
+
+# ============================
+# Cassette (grabación / reproducción)
+# ============================
+
+class Cassette:
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    @staticmethod
+    def key(method, path, params, body):
+        params = {k: v for k, v in params.items() if k != "key"}
+        return json.dumps([method, path, params, body], sort_keys=True)
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def put(self, key, status, payload):
+        with self._lock:
+            self.data[key] = {"status": status, "body": payload}
+            if self.path:
+                with open(self.path, "w", encoding="utf-8") as f:
+                    json.dump(self.data, f)
+
+
+# ============================
+# Servidor
+# ============================
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    # Configuración compartida (la fija start_stub_server)
+    mode = "synthetic"
+    cassette = Cassette()
+    strict = False
+    latency_ms = 0.0
+    jitter_ms = 0.0
+    error_rate = 0.0
+    quota_rate = 0.0
+    upstream_maps = "https://maps.googleapis.com"
+    upstream_routes = "https://routes.googleapis.com"
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _inyectar(self):
+        """Latencia y errores configurados. Devuelve True si ya respondió."""
+        if self.latency_ms or self.jitter_ms:
+            time.sleep(max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) / 1000)
+        r = random.random()
+        if r < self.error_rate:
+            self._send_json({"error": "injected"}, 500)
+            return True
+        if r < self.error_rate + self.quota_rate:
+            self._send_json({"status": "OVER_QUERY_LIMIT", "results": [], "rows": [], "routes": []})
+            return True
+        return False
+
+    def _grabar(self, method, path, params, body):
+        import requests  # solo hace falta en modo record
+
+        upstream = self.upstream_routes if "computeRoutes" in path else self.upstream_maps
+        headers = {k: v for k, v in self.headers.items() if k.lower().startswith("x-goog") or k.lower() == "content-type"}
+        r = requests.request(method, upstream + path, params=params, json=body, headers=headers, timeout=30)
+        return r.status_code, r.json()
+
+    def _sintetico(self, method, path, params, body):
+        if method == "POST" and "computeRoutes" in path:
+            return 200, compute_routes_sintetico(body)
+        fn = SINTETICOS_GET.get(path)
+        if fn is None:
+            return 404, {"error": f"ruta no soportada: {path}"}
+        return 200, fn(params)
+
+    def _responder(self, method, body=None):
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        if self._inyectar():
+            return
+
+        key = Cassette.key(method, url.path, params, body)
+        if self.mode == "record":
+            status, payload = self._grabar(method, url.path, params, body)
+            self.cassette.put(key, status, payload)
+        elif self.mode == "replay" and self.cassette.get(key):
+            grabado = self.cassette.get(key)
+            status, payload = grabado["status"], grabado["body"]
+        elif self.mode == "replay" and self.strict:
+            status, payload = 404, {"error": "sin grabación para esta petición"}
+        else:
+            status, payload = self._sintetico(method, url.path, params, body)
+        self._send_json(payload, status)
+
+    def do_GET(self):
+        self._responder("GET")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length)
+        self._responder("POST", json.loads(raw) if raw else None)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(host="127.0.0.1", port=0, handler=StubHandler, **config):
+    """Arranca el stub en un hilo y devuelve (server, base_url).
+
+    `config` sobrescribe los atributos del handler: mode, cassette, strict,
+    latency_ms, jitter_ms, error_rate, quota_rate.
+    """
+    if config:
+        handler = type("ConfiguredStubHandler", (handler,), config)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub local del proveedor de mapas")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--mode", choices=("synthetic", "record", "replay"), default="synthetic")
+    parser.add_argument("--cassette", help="archivo JSON de grabaciones")
+    parser.add_argument("--strict", action="store_true", help="en replay, 404 si no hay grabación")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fracción de respuestas 500")
+    parser.add_argument("--quota-rate", type=float, default=0.0, help="fracción de OVER_QUERY_LIMIT")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(
+        args.host,
+        args.port,
+        mode=args.mode,
+        cassette=Cassette(args.cassette),
+        strict=args.strict,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        quota_rate=args.quota_rate,
+    )
+    print(f"Stub ({args.mode}) escuchando en {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,36 @@
+import functools
+import math
+import os
+
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from datetime import datetime
 from typing import List
 from fastapi import HTTPException
 
 import models
 from auth import hash_password
+from src.services import geocode_pipeline, live_reopt, route_cache
+from src.services.matrix import compute_cached_matrix, compute_matrix
+from src.IA.clustering import agrupar, resolver_grupos
+from src.IA.multistart import solve_tsp_multistart
+from src.IA.tsp import TSP_TIME_BUDGET_S, _como_lista, insertar_faltantes, mejorar, solve_tsp
+from src.IA.vrp import solve_cvrp
+from src.IA.vrptw import solve_vrptw
 
 from schemas import (
     ClienteBase,
     VehiculoBase,
     RutaBase,
     RutaCreate,
+    EntregaBase,
+    SeguimientoBase,
     RepartidorBase,
     RepartidorCreate,
-    ResultadoRutaOptimizada
+    ResultadoRutaOptimizada,
+    PlanificarRutas,
+    RutaPlanificada,
+    ParadaPlanificada,
+    ResultadoPlanificacion,
 )
 
 
@@ -32,6 +48,14 @@ def mock_optimize_route(db: Session, cliente_ids: List[int]):
         .all()
     )
 
+    # Nunca se espera a geocodificar: los que aún no tienen coordenadas se
+    # encolan y quedan fuera de esta ruta
+    sin_coords = [c for c in clientes if c.latitud is None or c.longitud is None]
+    for c in sin_coords:
+        if c.direccion:
+            geocode_pipeline.encolar(c.id_cliente)
+    clientes = [c for c in clientes if c not in sin_coords]
+
     clientes_ordenados = sorted(
         clientes,
         key=lambda c: float(c.latitud) if c.latitud else -9999,
@@ -72,6 +96,497 @@ def mock_optimize_route(db: Session, cliente_ids: List[int]):
     return ruta
 
 
+# =======================================================
+# 🚚 OPTIMIZACIÓN DE RUTAS (TSP SOBRE MATRIZ DE DISTANCIAS)
+# =======================================================
+
+# Motor de la matriz: "hybrid" usa el proveedor y rellena huecos con haversine
+OPTIMIZE_MATRIX_ENGINE = os.getenv("OPTIMIZE_MATRIX_ENGINE", "hybrid")
+# Arranques del TSP por petición; con más de 1 se reparten en el pool de procesos
+OPTIMIZE_STARTS = int(os.getenv("OPTIMIZE_STARTS", "1"))
+
+
+def _clientes_con_coords(db: Session, cliente_ids: List[int]):
+    clientes = (
+        db.query(models.Cliente)
+        .filter(models.Cliente.id_cliente.in_(cliente_ids))
+        .all()
+    )
+    # Igual que el mock: sin coordenadas se encolan y no se espera por ellas
+    listos = []
+    for c in clientes:
+        if c.latitud is None or c.longitud is None:
+            if c.direccion:
+                geocode_pipeline.encolar(c.id_cliente)
+            continue
+        listos.append(c)
+    return listos
+
+
+def optimizar_ruta(
+    db: Session,
+    cliente_ids: List[int],
+    engine: str = OPTIMIZE_MATRIX_ENGINE,
+    time_budget_s: float = None,
+    regresar: bool = False,
+    starts: int = OPTIMIZE_STARTS,
+    usar_cache: bool = True,
+):
+    clientes = _clientes_con_coords(db, cliente_ids)
+
+    puntos = [(BASE_LAT, BASE_LON)] + [(float(c.latitud), float(c.longitud)) for c in clientes]
+    coords = {c.id_cliente: puntos[i] for i, c in enumerate(clientes, start=1)}
+    familia = route_cache.familia(puntos[0], engine, regresar)
+    clave = route_cache.clave(familia, coords)
+    # Una ruta resuelta con menos arranques o menos tiempo no le sirve a quien pide más
+    esfuerzo = (starts, TSP_TIME_BUDGET_S if time_budget_s is None else time_budget_s)
+    if usar_cache:
+        cacheada = route_cache.buscar(clave, esfuerzo)
+        if cacheada is not None:
+            return [ResultadoRutaOptimizada(**r) for r in cacheada["resultado"]]
+
+    matriz = compute_matrix(puntos, puntos, engine=engine)
+    # El arranque en caliente es una sola pasada de mejora: solo equivale a lo pedido con starts=1
+    tour = route_cache.tour_cercano(familia, coords, esfuerzo) if usar_cache and starts == 1 else None
+    if tour is not None:
+        # Casi el mismo conjunto: se parte del recorrido cacheado y solo se insertan las nuevas
+        indice = {c.id_cliente: i for i, c in enumerate(clientes, start=1)}
+        d = _como_lista(matriz.distances)
+        inicial = [0] + [indice[i] for i in tour] + ([0] if regresar else [])
+        faltan = sorted(set(indice.values()) - set(inicial))
+        orden = mejorar(d, insertar_faltantes(d, inicial, faltan), time_budget_s)
+    elif starts > 1:
+        orden, _ = solve_tsp_multistart(
+            matriz.distances, inicio=0, regresar=regresar, starts=starts, time_budget_s=time_budget_s
+        )
+    else:
+        orden, _ = solve_tsp(matriz.distances, inicio=0, regresar=regresar, time_budget_s=time_budget_s)
+
+    ruta = [
+        ResultadoRutaOptimizada(
+            nombre="BASE",
+            direccion="Centro",
+            latitud=BASE_LAT,
+            longitud=BASE_LON,
+            distancia_km=0,
+            duracion_min=0,
+        )
+    ]
+
+    distancia_total = 0.0
+    duracion_total = 0.0
+    for a, b in zip(orden, orden[1:]):
+        distancia_total = _sumar(distancia_total, _celda(matriz.distances[a, b]))
+        duracion_total = _sumar(duracion_total, _celda(matriz.durations[a, b]))
+        c = clientes[b - 1] if b else None
+
+        ruta.append(
+            ResultadoRutaOptimizada(
+                nombre=c.nombre if c else "BASE",
+                direccion=(c.direccion if c else "Centro") or "",
+                latitud=puntos[b][0],
+                longitud=puntos[b][1],
+                distancia_km=_km(distancia_total),
+                duracion_min=None if duracion_total is None else round(duracion_total / 60, 2),
+            )
+        )
+
+    route_cache.guardar(
+        familia, clave, coords, [clientes[i - 1].id_cliente for i in orden if i], [r.model_dump() for r in ruta],
+        esfuerzo,
+    )
+    return ruta
+
+
+def _celda(valor):
+    """Valor del tramo; None si el par no tiene dato (inalcanzable o hueco de la matriz con engine=google)."""
+    valor = float(valor)
+    return None if math.isnan(valor) else valor
+
+
+def _sumar(total, valor):
+    # Un tramo sin dato deja el total como desconocido en vez de sumarlo como 0
+    return None if total is None or valor is None else total + valor
+
+
+def _km(metros):
+    return None if metros is None else round(metros / 1000, 2)
+
+
+def _distancia_ruta(d, nodos):
+    """Metros de depósito → nodos → depósito; None si algún tramo no tiene dato."""
+    total = 0.0
+    for a, b in zip([0] + nodos, nodos + [0]):
+        total = _sumar(total, _celda(d[a][b]))
+    return total
+
+
+# =======================================================
+# 🚚 PLANIFICACIÓN MULTI-VEHÍCULO (CVRP)
+# =======================================================
+
+# Con miles de entregas la matriz del proveedor no es viable: local por defecto
+VRP_MATRIX_ENGINE = os.getenv("VRP_MATRIX_ENGINE", "local")
+# A partir de cuántas entregas se agrupa por vehículo antes de rutear (si no se pide método)
+PLAN_AGRUPAR_DESDE = int(os.getenv("PLAN_AGRUPAR_DESDE", "300"))
+PLAN_AGRUPAMIENTO = os.getenv("PLAN_AGRUPAMIENTO", "sweep")
+
+
+def planificar_rutas(
+    db: Session,
+    data: PlanificarRutas,
+    engine: str = VRP_MATRIX_ENGINE,
+    progreso=None,
+    workers: int = None,
+    al_guardar=None,
+):
+    """`progreso(etapa, porcentaje)` se llama entre etapas (lo usan los trabajos en segundo plano).
+
+    `al_guardar(ids_rutas)` se llama con las rutas ya insertadas y antes de
+    confirmar, para que quien llama registre lo suyo en la misma transacción.
+    """
+    progreso = progreso or (lambda etapa, porcentaje: None)
+    progreso("cargando", 5)
+    entregas = (
+        db.query(models.Entrega)
+        .filter(
+            models.Entrega.fecha_entrega == data.fecha,
+            models.Entrega.estado == models.EstadoEntrega.pendiente,
+        )
+        .order_by(models.Entrega.id_entrega)
+        .all()
+    )
+
+    query = db.query(models.Vehiculo)
+    if data.vehiculo_ids:
+        query = query.filter(models.Vehiculo.id_vehiculo.in_(data.vehiculo_ids))
+    vehiculos = query.order_by(models.Vehiculo.id_vehiculo).all()
+
+    # Sin coordenadas no se puede rutear: se encolan para geocodificar
+    sin_coordenadas, validas = [], []
+    for e in entregas:
+        c = e.cliente
+        if c is None or c.latitud is None or c.longitud is None:
+            sin_coordenadas.append(e.id_entrega)
+            if c is not None and c.direccion:
+                geocode_pipeline.encolar(c.id_cliente)
+            continue
+        validas.append(e)
+
+    # Demanda = peso total de los paquetes de cada entrega
+    pesos = dict(
+        db.query(models.Paquete.id_entrega, func.sum(models.Paquete.peso))
+        .join(models.Entrega, models.Entrega.id_entrega == models.Paquete.id_entrega)
+        .filter(
+            models.Entrega.fecha_entrega == data.fecha,
+            models.Entrega.estado == models.EstadoEntrega.pendiente,
+        )
+        .group_by(models.Paquete.id_entrega)
+        .all()
+    )
+
+    puntos = [(BASE_LAT, BASE_LON)] + [(float(e.cliente.latitud), float(e.cliente.longitud)) for e in validas]
+    demanda = [0.0] + [float(pesos.get(e.id_entrega) or 0) for e in validas]
+    metodo = data.agrupamiento.value if data.agrupamiento else None
+    if metodo is None and len(validas) >= PLAN_AGRUPAR_DESDE and len(vehiculos) > 1:
+        metodo = PLAN_AGRUPAMIENTO
+    if metodo:
+        solucion, distancias = _planificar_por_grupos(
+            data, validas, puntos, demanda, vehiculos, metodo, engine, progreso, workers
+        )
+    else:
+        solucion, distancias = _planificar_completo(data, validas, puntos, demanda, vehiculos, engine, progreso)
+    horarios = solucion.get("horarios", {})
+
+    rutas = []
+    for v, nodos in sorted(solucion["rutas"].items()):
+        vehiculo = vehiculos[v]
+        rutas.append({
+            "vehiculo": vehiculo,
+            "entregas": [validas[n - 1] for n in nodos],
+            "carga": sum(demanda[n] for n in nodos),
+            "distancia": distancias[v],
+            "paradas": [(validas[n - 1], horarios[n]) for n in nodos if n in horarios] or None,
+        })
+    sin_asignar = [validas[n - 1] for n in solucion["sin_asignar"]]
+
+    if data.guardar:
+        progreso("guardando", 95)
+        _guardar_planificacion(db, data, vehiculos, rutas, sin_asignar, al_guardar)
+
+    return ResultadoPlanificacion(
+        rutas=[
+            RutaPlanificada(
+                id_ruta=r.get("id_ruta"),
+                id_vehiculo=r["vehiculo"].id_vehiculo,
+                capacidad=r["vehiculo"].capacidad,
+                carga=round(r["carga"], 2),
+                distancia_km=_km(r["distancia"]),
+                entregas=[e.id_entrega for e in r["entregas"]],
+                paradas=[
+                    ParadaPlanificada(
+                        id_entrega=e.id_entrega,
+                        llegada=_hora(h["llegada"]),
+                        inicio_servicio=_hora(h["inicio_servicio"]),
+                        retraso_min=round(h["retraso"] / 60, 1),
+                    )
+                    for e, h in r["paradas"]
+                ] if r["paradas"] else None,
+            )
+            for r in rutas
+        ],
+        retraso_total_min=round(sum(h["retraso"] for h in horarios.values()) / 60, 1) if data.ventanas else None,
+        sin_asignar=[e.id_entrega for e in sin_asignar],
+        sin_coordenadas=sin_coordenadas,
+        distancia_total_km=_km(functools.reduce(_sumar, (r["distancia"] for r in rutas), 0.0)),
+    )
+
+
+def _planificar_completo(data: PlanificarRutas, validas, puntos, demanda, vehiculos, engine, progreso):
+    """Un solo VRP con la matriz N×N de todas las entregas."""
+    progreso("matriz", 15)
+    matriz = compute_matrix(puntos, puntos, engine=engine)
+    progreso("resolviendo", 30)
+    if data.ventanas:
+        solucion = solve_vrptw(
+            matriz.distances,
+            matriz.durations,
+            _ventanas(data, validas),
+            [0.0] + [data.servicio_min * 60] * len(validas),
+            demanda,
+            [v.capacidad for v in vehiculos],
+            salida=_segundos(data.hora_salida),
+            time_budget_s=data.time_budget_s,
+        )
+    else:
+        solucion = solve_cvrp(
+            matriz.distances,
+            demanda,
+            [v.capacidad for v in vehiculos],
+            time_budget_s=data.time_budget_s,
+        )
+    distancias = {v: _distancia_ruta(matriz.distances, nodos) for v, nodos in solucion["rutas"].items()}
+    return solucion, distancias
+
+
+def _planificar_por_grupos(
+    data: PlanificarRutas, validas, puntos, demanda, vehiculos, metodo, engine, progreso, workers
+):
+    """Un grupo por vehículo (clustering.agrupar) y cada grupo resuelto aparte con su propia matriz."""
+    progreso("agrupando", 10)
+    particion = agrupar(puntos[1:], puntos[0], demanda[1:], [v.capacidad for v in vehiculos], metodo)
+    ventanas = _ventanas(data, validas) if data.ventanas else None
+
+    grupos, problemas = [], []
+    for v, miembros in sorted(particion["grupos"].items()):
+        nodos = [0] + [i + 1 for i in miembros]
+        sub = [puntos[i] for i in nodos]
+        matriz = compute_matrix(sub, sub, engine=engine)
+        problema = {"d": matriz.distances, "demanda": [demanda[i] for i in nodos], "capacidad": vehiculos[v].capacidad}
+        if ventanas is not None:
+            problema.update(
+                t=matriz.durations,
+                ventanas=[ventanas[i] for i in nodos],
+                servicio=[0.0] + [data.servicio_min * 60] * len(miembros),
+                salida=_segundos(data.hora_salida),
+            )
+        grupos.append((v, nodos))
+        problemas.append(problema)
+    progreso("resolviendo", 30)
+
+    solucion = {"rutas": {}, "sin_asignar": [i + 1 for i in particion["sin_asignar"]], "horarios": {}}
+    distancias = {}
+    soluciones = resolver_grupos(
+        problemas,
+        data.time_budget_s,
+        workers,
+        al_avanzar=lambda hechos, total: progreso("resolviendo", 30 + 60 * hechos / total),
+    )
+    for (v, nodos), problema, parcial in zip(grupos, problemas, soluciones):
+        for ruta in parcial["rutas"].values():
+            solucion["rutas"][v] = [nodos[i] for i in ruta]
+            distancias[v] = _distancia_ruta(problema["d"], ruta)
+        solucion["sin_asignar"] += [nodos[i] for i in parcial["sin_asignar"]]
+        for i, h in parcial.get("horarios", {}).items():
+            solucion["horarios"][nodos[i]] = h
+    return solucion, distancias
+
+
+def _segundos(hora) -> float:
+    return hora.hour * 3600 + hora.minute * 60 + hora.second
+
+
+def _hora(segundos: float) -> str:
+    segundos = int(round(segundos))
+    return f"{segundos // 3600:02d}:{segundos % 3600 // 60:02d}"
+
+
+def _ventanas(data: PlanificarRutas, entregas: list) -> list:
+    """Jornada para el depósito; hora_entrega ± tolerancia para cada entrega (o la jornada si no tiene)."""
+    jornada = (_segundos(data.hora_salida), _segundos(data.fin_jornada))
+    tolerancia = data.tolerancia_min * 60
+    ventanas = [jornada]
+    for e in entregas:
+        if e.hora_entrega is None:
+            ventanas.append(jornada)
+        else:
+            hora = _segundos(e.hora_entrega)
+            ventanas.append((hora - tolerancia, hora + tolerancia))
+    return ventanas
+
+
+def _deshacer_rutas(db: Session, ids_rutas) -> None:
+    """Borra (sin confirmar) esas rutas y suelta sus entregas.
+
+    Una ruta con entregas que ya salieron (no pendientes) se conserva.
+    """
+    borrar = []
+    for id_ruta in ids_rutas:
+        entregas = db.query(models.Entrega).filter(models.Entrega.id_ruta == id_ruta).all()
+        if any(e.estado != models.EstadoEntrega.pendiente for e in entregas):
+            continue
+        for e in entregas:
+            e.id_ruta = None
+            e.orden = None
+        borrar.append(id_ruta)
+    if borrar:
+        db.flush()
+        db.query(models.Ruta).filter(models.Ruta.id_ruta.in_(borrar)).delete(synchronize_session="fetch")
+
+
+def _guardar_planificacion(
+    db: Session, data: PlanificarRutas, vehiculos: list, rutas: list, sin_asignar: list, al_guardar=None
+):
+    """Una Ruta por vehículo y sus entregas numeradas, todo en una transacción.
+
+    Las rutas de ese día y esos vehículos que sigan sin arrancar se reemplazan.
+    """
+    previas = (
+        db.query(models.Ruta.id_ruta)
+        .filter(
+            models.Ruta.fecha == data.fecha,
+            models.Ruta.id_vehiculo.in_([v.id_vehiculo for v in vehiculos]),
+        )
+        .all()
+    )
+    _deshacer_rutas(db, [id_ruta for (id_ruta,) in previas])
+
+    repartidores = data.repartidores or {}
+    for r in rutas:
+        vehiculo = r["vehiculo"]
+        nueva = models.Ruta(
+            nombre_ruta=f"{data.fecha.isoformat()} · {vehiculo.placas or vehiculo.id_vehiculo}",
+            id_repartidor=repartidores.get(vehiculo.id_vehiculo),
+            id_vehiculo=vehiculo.id_vehiculo,
+            fecha=data.fecha,
+            id_creador=data.id_creador,
+        )
+        db.add(nueva)
+        db.flush()
+        r["id_ruta"] = nueva.id_ruta
+        for orden, entrega in enumerate(r["entregas"], start=1):
+            entrega.id_ruta = nueva.id_ruta
+            entrega.orden = orden
+
+    # Lo que no cupo queda fuera de cualquier ruta vieja
+    for entrega in sin_asignar:
+        entrega.id_ruta = None
+        entrega.orden = None
+
+    if al_guardar:
+        al_guardar([r["id_ruta"] for r in rutas])
+    db.commit()
+
+
+# =======================================================
+# 🔁 RE-OPTIMIZACIÓN EN RUTA
+# =======================================================
+
+# Presupuesto de la búsqueda al reparar; el total debe quedar en ~200 ms
+REOPT_TIME_BUDGET_S = float(os.getenv("REOPT_TIME_BUDGET_S", "0.1"))
+# Lo que aún falta por visitar (fallido y entregado ya salieron de la ruta)
+ESTADOS_RESTANTES = (
+    models.EstadoEntrega.pendiente,
+    models.EstadoEntrega.en_camino,
+    models.EstadoEntrega.retrasado,
+)
+
+
+def _coords_entrega(entrega):
+    c = entrega.cliente
+    if c is None or c.latitud is None or c.longitud is None:
+        return None
+    return float(c.latitud), float(c.longitud)
+
+
+def _parada(entrega) -> dict:
+    lat, lng = _coords_entrega(entrega) or (None, None)
+    return {
+        "id_entrega": entrega.id_entrega,
+        "orden": entrega.orden,
+        "estado": entrega.estado.value,
+        "lat": lat,
+        "lng": lng,
+    }
+
+
+def reoptimizar_ruta(db: Session, id_ruta: int, posicion=None, time_budget_s: float = None):
+    """Reordena solo las paradas que faltan de una ruta, partiendo de donde está el repartidor.
+
+    Reparación incremental: el orden vigente es la solución inicial y se
+    mejora con 2-opt/Or-opt en un presupuesto corto. Las paradas "en_camino"
+    se respetan al frente. Sin `posicion` (GPS) se parte de la última parada
+    atendida o de la base. Los tramos salen de la caché (compute_cached_matrix).
+    Guarda el nuevo `orden` y devuelve el mensaje para el canal de la ruta.
+    """
+    entregas = (
+        db.query(models.Entrega)
+        .filter(models.Entrega.id_ruta == id_ruta)
+        .all()
+    )
+    entregas.sort(key=lambda e: (e.orden is None, e.orden or 0, e.id_entrega))
+    restantes = [e for e in entregas if e.estado in ESTADOS_RESTANTES]
+    atendidas = [e for e in entregas if e.estado not in ESTADOS_RESTANTES]
+
+    fijas = [e for e in restantes if e.estado == models.EstadoEntrega.en_camino]
+    libres = [e for e in restantes if e.estado != models.EstadoEntrega.en_camino and _coords_entrega(e)]
+    sin_coords = [e for e in restantes if e.estado != models.EstadoEntrega.en_camino and not _coords_entrega(e)]
+
+    fuente = "gps"
+    if posicion is None:
+        ultima = next((_coords_entrega(e) for e in reversed(atendidas) if _coords_entrega(e)), None)
+        posicion, fuente = (ultima, "ultima_parada") if ultima else ((BASE_LAT, BASE_LON), "base")
+    # Con paradas en camino, la búsqueda arranca en la última de ellas
+    inicio = next((_coords_entrega(e) for e in reversed(fijas) if _coords_entrega(e)), None) or posicion
+
+    distancia = 0.0
+    if libres:
+        puntos = [inicio] + [_coords_entrega(e) for e in libres]
+        distancias = compute_cached_matrix(puntos, puntos).distances
+        d = _como_lista(distancias)
+        orden = mejorar(d, list(range(len(puntos))), REOPT_TIME_BUDGET_S if time_budget_s is None else time_budget_s)
+        libres = [libres[i - 1] for i in orden[1:]]
+        # Del original, no del castigado: un tramo sin dato deja la distancia como desconocida
+        for a, b in zip(orden, orden[1:]):
+            distancia = _sumar(distancia, _celda(distancias[a][b]))
+
+    nuevo = fijas + libres + sin_coords
+    base = max((e.orden or 0 for e in atendidas), default=0)
+    for i, entrega in enumerate(nuevo, start=base + 1):
+        entrega.orden = i
+    db.commit()
+
+    return {
+        "type": "route_reoptimized",
+        "id_ruta": id_ruta,
+        "origen": {"lat": posicion[0], "lng": posicion[1], "fuente": fuente},
+        "orden": [e.id_entrega for e in nuevo],
+        "paradas": [_parada(e) for e in nuevo],
+        # Desde la última parada en camino (o la posición) hasta el final
+        "distancia_km": _km(distancia),
+    }
+
+
 # =======================================================
 # CRUD CLIENTES
 # =======================================================
@@ -88,14 +603,71 @@ def get_cliente(db: Session, id_cliente: int):
     )
 
 
+def _con_coords(cliente: ClienteBase) -> bool:
+    return cliente.latitud is not None and cliente.longitud is not None
+
+
 def create_cliente(db: Session, cliente: ClienteBase):
     nuevo = models.Cliente(**cliente.dict())
+    if _con_coords(cliente):
+        nuevo.coords_origen = geocode_pipeline.ORIGEN_MANUAL
+        nuevo.coords_actualizadas_en = func.now()
     db.add(nuevo)
     db.commit()
     db.refresh(nuevo)
+
+    # Sin coordenadas: se geocodifican en segundo plano
+    if not _con_coords(cliente) and nuevo.direccion:
+        geocode_pipeline.encolar(nuevo.id_cliente)
     return nuevo
 
 
+def update_cliente(db: Session, id_cliente: int, cliente: ClienteBase):
+    existente = get_cliente(db, id_cliente)
+    if not existente:
+        return None
+
+    cambio_direccion = (cliente.direccion or "") != (existente.direccion or "")
+    anteriores = (existente.latitud, existente.longitud)
+    # Un formulario que reenvía las coordenadas de siempre no las vuelve "manuales"
+    coords_nuevas = _con_coords(cliente) and (
+        anteriores[0] is None
+        or anteriores[1] is None
+        or (float(cliente.latitud), float(cliente.longitud)) != (float(anteriores[0]), float(anteriores[1]))
+    )
+
+    for campo, valor in cliente.dict().items():
+        setattr(existente, campo, valor)
+
+    geocodificar = False
+    if coords_nuevas:
+        existente.coords_origen = geocode_pipeline.ORIGEN_MANUAL
+        existente.coords_actualizadas_en = func.now()
+    elif cambio_direccion or not _con_coords(cliente):
+        # Dirección nueva (o coordenadas borradas): las viejas ya no valen
+        existente.latitud = None
+        existente.longitud = None
+        existente.coords_origen = None
+        existente.coords_actualizadas_en = None
+        geocodificar = bool(existente.direccion)
+
+    db.commit()
+    db.refresh(existente)
+
+    if geocodificar:
+        geocode_pipeline.encolar(existente.id_cliente)
+    return existente
+
+
+def delete_cliente(db: Session, id_cliente: int):
+    cliente = get_cliente(db, id_cliente)
+    if not cliente:
+        return None
+    db.delete(cliente)
+    db.commit()
+    return cliente
+
+
 # =======================================================
 # CRUD REPARTIDORES (Usuario con rol="repartidor")
 # =======================================================
@@ -243,6 +815,32 @@ def get_entrega(db: Session, id_entrega: int):
     )
 
 
+def update_entrega(db: Session, id_entrega: int, entrega_data: EntregaBase):
+    entrega = get_entrega(db, id_entrega)
+
+    if not entrega:
+        return None
+
+    anterior = entrega.estado
+    entrega.id_ruta = entrega_data.id_ruta
+    entrega.id_cliente = entrega_data.id_cliente
+    entrega.estado = entrega_data.estado
+    entrega.fecha_entrega = entrega_data.fecha_entrega
+    entrega.hora_entrega = entrega_data.hora_entrega
+    entrega.observaciones = entrega_data.observaciones
+
+    db.commit()
+    db.refresh(entrega)
+    _al_cambiar_estado(entrega, anterior)
+    return entrega
+
+
+def _al_cambiar_estado(entrega, anterior):
+    # Fallida o retrasada: se reordena lo que falta de su ruta (en segundo plano)
+    if entrega.id_ruta and entrega.estado != anterior and entrega.estado in live_reopt.DISPARADORES:
+        live_reopt.programar(entrega.id_ruta, entrega.id_entrega, entrega.estado.value)
+
+
 # =======================================================
 # CRUD PAQUETES
 # =======================================================
@@ -255,6 +853,28 @@ def get_paquetes(db: Session, skip: int = 0, limit: int = 200):
 # CRUD SEGUIMIENTO
 # =======================================================
 
+def create_seguimiento(db: Session, data: SeguimientoBase):
+    entrega = get_entrega(db, data.id_entrega)
+
+    if not entrega:
+        raise HTTPException(status_code=404, detail="Entrega no encontrada")
+
+    nuevo = models.Seguimiento(
+        id_entrega=data.id_entrega,
+        estado=data.estado,
+        comentario=data.comentario,
+    )
+    # El seguimiento es el evento; la entrega queda en ese estado
+    anterior = entrega.estado
+    entrega.estado = data.estado
+
+    db.add(nuevo)
+    db.commit()
+    db.refresh(nuevo)
+    _al_cambiar_estado(entrega, anterior)
+    return nuevo
+
+
 def get_seguimientos_por_entrega(db: Session, id_entrega: int):
     return (
         db.query(models.Seguimiento)
@@ -1,4 +1,5 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Request
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
@@ -27,6 +28,9 @@ from src.routes.seguimiento_route import router as seguimiento_router
 from src.routes.login_route import router as login_router
 from src.routes.system_route import router as system_router
 from src.routes.evidencias_route import router as evidencias_router
+from src.routes.planificacion_route import router as planificacion_router
+from src.services import live_reopt, planning_jobs
+from src.services.resilience import ProviderUnavailable
 
 
 
@@ -73,6 +77,24 @@ app.add_middleware(
 )
 
 
+# Proveedor de mapas con el circuito abierto → 503 en lugar de 500
+@app.exception_handler(ProviderUnavailable)
+async def provider_unavailable_handler(request: Request, exc: ProviderUnavailable):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+
+# Trabajos de planificación que quedaron pendientes o a medias al apagar
+@app.on_event("startup")
+def reanudar_planificacion():
+    planning_jobs.reanudar()
+
+
+@app.on_event("shutdown")
+def cerrar_planificacion():
+    planning_jobs.close_pool()
+    live_reopt.close_pool()
+
+
 # ============================
 # 5. DB Dependency
 # ============================
@@ -104,6 +126,7 @@ app.include_router(seguimiento_router)
 app.include_router(login_router)
 app.include_router(system_router)
 app.include_router(evidencias_router)
+app.include_router(planificacion_router)
 
 # CORRECCIÓN: elimina "backend/uploads"
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
@@ -2,6 +2,7 @@ from sqlalchemy import (
     Column, Integer, String, DECIMAL, ForeignKey,
     Date, Time, Text, Enum, DateTime
 )
+from sqlalchemy.dialects import mysql
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -69,6 +70,10 @@ class Cliente(Base):
     correo = Column(String(100))
     latitud = Column(DECIMAL(10, 7))
     longitud = Column(DECIMAL(10, 7))
+    # Frescura de las coordenadas: cuándo se fijaron y de dónde salieron
+    # ("manual", "geocode" o "sin_resultado")
+    coords_actualizadas_en = Column(DateTime, nullable=True)
+    coords_origen = Column(String(20), nullable=True)
 
 # ======================================================
 # VEHICULOS
@@ -141,6 +146,8 @@ class Entrega(Base):
     fecha_entrega = Column(Date)
     hora_entrega = Column(Time)
     observaciones = Column(Text)
+    # Posición de la entrega dentro de su ruta (la fija el planificador)
+    orden = Column(Integer, nullable=True)
 
     ruta = relationship("Ruta", back_populates="entregas", lazy="joined")
     cliente = relationship("Cliente", lazy="joined")
@@ -168,3 +175,29 @@ class Seguimiento(Base):
     comentario = Column(Text)
 
     entrega = relationship("Entrega", back_populates="seguimientos", lazy="joined")
+
+# ======================================================
+# TRABAJOS DE PLANIFICACIÓN
+# ======================================================
+
+class TrabajoPlanificacion(Base):
+    __tablename__ = "trabajos_planificacion"
+
+    id_trabajo = Column(Integer, primary_key=True, index=True)
+    fecha = Column(Date, index=True)
+    # Hash de los parámetros: el mismo pedido reutiliza el mismo trabajo
+    clave = Column(String(64), unique=True, index=True)
+    parametros = Column(Text)  # JSON de PlanificarRutas + engine
+    estado = Column(String(20), default="pendiente", index=True)
+    etapa = Column(String(30), nullable=True)
+    progreso = Column(Integer, default=0)
+    # JSON de ResultadoPlanificacion; con miles de entregas no cabe en TEXT
+    resultado = Column(Text().with_variant(mysql.LONGTEXT(), "mysql"), nullable=True)
+    # ids de las rutas guardadas por la última ejecución; se escribe en la misma
+    # transacción que las rutas, así un re-run las encuentra aunque se cancele al final
+    rutas_guardadas = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    intentos = Column(Integer, default=0)
+    creado_en = Column(DateTime, default=func.now())
+    iniciado_en = Column(DateTime, nullable=True)
+    terminado_en = Column(DateTime, nullable=True)
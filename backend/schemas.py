@@ -1,6 +1,6 @@
-from pydantic import BaseModel, ConfigDict, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
 from datetime import date, time, datetime
-from typing import Optional, List
+from typing import Dict, Optional, List
 import enum
 
 # ============================================
@@ -36,6 +36,8 @@ class ClienteBase(BaseModel):
 
 class Cliente(ClienteBase):
     id_cliente: int
+    coords_actualizadas_en: Optional[datetime] = None
+    coords_origen: Optional[str] = None
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -130,7 +132,7 @@ class RutaCreate(RutaBase):
 class Ruta(BaseModel):
     id_ruta: int
     nombre_ruta: str
-    id_repartidor: int
+    id_repartidor: Optional[int]  # las rutas planificadas pueden no tenerlo aún
     id_vehiculo: Optional[int]
     fecha: date
     id_creador: int
@@ -142,6 +144,11 @@ class RutaCreateResponse(Ruta):
     pass
 
 
+class PosicionGPS(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lng: float = Field(ge=-180, le=180)
+
+
 # ============================================
 # ENTREGAS
 # ============================================
@@ -157,6 +164,7 @@ class EntregaBase(BaseModel):
 
 class Entrega(EntregaBase):
     id_entrega: int
+    orden: Optional[int] = None
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -227,6 +235,68 @@ class ListaClientesOptimizar(BaseModel):
     cliente_ids: List[int]
 
 
+class MetodoAgrupamiento(str, enum.Enum):
+    sweep = "sweep"
+    kmeans = "kmeans"
+    kmedoids = "kmedoids"
+
+
+class PlanificarRutas(BaseModel):
+    fecha: date
+    id_creador: int
+    vehiculo_ids: Optional[List[int]] = None  # None = todos
+    repartidores: Optional[Dict[int, int]] = None  # id_vehiculo → id_repartidor
+    guardar: bool = False
+    time_budget_s: Optional[float] = None
+    # Ventanas de tiempo: hora_entrega ± tolerancia, con tiempo de servicio por parada
+    ventanas: bool = False
+    tolerancia_min: int = 30
+    servicio_min: float = 5
+    hora_salida: time = time(8, 0)
+    fin_jornada: time = time(20, 0)
+    # Partir las entregas en un grupo por vehículo antes de rutear (None = automático por volumen)
+    agrupamiento: Optional[MetodoAgrupamiento] = None
+
+
+class ParadaPlanificada(BaseModel):
+    id_entrega: int
+    llegada: str  # HH:MM
+    inicio_servicio: str
+    retraso_min: float
+
+
+class RutaPlanificada(BaseModel):
+    id_ruta: Optional[int] = None
+    id_vehiculo: int
+    capacidad: Optional[float]
+    carga: float
+    distancia_km: Optional[float]  # None si algún tramo no tiene dato (inalcanzable)
+    entregas: List[int]  # id_entrega en orden de visita
+    paradas: Optional[List[ParadaPlanificada]] = None
+
+
+class ResultadoPlanificacion(BaseModel):
+    rutas: List[RutaPlanificada]
+    sin_asignar: List[int]
+    sin_coordenadas: List[int]
+    distancia_total_km: Optional[float]
+    retraso_total_min: Optional[float] = None
+
+
+class TrabajoPlanificacion(BaseModel):
+    id_trabajo: int
+    fecha: date
+    estado: str  # pendiente | ejecutando | terminado | error | cancelado
+    etapa: Optional[str] = None
+    progreso: int = 0
+    error: Optional[str] = None
+    intentos: int = 0
+    creado_en: Optional[datetime] = None
+    iniciado_en: Optional[datetime] = None
+    terminado_en: Optional[datetime] = None
+    resultado: Optional[ResultadoPlanificacion] = None
+
+
 # ============================================
 # CAMBIO PASSWORD
 # ============================================
@@ -0,0 +1,182 @@
+"""
+Optimización "anytime" del orden de entregas.
+
+POST /optimize_jobs devuelve un id enseguida; la búsqueda local corre en un
+hilo y cada mejora (como mucho una cada ANYTIME_INTERVALO_S) se publica por
+/ws como {"type": "opt_progress", ...}. El despachador puede aceptar la mejor
+solución hasta el momento (se corta la búsqueda y se aplica como ruta activa)
+o cancelar (se corta y no se aplica). Si nadie interviene, al agotar el
+presupuesto se aplica la mejor encontrada (salvo aplicar=False).
+"""
+import asyncio
+import os
+import threading
+import time
+import uuid
+
+from backend.src.services.matrix import compute_matrix_async
+from .estado import state
+from .tsp import _como_lista, costo_ruta, mejorar, nearest_neighbor
+from .websocket import difundir, manejadores
+
+ANYTIME_TIME_BUDGET_S = float(os.getenv("ANYTIME_TIME_BUDGET_S", "30"))
+# Intervalo mínimo entre soluciones publicadas (segundos)
+ANYTIME_INTERVALO_S = float(os.getenv("ANYTIME_INTERVALO_S", "0.5"))
+ANYTIME_MATRIX_ENGINE = os.getenv("ANYTIME_MATRIX_ENGINE", "local")
+# Trabajos terminados que se conservan para consultar su estado
+ANYTIME_MAX_TRABAJOS = int(os.getenv("ANYTIME_MAX_TRABAJOS", "20"))
+
+EJECUTANDO = "ejecutando"
+TERMINADO = "terminado"
+ACEPTADO = "aceptado"
+CANCELADO = "cancelado"
+ERROR = "error"
+
+
+class Trabajo:
+    def __init__(self, puntos, regresar=False, time_budget_s=None, aplicar=True):
+        self.id = uuid.uuid4().hex[:12]
+        self.puntos = puntos  # [inicio, entrega0, entrega1, ...]
+        self.regresar = regresar
+        self.time_budget_s = ANYTIME_TIME_BUDGET_S if time_budget_s is None else float(time_budget_s)
+        self.aplicar = aplicar
+        self.estado = EJECUTANDO
+        self.error = None
+        self.orden = None  # índices de `puntos`, empezando por 0
+        self.costo_m = None
+        self.version = 0
+        self.aceptar = False
+        self.creado = time.time()
+        self.detener = threading.Event()
+        self.tarea = None
+
+    def resumen(self) -> dict:
+        return {
+            "job_id": self.id,
+            "estado": self.estado,
+            "version": self.version,
+            "costo_m": None if self.costo_m is None else round(self.costo_m, 1),
+            "orden": None if self.orden is None else [i - 1 for i in self.orden[1:] if i != 0],
+            "error": self.error,
+        }
+
+    def _mensaje_progreso(self) -> dict:
+        return {
+            "type": "opt_progress",
+            **self.resumen(),
+            "paradas": [{"lat": self.puntos[i][0], "lng": self.puntos[i][1]} for i in self.orden],
+        }
+
+
+def _trabajos() -> dict:
+    return state["trabajos_opt"]
+
+
+def _purgar():
+    terminados = sorted(
+        (t for t in _trabajos().values() if t.estado != EJECUTANDO), key=lambda t: t.creado
+    )
+    for t in terminados[:max(0, len(terminados) - ANYTIME_MAX_TRABAJOS)]:
+        del _trabajos()[t.id]
+
+
+def crear(puntos, al_terminar, regresar=False, time_budget_s=None, aplicar=True) -> Trabajo:
+    """Lanza el trabajo; `al_terminar(ruta_logica)` es una corrutina que aplica la ruta."""
+    _purgar()
+    trabajo = Trabajo(puntos, regresar, time_budget_s, aplicar)
+    _trabajos()[trabajo.id] = trabajo
+    trabajo.tarea = asyncio.create_task(_ejecutar(trabajo, al_terminar))
+    return trabajo
+
+
+def obtener(job_id: str):
+    return _trabajos().get(job_id)
+
+
+def aceptar(job_id: str) -> bool:
+    trabajo = obtener(job_id)
+    if not trabajo or trabajo.estado != EJECUTANDO:
+        return False
+    trabajo.aceptar = True
+    trabajo.detener.set()
+    return True
+
+
+def cancelar(job_id: str) -> bool:
+    trabajo = obtener(job_id)
+    if not trabajo or trabajo.estado != EJECUTANDO:
+        return False
+    trabajo.estado = CANCELADO
+    trabajo.detener.set()
+    return True
+
+
+def _buscar(trabajo: Trabajo, d, publicar):
+    """Hilo de búsqueda: publica la solución inicial y después las mejoras espaciadas."""
+    ultimo = 0.0
+
+    def registrar(ruta, forzar=False):
+        nonlocal ultimo
+        ahora = time.perf_counter()
+        if not forzar and ahora - ultimo < ANYTIME_INTERVALO_S:
+            return
+        ultimo = ahora
+        trabajo.orden = list(ruta)
+        trabajo.costo_m = costo_ruta(d, ruta)
+        trabajo.version += 1
+        publicar(trabajo._mensaje_progreso())
+
+    ruta = nearest_neighbor(d, 0, trabajo.regresar)
+    registrar(ruta, forzar=True)
+    ruta = mejorar(d, ruta, trabajo.time_budget_s, al_mejorar=registrar, detener=trabajo.detener.is_set)
+    if ruta != trabajo.orden:
+        registrar(ruta, forzar=True)
+
+
+async def _ejecutar(trabajo: Trabajo, al_terminar):
+    loop = asyncio.get_running_loop()
+    cola = asyncio.Queue()
+
+    async def publicador():
+        # Una sola corrutina envía, así los mensajes salen en orden
+        while (mensaje := await cola.get()) is not None:
+            await difundir(mensaje)
+
+    envio = asyncio.create_task(publicador())
+    try:
+        matriz = await compute_matrix_async(trabajo.puntos, trabajo.puntos, engine=ANYTIME_MATRIX_ENGINE)
+        if trabajo.estado != CANCELADO:
+            # Si se aceptó mientras se calculaba la matriz, queda el vecino más cercano
+            await asyncio.to_thread(
+                _buscar, trabajo, _como_lista(matriz.distances),
+                lambda m: loop.call_soon_threadsafe(cola.put_nowait, m),
+            )
+    except Exception as e:
+        trabajo.estado, trabajo.error = ERROR, str(e)
+    finally:
+        cola.put_nowait(None)
+        await envio
+
+    try:
+        if trabajo.estado == EJECUTANDO:
+            trabajo.estado = ACEPTADO if trabajo.aceptar else TERMINADO
+            if trabajo.aceptar or trabajo.aplicar:
+                ruta_logica = [trabajo.puntos[i] for i in trabajo.orden]
+                await al_terminar(ruta_logica)
+    except Exception as e:
+        trabajo.estado, trabajo.error = ERROR, f"No se pudo aplicar la ruta: {e}"
+    finally:
+        # El cliente espera opt_done pase lo que pase al aplicar
+        await difundir({"type": "opt_done", **trabajo.resumen()})
+
+
+def _comando(tipo, accion):
+    def manejar(mensaje):
+        job_id = str(mensaje.get("job_id", ""))
+        return {"type": "opt_ack", "comando": tipo, "job_id": job_id, "ok": accion(job_id)}
+    return manejar
+
+
+# Desde /ws: {"type": "opt_accept" | "opt_cancel", "job_id": ...}
+manejadores["opt_accept"] = _comando("opt_accept", aceptar)
+manejadores["opt_cancel"] = _comando("opt_cancel", cancelar)
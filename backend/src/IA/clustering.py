@@ -0,0 +1,285 @@
+"""
+Partición de las entregas del día en un grupo por vehículo antes de rutear.
+
+Con miles de entregas, resolver el VRP completo (y pedir la matriz N×N) no
+escala. Aquí se reparten las entregas en grupos compactos y balanceados, uno
+por vehículo, y cada grupo se resuelve por separado y en paralelo con una
+matriz (1 + n/k)² en vez de N².
+
+Métodos (sobre coordenadas proyectadas a metros alrededor del depósito):
+- "sweep": barrido angular desde el depósito, cortando sectores por carga.
+- "kmeans": centros de Lloyd y asignación con capacidad.
+- "kmedoids": k-medoids con asignación por capacidad (regret) y balance.
+
+La asignación respeta la capacidad de cada vehículo y un máximo de paradas
+por grupo (reparto proporcional a la capacidad + CLUSTER_HOLGURA).
+"""
+import math
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, BrokenExecutor, CancelledError, wait
+
+import numpy as np
+
+from src.IA.multistart import MULTISTART_WORKERS, enviar
+from src.IA.spatial import proyectar
+from src.IA.vrp import VRP_TIME_BUDGET_S, solve_cvrp
+from src.IA.vrptw import VRPTW_TIME_BUDGET_S, solve_vrptw
+
+METODOS = ("sweep", "kmeans", "kmedoids")
+
+# Margen sobre el reparto proporcional de paradas por grupo
+CLUSTER_HOLGURA = float(os.getenv("CLUSTER_HOLGURA", "0.2"))
+CLUSTER_ITERACIONES = int(os.getenv("CLUSTER_ITERACIONES", "20"))
+# Candidatos a medoide por grupo en cada iteración (muestra si el grupo es mayor)
+CLUSTER_CANDIDATOS_MEDOIDE = int(os.getenv("CLUSTER_CANDIDATOS_MEDOIDE", "200"))
+# Procesos para resolver los grupos (1 = en el proceso actual)
+CLUSTER_WORKERS = int(os.getenv("CLUSTER_WORKERS", str(MULTISTART_WORKERS)))
+# Margen sobre el tiempo esperado antes de dejar de esperar al pool
+CLUSTER_MARGEN_S = float(os.getenv("CLUSTER_MARGEN_S", "10"))
+# Presupuesto por grupo al resolver en proceso los que el pool no devolvió
+CLUSTER_RESPALDO_S = float(os.getenv("CLUSTER_RESPALDO_S", "0.5"))
+
+
+def _pesos_vehiculo(capacidades) -> np.ndarray:
+    caps = np.asarray(capacidades, dtype=float)
+    if np.all(np.isfinite(caps)) and caps.sum() > 0:
+        return caps / caps.sum()
+    return np.full(len(caps), 1.0 / len(caps))
+
+
+def _max_paradas(n, capacidades) -> np.ndarray:
+    return np.ceil(n * _pesos_vehiculo(capacidades) * (1 + CLUSTER_HOLGURA)).astype(int)
+
+
+def _distancias(xy, centros) -> np.ndarray:
+    return np.sqrt(((xy[:, None, :] - centros[None, :, :]) ** 2).sum(axis=2))
+
+
+def sweep(xy, demanda, capacidades) -> np.ndarray:
+    """Etiqueta de vehículo por punto (-1 = no cupo), cortando el barrido por carga proporcional."""
+    n, k = len(xy), len(capacidades)
+    etiquetas = np.full(n, -1)
+    if n == 0:
+        return etiquetas
+    angulos = np.arctan2(xy[:, 1], xy[:, 0])
+    orden = np.argsort(angulos)
+    # Empezar tras el mayor hueco angular para no partir un grupo natural
+    saltos = np.diff(np.concatenate([angulos[orden], angulos[orden[:1]] + 2 * np.pi]))
+    orden = np.roll(orden, -(int(np.argmax(saltos)) + 1))
+
+    balance = demanda if demanda.sum() > 0 else np.ones(n)
+    objetivo = balance.sum() * _pesos_vehiculo(capacidades)
+    v, carga, acumulado = 0, 0.0, 0.0
+    for i in orden:
+        # Pasar al siguiente vehículo al alcanzar su parte o si ya no cabe
+        while v < k - 1 and (acumulado >= objetivo[v] or carga + demanda[i] > capacidades[v]):
+            v, carga, acumulado = v + 1, 0.0, 0.0
+        if carga + demanda[i] > capacidades[v]:
+            continue
+        etiquetas[i] = v
+        carga += demanda[i]
+        acumulado += balance[i]
+    return etiquetas
+
+
+def _kmeans_pp(xy, k, rng) -> np.ndarray:
+    """Índices de k semillas con k-means++."""
+    n = len(xy)
+    elegidos = [int(rng.integers(n))]
+    d2 = ((xy - xy[elegidos[0]]) ** 2).sum(axis=1)
+    for _ in range(1, min(k, n)):
+        total = d2.sum()
+        i = int(rng.choice(n, p=d2 / total)) if total > 0 else int(rng.integers(n))
+        elegidos.append(i)
+        d2 = np.minimum(d2, ((xy - xy[i]) ** 2).sum(axis=1))
+    return np.array(elegidos)
+
+
+def asignar_con_capacidad(dist, demanda, capacidades, max_paradas) -> np.ndarray:
+    """Asignación voraz por "regret": primero los puntos que más pierden si no van a su grupo más cercano."""
+    n, k = dist.shape
+    etiquetas = np.full(n, -1)
+    if k == 1:
+        preferencias = np.zeros((n, 1), dtype=int)
+        prioridad = np.argsort(dist[:, 0])
+    else:
+        preferencias = np.argsort(dist, axis=1)
+        ordenadas = np.take_along_axis(dist, preferencias[:, :2], axis=1)
+        prioridad = np.argsort(-(ordenadas[:, 1] - ordenadas[:, 0]), kind="stable")
+    carga = np.zeros(k)
+    paradas = np.zeros(k, dtype=int)
+    for i in prioridad:
+        for g in preferencias[i]:
+            if paradas[g] < max_paradas[g] and carga[g] + demanda[i] <= capacidades[g]:
+                etiquetas[i] = g
+                carga[g] += demanda[i]
+                paradas[g] += 1
+                break
+    return etiquetas
+
+
+def kmeans(xy, demanda, capacidades, seed=0) -> np.ndarray:
+    """Lloyd para los centros; después asignación con capacidad (centro más cargado → vehículo más grande)."""
+    n, k = len(xy), len(capacidades)
+    if n == 0:
+        return np.full(0, -1)
+    rng = np.random.default_rng(seed)
+    centros = xy[_kmeans_pp(xy, k, rng)]
+    for _ in range(CLUSTER_ITERACIONES):
+        etiquetas = np.argmin(_distancias(xy, centros), axis=1)
+        nuevos = np.array([
+            xy[etiquetas == g].mean(axis=0) if np.any(etiquetas == g) else centros[g]
+            for g in range(len(centros))
+        ])
+        if np.allclose(nuevos, centros):
+            break
+        centros = nuevos
+    etiquetas = np.argmin(_distancias(xy, centros), axis=1)
+
+    cargas = np.array([demanda[etiquetas == g].sum() + (etiquetas == g).sum() * 1e-9 for g in range(len(centros))])
+    caps = np.asarray(capacidades, dtype=float)
+    vehiculos = np.argsort(-caps, kind="stable")[:len(centros)]
+    centros = centros[np.argsort(-cargas, kind="stable")]
+    # centros[j] → vehiculos[j]; los vehículos sobrantes (k > n) quedan vacíos
+    por_vehiculo = np.full((k, 2), np.inf)
+    por_vehiculo[vehiculos] = centros
+    return asignar_con_capacidad(_distancias(xy, por_vehiculo), demanda, caps, _max_paradas(n, caps))
+
+
+def kmedoids(xy, demanda, capacidades, seed=0) -> np.ndarray:
+    """k-medoids alternando asignación con capacidad y mejor medoide de cada grupo."""
+    n, k = len(xy), len(capacidades)
+    if n == 0:
+        return np.full(0, -1)
+    rng = np.random.default_rng(seed)
+    caps = np.asarray(capacidades, dtype=float)
+    maximos = _max_paradas(n, caps)
+    medoides = np.full(k, -1)
+    semillas = _kmeans_pp(xy, k, rng)
+    medoides[:len(semillas)] = semillas
+
+    etiquetas = None
+    for _ in range(CLUSTER_ITERACIONES):
+        centros = np.where(medoides[:, None] >= 0, xy[np.maximum(medoides, 0)], np.inf)
+        etiquetas = asignar_con_capacidad(_distancias(xy, centros), demanda, caps, maximos)
+        nuevos = medoides.copy()
+        for g in range(k):
+            miembros = np.flatnonzero(etiquetas == g)
+            if len(miembros) == 0:
+                continue
+            candidatos = miembros
+            if len(miembros) > CLUSTER_CANDIDATOS_MEDOIDE:
+                candidatos = rng.choice(miembros, CLUSTER_CANDIDATOS_MEDOIDE, replace=False)
+                if medoides[g] in miembros:
+                    candidatos = np.append(candidatos, medoides[g])
+            costos = _distancias(xy[miembros], xy[candidatos]).sum(axis=0)
+            nuevos[g] = candidatos[int(np.argmin(costos))]
+        if np.array_equal(nuevos, medoides):
+            break
+        medoides = nuevos
+    return etiquetas
+
+
+def agrupar(puntos, depot, demanda, capacidades, metodo: str = "kmedoids", seed: int = 0) -> dict:
+    """Reparte `puntos` (sin el depósito) entre los vehículos.
+
+    Devuelve {"grupos": {vehiculo: [índices de puntos]}, "sin_asignar": [índices]}.
+    """
+    if metodo not in METODOS:
+        raise ValueError(f"metodo debe ser uno de {METODOS}")
+    caps = [float("inf") if c is None else float(c) for c in capacidades]
+    demanda = np.asarray([float(x or 0) for x in demanda])
+    if not caps:
+        return {"grupos": {}, "sin_asignar": list(range(len(puntos)))}
+    xy = proyectar(puntos, depot) if len(puntos) else np.zeros((0, 2))
+    if metodo == "sweep":
+        etiquetas = sweep(xy, demanda, caps)
+    elif metodo == "kmeans":
+        etiquetas = kmeans(xy, demanda, caps, seed)
+    else:
+        etiquetas = kmedoids(xy, demanda, caps, seed)
+    grupos = {}
+    for i, g in enumerate(etiquetas):
+        if g >= 0:
+            grupos.setdefault(int(g), []).append(i)
+    return {"grupos": grupos, "sin_asignar": [int(i) for i in np.flatnonzero(etiquetas < 0)]}
+
+
+def _resolver_grupo(problema: dict, time_budget_s: float) -> dict:
+    """Un vehículo sobre la matriz de su grupo (índices locales, 0 = depósito)."""
+    if problema.get("ventanas") is not None:
+        return solve_vrptw(
+            problema["d"],
+            problema["t"],
+            problema["ventanas"],
+            problema["servicio"],
+            problema["demanda"],
+            [problema["capacidad"]],
+            salida=problema["salida"],
+            time_budget_s=time_budget_s,
+        )
+    return solve_cvrp(problema["d"], problema["demanda"], [problema["capacidad"]], time_budget_s=time_budget_s)
+
+
+def resolver_grupos(problemas: list, time_budget_s: float = None, workers: int = None, al_avanzar=None) -> list:
+    """Resuelve cada grupo por separado (en el pool compartido si hay más de un proceso).
+
+    `problemas`: dicts con d, demanda, capacidad y, con ventanas, t, ventanas,
+    servicio y salida. Devuelve las soluciones en el mismo orden.
+    `al_avanzar(hechos, total)` se llama al terminar cada grupo.
+
+    El pool lo comparten todas las peticiones: si los grupos no vuelven antes
+    del plazo (cola ocupada, proceso caído) o no se pudieron enviar, los que
+    faltan se resuelven aquí con CLUSTER_RESPALDO_S.
+    """
+    al_avanzar = al_avanzar or (lambda hechos, total: None)
+    workers = min(workers or CLUSTER_WORKERS, MULTISTART_WORKERS, len(problemas))
+    presupuesto = None
+    if time_budget_s is not None and problemas:
+        # El presupuesto es de reloj de pared para todos los grupos
+        presupuesto = time_budget_s * max(1, workers) / len(problemas)
+    if workers <= 1:
+        soluciones = []
+        for p in problemas:
+            soluciones.append(_resolver_grupo(p, presupuesto))
+            al_avanzar(len(soluciones), len(problemas))
+        return soluciones
+
+    futures = {}
+    for i, p in enumerate(problemas):
+        try:
+            futures[enviar(_resolver_grupo, p, presupuesto)] = i
+        except BrokenExecutor:
+            # Ni un pool nuevo arranca: lo que no se envió se resuelve aquí al final
+            break
+    soluciones = [None] * len(problemas)
+    por_grupo = presupuesto if presupuesto is not None else max(VRP_TIME_BUDGET_S, VRPTW_TIME_BUDGET_S)
+    plazo = math.ceil(len(problemas) / workers) * por_grupo + CLUSTER_MARGEN_S
+    limite = time.monotonic() + plazo
+    pendientes = set(futures)
+    hechos = 0
+    try:
+        while pendientes and time.monotonic() < limite:
+            listos, pendientes = wait(
+                pendientes, timeout=min(1.0, max(0.0, limite - time.monotonic())), return_when=FIRST_COMPLETED
+            )
+            for future in listos:
+                try:
+                    soluciones[futures[future]] = future.result()
+                except (CancelledError, BrokenExecutor):
+                    continue
+                hechos += 1
+                al_avanzar(hechos, len(problemas))
+            # Una tarea cancelada desde fuera (pool cerrado) nunca avisa a wait
+            pendientes = {f for f in pendientes if not f.cancelled()}
+    finally:
+        for future in pendientes:
+            future.cancel()
+
+    for i, solucion in enumerate(soluciones):
+        if solucion is None:
+            soluciones[i] = _resolver_grupo(problemas[i], CLUSTER_RESPALDO_S)
+            hechos += 1
+            al_avanzar(hechos, len(problemas))
+    return soluciones
@@ -1,9 +1,18 @@
+import asyncio
+
 # Estado global compartido
 state = {
     "ruta_logica": [],
     "ruta_geom": [],
+    "tramos_geom": [],  # geometría de cada tramo, para sustituir solo los afectados
+    "tramos_m": [],  # longitud conocida de cada tramo (metros)
     "sim_task": None,
     "sim_running": False,
     "current_index": 0,
-    "websockets": set()
-}
\ No newline at end of file
+    "websockets": set(),
+    "trabajos_opt": {}  # optimizaciones anytime por job_id (anytime.py)
+}
+
+# Todo cambio de la ruta (ruta_logica, tramos, geometría, current_index al
+# insertar) pasa por aquí: /start, /add_delivery y la ruta de anytime
+ruta_lock = asyncio.Lock()
@@ -1,68 +1,139 @@
+import asyncio
 from fastapi import FastAPI, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from backend.src.services.geocoding import geocode
-from backend.src.services.optimize import optimize_route
-from .estado import state
-from .utils import distancia_m, build_full_geometry
+from backend.src.services.geocoding import geocode_async
+from backend.src.services.optimize import optimize_route_async
+from backend.src.services.utils import close_async_client
+from .estado import ruta_lock, state
+from .utils import build_legs_async, insertar_parada_async, tramo_en, unir_segmentos
 from .routing import calcular_ruta_nearest_neighbor
 from .simulacion import simular_movimiento
 from .websocket import websocket_endpoint
+from . import anytime
 
 app = FastAPI()
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 
+@app.on_event("shutdown")
+async def cerrar_cliente_http():
+    await close_async_client()
+
+async def _resolver_punto(p):
+    if p is None:
+        return None
+    return await geocode_async(p) if isinstance(p, str) else tuple(p)
+
 @app.post("/start")
 async def start_route(request: Request, background_tasks: BackgroundTasks):
     data = await request.json()
-    inicio = geocode(data.get("inicio")) if isinstance(data.get("inicio"), str) else tuple(data.get("inicio"))
-    entregas = [geocode(e) if isinstance(e, str) else tuple(e) for e in data.get("entregas", [])]
-    entregas = [e for e in entregas if e]
+    inicio, *entregas = await asyncio.gather(
+        _resolver_punto(data.get("inicio")),
+        *(_resolver_punto(e) for e in data.get("entregas", []))
+    )
+    entregas = [e for e in entregas if e and e[0] is not None]
 
-    if not inicio or not entregas:
+    if not inicio or inicio[0] is None or not entregas:
         return {"error": "inicio y entregas requeridos"}
 
     try:
         locations = [f"{inicio[0]},{inicio[1]}"] + [f"{e[0]},{e[1]}" for e in entregas]
-        optimized = optimize_route(locations)
-        ruta_logica = [(float(p["location"]["latLng"]["latitude"]), float(p["location"]["latLng"]["longitude"])) for p in optimized["routes"][0]["legs"]]
+        optimized = await optimize_route_async(locations)
+        # El destino es la última entrega; el orden optimizado aplica a las intermedias
+        orden = optimized["summary"]["order"]
+        ruta_logica = [inicio] + [entregas[i] for i in orden] + [entregas[-1]]
     except Exception:
-        ruta_logica = calcular_ruta_nearest_neighbor(inicio, entregas)
+        ruta_logica = await asyncio.to_thread(calcular_ruta_nearest_neighbor, inicio, entregas)
 
-    state["ruta_logica"] = ruta_logica
-    state["ruta_geom"] = build_full_geometry(ruta_logica)
-    state["current_index"] = 0
-
-    for ws in state["websockets"]:
-        await ws.send_json({
-            "type": "route",
-            "ruta_logica": [{"lat": p[0], "lng": p[1]} for p in ruta_logica],
-            "ruta_geom": [{"lat": p[0], "lng": p[1]} for p in state["ruta_geom"]]
-        })
+    await _activar_ruta(ruta_logica)
 
     if not state["sim_running"]:
         background_tasks.add_task(simular_movimiento)
 
     return {"ok": True}
 
+async def _activar_ruta(ruta_logica):
+    async with ruta_lock:
+        segmentos, longitudes = await build_legs_async(ruta_logica)
+        state["ruta_logica"] = ruta_logica
+        state["tramos_geom"] = segmentos
+        state["tramos_m"] = longitudes
+        state["ruta_geom"] = await asyncio.to_thread(unir_segmentos, segmentos)
+        state["current_index"] = 0
+
+        for ws in state["websockets"]:
+            await ws.send_json({
+                "type": "route",
+                "ruta_logica": [{"lat": p[0], "lng": p[1]} for p in ruta_logica],
+                "ruta_geom": [{"lat": p[0], "lng": p[1]} for p in state["ruta_geom"]]
+            })
+
+async def _activar_y_simular(ruta_logica):
+    await _activar_ruta(ruta_logica)
+    if not state["sim_running"]:
+        asyncio.create_task(simular_movimiento())
+
+@app.post("/optimize_jobs")
+async def crear_optimizacion(request: Request):
+    """Como /start pero sin bloquear: devuelve job_id y publica las mejoras por /ws."""
+    data = await request.json()
+    inicio, *entregas = await asyncio.gather(
+        _resolver_punto(data.get("inicio")),
+        *(_resolver_punto(e) for e in data.get("entregas", []))
+    )
+    entregas = [e for e in entregas if e and e[0] is not None]
+
+    if not inicio or inicio[0] is None or not entregas:
+        return {"error": "inicio y entregas requeridos"}
+
+    trabajo = anytime.crear(
+        [tuple(inicio)] + [tuple(e) for e in entregas],
+        _activar_y_simular,
+        regresar=bool(data.get("regresar", False)),
+        time_budget_s=data.get("time_budget_s"),
+        aplicar=bool(data.get("aplicar", True)),
+    )
+    return {"ok": True, "job_id": trabajo.id}
+
+@app.get("/optimize_jobs/{job_id}")
+async def estado_optimizacion(job_id: str):
+    trabajo = anytime.obtener(job_id)
+    if not trabajo:
+        return {"error": "trabajo no encontrado"}
+    return trabajo.resumen()
+
+@app.post("/optimize_jobs/{job_id}/accept")
+async def aceptar_optimizacion(job_id: str):
+    return {"ok": anytime.aceptar(job_id)}
+
+@app.post("/optimize_jobs/{job_id}/cancel")
+async def cancelar_optimizacion(job_id: str):
+    return {"ok": anytime.cancelar(job_id)}
+
 @app.post("/add_delivery")
 async def add_delivery(request: Request):
     data = await request.json()
-    nuevo = geocode(data.get("address")) if "address" in data else (float(data.get("lat")), float(data.get("lon")))
-    ruta = state["ruta_logica"]
-    if not ruta or not nuevo:
-        return {"error": "ruta o entrega inválida"}
+    nuevo = await geocode_async(data.get("address")) if "address" in data else (float(data.get("lat")), float(data.get("lon")))
 
-    mejor_pos = min(range(1, len(ruta)), key=lambda i: distancia_m(ruta[i - 1], nuevo) + distancia_m(nuevo, ruta[i]) - distancia_m(ruta[i - 1], ruta[i]))
-    ruta.insert(mejor_pos, nuevo)
-    state["ruta_logica"] = ruta
-    state["ruta_geom"] = build_full_geometry(ruta)
+    # La posición se elige y se inserta sobre la ruta vigente, sin que otra inserción o activación se cruce
+    async with ruta_lock:
+        ruta = state["ruta_logica"]
+        if not ruta or not nuevo or nuevo[0] is None:
+            return {"error": "ruta o entrega inválida"}
 
-    for ws in state["websockets"]:
-        await ws.send_json({
-            "type": "route_update",
-            "ruta_logica": [{"lat": p[0], "lng": p[1]} for p in ruta],
-            "ruta_geom": [{"lat": p[0], "lng": p[1]} for p in state["ruta_geom"]]
-        })
+        # Solo tramos que el vehículo aún no recorre; se piden únicamente los dos tramos nuevos
+        desde = tramo_en(state["tramos_geom"], state["current_index"]) + 2 if state["sim_running"] else 1
+        mejor_pos, inicio, añadidos = await insertar_parada_async(
+            ruta, state["tramos_geom"], state["tramos_m"], state["ruta_geom"], tuple(nuevo), desde
+        )
+        if state["current_index"] > inicio:
+            state["current_index"] += añadidos
+
+        for ws in state["websockets"]:
+            await ws.send_json({
+                "type": "route_update",
+                "ruta_logica": [{"lat": p[0], "lng": p[1]} for p in ruta],
+                "ruta_geom": [{"lat": p[0], "lng": p[1]} for p in state["ruta_geom"]]
+            })
 
     return {"ok": True, "position_inserted_at": mejor_pos}
 
@@ -0,0 +1,202 @@
+"""
+TSP con varios arranques en paralelo.
+
+La búsqueda local depende mucho del recorrido inicial y en Python puro usa
+un solo núcleo. Aquí se lanzan K arranques (el primero es el vecino más
+cercano normal; el resto, vecino más cercano aleatorizado) en un pool de
+procesos persistente y se queda el mejor.
+
+La matriz se copia una vez a memoria compartida; cada tarea solo lleva el
+nombre del segmento y cada proceso la convierte a listas una vez por matriz.
+"""
+import atexit
+import multiprocessing
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, BrokenExecutor, CancelledError, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from src.IA.tsp import TSP_TIME_BUDGET_S, _como_lista, costo_ruta, mejorar, nearest_neighbor, nearest_neighbor_aleatorio
+
+MULTISTART_WORKERS = int(os.getenv("MULTISTART_WORKERS", str(os.cpu_count() or 1)))
+MULTISTART_STARTS = int(os.getenv("MULTISTART_STARTS", str(max(2, MULTISTART_WORKERS))))
+# "spawn" evita heredar hilos y conexiones del servidor al crear los procesos
+MULTISTART_START_METHOD = os.getenv("MULTISTART_START_METHOD", "spawn")
+# Por debajo de esto no compensa repartir entre procesos
+MULTISTART_MIN_NODOS = int(os.getenv("MULTISTART_MIN_NODOS", "12"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Caché por proceso trabajador: la última matriz recibida ya convertida a listas
+_matriz_local = {"nombre": None, "d": None}
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Pool compartido de MULTISTART_WORKERS procesos; se crea una vez y solo lo cierra close_pool.
+
+    Cada llamada limita su paralelismo con cuántas tareas tiene en vuelo, no
+    con el tamaño del pool (redimensionarlo cancelaría tareas de otras peticiones).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            contexto = multiprocessing.get_context(MULTISTART_START_METHOD)
+            _pool = ProcessPoolExecutor(max_workers=MULTISTART_WORKERS, mp_context=contexto)
+        return _pool
+
+
+def descartar_pool(pool):
+    """Un proceso murió y el pool quedó roto: el siguiente get_pool crea otro."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def enviar(fn, *args):
+    """pool.submit con un reintento en un pool nuevo si el compartido está roto.
+
+    Si el reintento también falla se propaga BrokenExecutor y quien llama
+    resuelve en proceso.
+    """
+    pool = get_pool()
+    try:
+        return pool.submit(fn, *args)
+    except BrokenExecutor:
+        descartar_pool(pool)
+        return get_pool().submit(fn, *args)
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+atexit.register(close_pool)
+
+
+def _adjuntar(nombre: str, forma: tuple):
+    """Lee la matriz compartida; el segmento lo crea y lo libera solo el proceso padre."""
+    if _matriz_local["nombre"] == nombre:
+        return _matriz_local["d"]
+    try:
+        shm = shared_memory.SharedMemory(name=nombre, track=False)
+    except TypeError:
+        # Python < 3.13: los trabajadores comparten el resource_tracker del padre,
+        # así que registrar de nuevo el nombre no cambia nada
+        shm = shared_memory.SharedMemory(name=nombre)
+    try:
+        d = np.ndarray(forma, dtype=np.float64, buffer=shm.buf).tolist()
+    finally:
+        shm.close()
+    _matriz_local.update(nombre=nombre, d=d)
+    return d
+
+
+def _arranque(nombre, forma, semilla, inicio, regresar, deadline_s):
+    """Tarea del trabajador: construir un recorrido y mejorarlo hasta `deadline_s` (reloj de pared)."""
+    d = _adjuntar(nombre, forma)
+    if semilla is None:
+        ruta = nearest_neighbor(d, inicio, regresar)
+    else:
+        ruta = nearest_neighbor_aleatorio(d, random.Random(semilla), inicio, regresar)
+    ruta = mejorar(d, ruta, max(0.0, deadline_s - time.time()))
+    return ruta, costo_ruta(d, ruta)
+
+
+def _en_proceso(lista, semillas, inicio, regresar, deadline, mejor=None):
+    """Los arranques uno tras otro en este proceso; el primero corre aunque ya no quede tiempo."""
+    for semilla in semillas:
+        if mejor is not None and time.time() > deadline:
+            break
+        rng = random.Random(semilla) if semilla is not None else None
+        ruta = nearest_neighbor(lista, inicio, regresar) if rng is None else nearest_neighbor_aleatorio(lista, rng, inicio, regresar)
+        ruta = mejorar(lista, ruta, max(0.0, deadline - time.time()))
+        costo = costo_ruta(lista, ruta)
+        if mejor is None or costo < mejor[1]:
+            mejor = (ruta, costo)
+    return mejor
+
+
+def solve_tsp_multistart(
+    dist,
+    inicio: int = 0,
+    regresar: bool = False,
+    starts: int = None,
+    workers: int = None,
+    time_budget_s: float = None,
+    seed: int = None,
+):
+    """Como tsp.solve_tsp pero con `starts` arranques, como mucho `workers` a la vez en el pool.
+
+    El presupuesto es de reloj de pared para todo el conjunto; los arranques
+    que no terminan a tiempo se descartan.
+    """
+    d = np.asarray(_como_lista(dist), dtype=np.float64)
+    n = len(d)
+    if n == 0:
+        return [], 0.0
+    starts = starts or MULTISTART_STARTS
+    budget = TSP_TIME_BUDGET_S if time_budget_s is None else time_budget_s
+    deadline = time.time() + budget
+    semillas = [None] + [random.Random(seed).randrange(2 ** 31) + i for i in range(starts - 1)]
+
+    workers = min(workers or MULTISTART_WORKERS, starts)
+    if workers <= 1 or n < MULTISTART_MIN_NODOS:
+        # En proceso: mismo resultado que sin pool para instancias chicas
+        return _en_proceso(d.tolist(), semillas, inicio, regresar, deadline)
+
+    shm = shared_memory.SharedMemory(create=True, size=d.nbytes)
+    try:
+        np.ndarray(d.shape, dtype=np.float64, buffer=shm.buf)[:] = d
+        cola = list(semillas)
+        en_vuelo = set()
+        mejor = None
+        try:
+            # Como mucho `workers` arranques a la vez en el pool compartido
+            while cola or en_vuelo:
+                while cola and len(en_vuelo) < workers and time.time() < deadline:
+                    try:
+                        en_vuelo.add(enviar(_arranque, shm.name, d.shape, cola[0], inicio, regresar, deadline))
+                    except BrokenExecutor:
+                        # Ni un pool nuevo arranca: lo que falta se hace aquí
+                        break
+                    cola.pop(0)
+                if not en_vuelo:
+                    break
+                # Margen para que los trabajadores devuelvan lo que tengan al vencer el plazo
+                hechos, en_vuelo = wait(
+                    en_vuelo, timeout=max(0.0, deadline - time.time()) + 1.0, return_when=FIRST_COMPLETED
+                )
+                if not hechos:
+                    break
+                for future in hechos:
+                    try:
+                        ruta, costo = future.result()
+                    except (CancelledError, BrokenExecutor):
+                        continue
+                    if mejor is None or costo < mejor[1]:
+                        mejor = (ruta, costo)
+        finally:
+            for future in en_vuelo:
+                future.cancel()
+    finally:
+        shm.close()
+        shm.unlink()
+
+    if cola and time.time() < deadline:
+        mejor = _en_proceso(d.tolist(), cola, inicio, regresar, deadline, mejor)
+    if mejor is None:
+        # Ningún arranque terminó: vecino más cercano sin mejora
+        ruta = nearest_neighbor(d.tolist(), inicio, regresar)
+        mejor = (ruta, costo_ruta(d.tolist(), ruta))
+    return mejor
@@ -1,11 +1,7 @@
-from .utils import distancia_m
+from .spatial import proyectar, recorrido_vecino_mas_cercano
 
 def calcular_ruta_nearest_neighbor(inicio, pendientes):
-    pendientes_copy = pendientes.copy()
-    ruta = [inicio]
-    while pendientes_copy:
-        last = ruta[-1]
-        siguiente = min(pendientes_copy, key=lambda p: distancia_m(last, p))
-        ruta.append(siguiente)
-        pendientes_copy.remove(siguiente)
-    return ruta
\ No newline at end of file
+    # Índice de rejilla sobre coordenadas proyectadas: O(n log n) aprox. en vez de O(n²) con geodesic
+    puntos = [inicio] + list(pendientes)
+    orden = recorrido_vecino_mas_cercano(proyectar(puntos, inicio), 0)
+    return [puntos[i] for i in orden]
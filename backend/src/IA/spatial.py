@@ -0,0 +1,129 @@
+"""
+Índice espacial de rejilla sobre coordenadas proyectadas a metros.
+
+Cada celda guarda los puntos que caen en ella; la búsqueda del más cercano
+revisa anillos de celdas alrededor de la consulta y se detiene cuando el
+siguiente anillo ya no puede tener nada más cerca. Quitar un punto es O(1).
+
+Cuando quedan pocos puntos se reconstruye la rejilla con celdas más grandes,
+para que los anillos vacíos no dominen al final de un recorrido.
+"""
+import math
+
+import numpy as np
+
+from src.services.distance import EARTH_RADIUS_M
+
+
+def proyectar(puntos, origen) -> np.ndarray:
+    """(N, 2) en metros (x = este, y = norte) respecto a `origen`; vale para una ciudad."""
+    p = np.asarray(puntos, dtype=float).reshape(-1, 2)
+    x = np.radians(p[:, 1] - origen[1]) * EARTH_RADIUS_M * math.cos(math.radians(origen[0]))
+    y = np.radians(p[:, 0] - origen[0]) * EARTH_RADIUS_M
+    return np.column_stack([x, y])
+
+
+class IndiceRejilla:
+    """Vecino más cercano con borrado sobre puntos (x, y) en metros."""
+
+    def __init__(self, xy, por_celda: float = 2.0):
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        self.x = xy[:, 0].tolist()
+        self.y = xy[:, 1].tolist()
+        self.por_celda = por_celda
+        self.vivos = len(self.x)
+        self._construir(range(len(self.x)))
+
+    def __len__(self):
+        return self.vivos
+
+    def _construir(self, indices):
+        indices = list(indices)
+        xs = [self.x[i] for i in indices]
+        ys = [self.y[i] for i in indices]
+        if indices:
+            self.x0, self.y0 = min(xs), min(ys)
+            ancho, alto = max(max(xs) - self.x0, 1.0), max(max(ys) - self.y0, 1.0)
+            self.lado = max(math.sqrt(ancho * alto * self.por_celda / len(indices)), 1e-6)
+        else:
+            self.x0 = self.y0 = 0.0
+            ancho = alto = self.lado = 1.0
+        self.nx = int(ancho // self.lado) + 1
+        self.ny = int(alto // self.lado) + 1
+        self.celdas = {}
+        self.pos = {}  # índice → (celda, posición en su lista)
+        for i in indices:
+            self._poner(i)
+        self._reconstruir_en = len(indices) // 4
+
+    def _celda(self, x, y):
+        return int((x - self.x0) // self.lado), int((y - self.y0) // self.lado)
+
+    def _poner(self, i):
+        celda = self._celda(self.x[i], self.y[i])
+        lista = self.celdas.setdefault(celda, [])
+        self.pos[i] = (celda, len(lista))
+        lista.append(i)
+
+    def quitar(self, i):
+        celda, p = self.pos.pop(i)
+        lista = self.celdas[celda]
+        ultimo = lista.pop()
+        if ultimo != i:
+            lista[p] = ultimo
+            self.pos[ultimo] = (celda, p)
+        elif not lista:
+            del self.celdas[celda]
+        self.vivos -= 1
+        if 0 < self.vivos <= self._reconstruir_en:
+            self._construir(list(self.pos))
+
+    def mas_cercano(self, x: float, y: float):
+        """Índice del punto vivo más cercano a (x, y), o None si no queda ninguno."""
+        if not self.vivos:
+            return None
+        cx, cy = self._celda(x, y)
+        mejor, mejor_d2 = None, math.inf
+        celdas = self.celdas
+        px, py = self.x, self.y
+        # Si la consulta cae fuera de la rejilla, los anillos anteriores al borde están vacíos
+        r = max(0, -cx, cx - self.nx + 1, -cy, cy - self.ny + 1)
+        while True:
+            for celda in self._anillo(cx, cy, r):
+                for i in celdas.get(celda, ()):
+                    d2 = (px[i] - x) ** 2 + (py[i] - y) ** 2
+                    if d2 < mejor_d2 or (d2 == mejor_d2 and i < mejor):
+                        mejor, mejor_d2 = i, d2
+            # Todo lo que está en el anillo r + 1 o más allá queda a más de r·lado
+            if mejor is not None and mejor_d2 <= (r * self.lado) ** 2:
+                return mejor
+            r += 1
+
+    def _anillo(self, cx, cy, r):
+        """Celdas a distancia de Chebyshev exactamente r, recortadas a la rejilla."""
+        if r == 0:
+            yield cx, cy
+            return
+        x_lo, x_hi = max(cx - r, 0), min(cx + r, self.nx - 1)
+        y_lo, y_hi = max(cy - r + 1, 0), min(cy + r - 1, self.ny - 1)
+        for yy in (cy - r, cy + r):
+            if 0 <= yy < self.ny:
+                for xx in range(x_lo, x_hi + 1):
+                    yield xx, yy
+        for xx in (cx - r, cx + r):
+            if 0 <= xx < self.nx:
+                for yy in range(y_lo, y_hi + 1):
+                    yield xx, yy
+
+
+def recorrido_vecino_mas_cercano(xy, inicio: int = 0) -> list:
+    """Orden de visita (índices de `xy`) empezando en `inicio` y yendo siempre al más cercano."""
+    indice = IndiceRejilla(xy)
+    indice.quitar(inicio)
+    orden = [inicio]
+    while len(indice):
+        actual = orden[-1]
+        siguiente = indice.mas_cercano(indice.x[actual], indice.y[actual])
+        indice.quitar(siguiente)
+        orden.append(siguiente)
+    return orden
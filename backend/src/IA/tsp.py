@@ -0,0 +1,180 @@
+"""
+TSP de un solo vehículo sobre una matriz de distancias.
+
+Se construye un recorrido con vecino más cercano y se mejora con 2-opt y
+Or-opt (mover tramos de 1 a 3 paradas) hasta que no hay mejora o se acaba el
+tiempo. El nodo `inicio` queda fijo en la primera posición; con
+`regresar=True` el recorrido vuelve a él al final.
+
+La matriz puede ser asimétrica (tiempos/distancias reales de calle): los
+movimientos calculan el coste de invertir tramos cuando hace falta.
+"""
+import heapq
+import math
+import os
+import time
+
+# Presupuesto de tiempo por defecto para la búsqueda local (segundos)
+TSP_TIME_BUDGET_S = float(os.getenv("TSP_TIME_BUDGET_S", "2.0"))
+
+# Longitud máxima del tramo que mueve Or-opt
+OR_OPT_MAX_SEGMENTO = 3
+
+
+def _como_lista(dist):
+    """Lista de listas de floats; NaN/None pasan a un coste enorme para evitarlos."""
+    filas = dist.tolist() if hasattr(dist, "tolist") else [list(f) for f in dist]
+    finitos = [v for f in filas for v in f if v is not None and not math.isnan(v)]
+    castigo = (max(finitos) if finitos else 1.0) * len(filas) * 10
+    return [[castigo if v is None or math.isnan(v) else float(v) for v in f] for f in filas]
+
+
+def _es_simetrica(d) -> bool:
+    n = len(d)
+    return all(abs(d[i][j] - d[j][i]) < 1e-9 for i in range(n) for j in range(i + 1, n))
+
+
+def costo_ruta(dist, ruta) -> float:
+    d = dist if isinstance(dist, list) else _como_lista(dist)
+    return sum(d[a][b] for a, b in zip(ruta, ruta[1:]))
+
+
+def nearest_neighbor(dist, inicio: int = 0, regresar: bool = False) -> list:
+    d = dist if isinstance(dist, list) else _como_lista(dist)
+    pendientes = set(range(len(d))) - {inicio}
+    ruta = [inicio]
+    while pendientes:
+        ultimo = d[ruta[-1]]
+        siguiente = min(pendientes, key=lambda j: ultimo[j])
+        ruta.append(siguiente)
+        pendientes.remove(siguiente)
+    if regresar and len(ruta) > 1:
+        ruta.append(inicio)
+    return ruta
+
+
+def nearest_neighbor_aleatorio(dist, rng, inicio: int = 0, regresar: bool = False, candidatos: int = 3) -> list:
+    """Vecino más cercano eligiendo al azar entre los `candidatos` más cercanos (arranques distintos)."""
+    d = dist if isinstance(dist, list) else _como_lista(dist)
+    pendientes = set(range(len(d))) - {inicio}
+    ruta = [inicio]
+    while pendientes:
+        ultimo = d[ruta[-1]]
+        cercanos = heapq.nsmallest(candidatos, pendientes, key=lambda j: ultimo[j])
+        siguiente = rng.choice(cercanos)
+        ruta.append(siguiente)
+        pendientes.remove(siguiente)
+    if regresar and len(ruta) > 1:
+        ruta.append(inicio)
+    return ruta
+
+
+def insertar_faltantes(dist, ruta, faltan) -> list:
+    """Inserción más barata de `faltan` en `ruta` sin mover el inicio (ni el regreso si es cerrada)."""
+    d = dist if isinstance(dist, list) else _como_lista(dist)
+    ruta = list(ruta)
+    for c in faltan:
+        cerrada = len(ruta) > 1 and ruta[0] == ruta[-1]
+        mejor, donde = None, len(ruta)
+        for p in range(len(ruta) - 1):
+            a, b = ruta[p], ruta[p + 1]
+            delta = d[a][c] + d[c][b] - d[a][b]
+            if mejor is None or delta < mejor:
+                mejor, donde = delta, p + 1
+        # Recorrido abierto: también puede ir al final
+        if not cerrada and (mejor is None or d[ruta[-1]][c] < mejor):
+            donde = len(ruta)
+        ruta.insert(donde, c)
+    return ruta
+
+
+def two_opt(d, ruta, cerrada, simetrica, deadline) -> bool:
+    """Primera mejora de 2-opt; invierte ruta[i..j] in situ. True si mejoró."""
+    ultimo = len(ruta) - (2 if cerrada else 1)
+    for i in range(1, ultimo):
+        if time.perf_counter() > deadline:
+            return False
+        a, b = ruta[i - 1], ruta[i]
+        interior = 0.0  # cambio por invertir las aristas internas (solo asimétrica)
+        for j in range(i + 1, ultimo + 1):
+            c = ruta[j]
+            if not simetrica:
+                p = ruta[j - 1]
+                interior += d[c][p] - d[p][c]
+            delta = d[a][c] - d[a][b] + interior
+            if j + 1 < len(ruta):
+                e = ruta[j + 1]
+                delta += d[b][e] - d[c][e]
+            if delta < -1e-9:
+                ruta[i:j + 1] = ruta[i:j + 1][::-1]
+                return True
+    return False
+
+
+def or_opt(d, ruta, cerrada, simetrica, deadline) -> bool:
+    """Primera mejora moviendo un tramo de 1..3 paradas a otra posición."""
+    n = len(ruta)
+    ultimo = n - (2 if cerrada else 1)
+    for k in range(1, OR_OPT_MAX_SEGMENTO + 1):
+        for i in range(1, ultimo - k + 2):
+            if time.perf_counter() > deadline:
+                return False
+            s0, s1 = ruta[i], ruta[i + k - 1]
+            prev = ruta[i - 1]
+            nxt = ruta[i + k] if i + k < n else None
+            quitar = d[prev][s0] + (d[s1][nxt] - d[prev][nxt] if nxt is not None else 0.0)
+
+            # Insertar entre ruta[p] y ruta[p + 1], fuera del tramo
+            for p in range(0, ultimo + 1):
+                if i - 1 <= p <= i + k - 1:
+                    continue
+                a = ruta[p]
+                b = ruta[p + 1] if p + 1 < n else None
+                poner = d[a][s0] + (d[s1][b] - d[a][b] if b is not None else 0.0)
+                invertido = False
+                if simetrica and k > 1:
+                    alt = d[a][s1] + (d[s0][b] - d[a][b] if b is not None else 0.0)
+                    if alt < poner:
+                        poner, invertido = alt, True
+                if poner - quitar < -1e-9:
+                    tramo = ruta[i:i + k]
+                    if invertido:
+                        tramo.reverse()
+                    resto = ruta[:i] + ruta[i + k:]
+                    destino = p + 1 if p < i else p + 1 - k
+                    ruta[:] = resto[:destino] + tramo + resto[destino:]
+                    return True
+    return False
+
+
+def mejorar(dist, ruta, time_budget_s: float = None, al_mejorar=None, detener=None) -> list:
+    """2-opt + Or-opt hasta el óptimo local o hasta agotar el presupuesto.
+
+    `al_mejorar(ruta)` se llama tras cada movimiento que mejora (la lista es la
+    de trabajo: copiarla si se guarda); `detener()` devuelve True para cortar.
+    """
+    d = dist if isinstance(dist, list) else _como_lista(dist)
+    ruta = list(ruta)
+    if len(ruta) < 4:
+        return ruta
+    budget = TSP_TIME_BUDGET_S if time_budget_s is None else time_budget_s
+    deadline = time.perf_counter() + budget
+    cerrada = ruta[0] == ruta[-1]
+    simetrica = _es_simetrica(d)
+
+    while time.perf_counter() < deadline and not (detener and detener()):
+        if two_opt(d, ruta, cerrada, simetrica, deadline) or or_opt(d, ruta, cerrada, simetrica, deadline):
+            if al_mejorar:
+                al_mejorar(ruta)
+            continue
+        break
+    return ruta
+
+
+def solve_tsp(dist, inicio: int = 0, regresar: bool = False, time_budget_s: float = None):
+    """Devuelve (ruta, costo): índices de la matriz empezando por `inicio`."""
+    d = _como_lista(dist)
+    if not d:
+        return [], 0.0
+    ruta = mejorar(d, nearest_neighbor(d, inicio, regresar), time_budget_s)
+    return ruta, costo_ruta(d, ruta)
@@ -1,8 +1,18 @@
-from geopy.distance import geodesic
-from backend.src.services.navigation_sdk import get_route
+import asyncio
+import os
+import numpy as np
+from polyline import decode
+from backend.src.services.distance import distance_m, haversine_m, haversine_matrix
+from backend.src.services.matrix import LOCAL_DETOUR_FACTOR
+from backend.src.services.navigation_sdk import get_route, get_route_async
+
+# Máximo de tramos pedidos a la vez al construir la geometría
+MAX_TRAMOS_CONCURRENTES = 8
+# Para interpolar y comparar candidatos no hace falta el elipsoide (ver services/distance.py)
+RUTEO_DISTANCE_PRECISION = os.getenv("RUTEO_DISTANCE_PRECISION", "equirectangular")
 
 def distancia_m(a, b):
-    return geodesic(a, b).meters
+    return distance_m(a, b, RUTEO_DISTANCE_PRECISION)
 
 def interpolate_segment(a, b, meters_per_step=20):
     dist_m = distancia_m(a, b)
@@ -11,15 +21,116 @@ def interpolate_segment(a, b, meters_per_step=20):
     steps = max(1, int(dist_m / meters_per_step))
     return [(a[0] + (b[0] - a[0]) * i / steps, a[1] + (b[1] - a[1]) * i / steps) for i in range(steps + 1)]
 
-def build_full_geometry(ruta_logica):
+def _segmento(a, b, route_info):
+    if route_info and route_info.get("polyline"):
+        return decode(route_info["polyline"])
+    return interpolate_segment(a, b)
+
+def unir_segmentos(segmentos):
     full = []
-    for i in range(len(ruta_logica) - 1):
-        a, b = ruta_logica[i], ruta_logica[i + 1]
-        route_info = get_route(f"{a[0]},{a[1]}", f"{b[0]},{b[1]}")
-        if route_info and "polyline" in route_info:
-            # Si tienes decodificación de polilínea, úsala aquí
-            pass
-        else:
-            seg = interpolate_segment(a, b)
-            full.extend(seg if not full or full[-1] != seg[0] else seg[1:])
-    return full
\ No newline at end of file
+    for seg in segmentos:
+        full.extend(seg if not full or full[-1] != seg[0] else seg[1:])
+    return full
+
+def _longitud(a, b, route_info):
+    # Distancia de calle si el tramo la trae; si no, línea recta con factor de rodeo
+    if route_info and route_info.get("distance_km") is not None:
+        return route_info["distance_km"] * 1000
+    return haversine_m(a, b) * LOCAL_DETOUR_FACTOR
+
+def _unir_tramos(ruta_logica, route_infos):
+    return unir_segmentos([_segmento(ruta_logica[i], ruta_logica[i + 1], info) for i, info in enumerate(route_infos)])
+
+def build_full_geometry(ruta_logica):
+    route_infos = [
+        get_route(f"{a[0]},{a[1]}", f"{b[0]},{b[1]}", with_geometry=True)
+        for a, b in zip(ruta_logica, ruta_logica[1:])
+    ]
+    return _unir_tramos(ruta_logica, route_infos)
+
+async def _tramos_async(pares):
+    sem = asyncio.Semaphore(MAX_TRAMOS_CONCURRENTES)
+
+    async def tramo(a, b):
+        async with sem:
+            try:
+                return await get_route_async(f"{a[0]},{a[1]}", f"{b[0]},{b[1]}", with_geometry=True)
+            except Exception:
+                return None
+
+    return await asyncio.gather(*(tramo(a, b) for a, b in pares))
+
+async def build_legs_async(ruta_logica):
+    """(segmentos, longitudes_m) por tramo, pidiendo los tramos en paralelo."""
+    pares = list(zip(ruta_logica, ruta_logica[1:]))
+    route_infos = await _tramos_async(pares)
+    # La interpolación es CPU: fuera del loop
+    return await asyncio.to_thread(
+        lambda: (
+            [_segmento(a, b, info) for (a, b), info in zip(pares, route_infos)],
+            [_longitud(a, b, info) for (a, b), info in zip(pares, route_infos)],
+        )
+    )
+
+async def build_full_geometry_async(ruta_logica):
+    """Pide los tramos en paralelo sin bloquear el event loop."""
+    segmentos, _ = await build_legs_async(ruta_logica)
+    return await asyncio.to_thread(unir_segmentos, segmentos)
+
+def tramo_en(segmentos, indice_geom):
+    """Tramo de la ruta al que pertenece un índice de la geometría unida."""
+    inicio = 0
+    for i, seg in enumerate(segmentos):
+        fin = inicio + len(seg) - (1 if i else 0)
+        if indice_geom < fin:
+            return i
+        inicio = fin
+    return len(segmentos)
+
+def mejor_insercion(ruta_logica, longitudes_m, nuevo, desde=1):
+    """Posición de inserción más barata (desde..n) en O(n) usando las longitudes ya conocidas de cada tramo.
+
+    Solo se calcula la distancia del punto nuevo a cada parada (un barrido
+    vectorizado); los tramos existentes no se vuelven a medir. La posición n
+    añade la parada al final, y es la única que queda si `desde` pasa de n
+    (el vehículo ya va en el último tramo).
+    """
+    hasta = haversine_matrix([nuevo], ruta_logica)[0] * LOCAL_DETOUR_FACTOR
+    costo = np.append(hasta[:-1] + hasta[1:] - np.asarray(longitudes_m, dtype=float), hasta[-1])
+    desde = min(max(1, desde), len(ruta_logica))
+    return int(np.argmin(costo[desde - 1:])) + desde
+
+def _puntos(segmentos, anterior=None):
+    """Puntos que aportan los segmentos a la geometría unida (sin repetir las uniones)."""
+    total = 0
+    for seg in segmentos:
+        total += len(seg) - (1 if anterior is not None and seg and anterior == seg[0] else 0)
+        anterior = seg[-1] if seg else anterior
+    return total
+
+async def insertar_parada_async(ruta_logica, segmentos, longitudes_m, ruta_geom, nuevo, desde=1):
+    """Inserta `nuevo` pidiendo solo sus tramos nuevos; todas las listas se modifican en su lugar.
+
+    La geometría unida se parcha en la zona del tramo sustituido en vez de
+    reconstruirse. Devuelve (posición, índice donde empieza el cambio en la
+    geometría, puntos añadidos). Quien llama debe tener estado.ruta_lock:
+    la posición se calcula antes de pedir los tramos y se aplica después.
+    """
+    pos = mejor_insercion(ruta_logica, longitudes_m, nuevo, desde)
+    a = ruta_logica[pos - 1]
+    b = ruta_logica[pos] if pos < len(ruta_logica) else None
+    pares = [(a, nuevo)] + ([(nuevo, b)] if b is not None else [])
+    infos = await _tramos_async(pares)
+    nuevos = [_segmento(x, y, info) for (x, y), info in zip(pares, infos)]
+
+    anterior = segmentos[pos - 2][-1] if pos >= 2 and segmentos[pos - 2] else None
+    inicio = _puntos(segmentos[:pos - 1])
+    viejos = segmentos[pos - 1:pos]  # vacío si se añade al final
+    quitados = _puntos(viejos, anterior)
+    parche = unir_segmentos(([[anterior]] if anterior is not None else []) + nuevos)[1 if anterior is not None else 0:]
+
+    ruta_geom[inicio:inicio + quitados] = parche
+    ruta_logica.insert(pos, nuevo)
+    segmentos[pos - 1:pos] = nuevos
+    longitudes_m[pos - 1:pos] = [_longitud(x, y, info) for (x, y), info in zip(pares, infos)]
+    return pos, inicio, len(parche) - quitados
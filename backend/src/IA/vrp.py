@@ -0,0 +1,250 @@
+"""
+Ruteo de varios vehículos con capacidad (CVRP).
+
+1. Ahorros de Clarke-Wright: cada cliente empieza en su propia ruta y se
+   fusionan rutas por ahorro s(i, j) = d(0, i) + d(0, j) - d(i, j),
+   evaluando solo los K vecinos más cercanos de cada cliente para que escale
+   a miles de entregas.
+2. Las rutas se asignan a vehículos (mejor ajuste por capacidad); con flota
+   mixta lo que no cupo se reagrupa con la capacidad que queda y al final se
+   inserta donde haya espacio.
+3. Búsqueda local: reubicar clientes entre rutas (solo cerca de sus vecinos)
+   y 2-opt / Or-opt dentro de cada ruta (src.IA.tsp).
+
+El nodo 0 de la matriz es el depósito.
+"""
+import os
+import time
+
+import numpy as np
+
+from src.IA.tsp import _como_lista, mejorar
+
+VRP_TIME_BUDGET_S = float(os.getenv("VRP_TIME_BUDGET_S", "5.0"))
+VRP_VECINOS = int(os.getenv("VRP_VECINOS", "30"))
+
+
+def vecinos_cercanos(d: np.ndarray, k: int) -> np.ndarray:
+    """(N-1, k) con los k clientes más cercanos a cada cliente (índices de la matriz)."""
+    clientes = d[1:, 1:].copy()
+    n = len(clientes)
+    k = max(1, min(k, n - 1))
+    np.fill_diagonal(clientes, np.inf)
+    idx = np.argpartition(clientes, k - 1, axis=1)[:, :k]
+    # Ordenados por cercanía para que la búsqueda local pruebe primero los mejores
+    orden = np.argsort(np.take_along_axis(clientes, idx, axis=1), axis=1)
+    return np.take_along_axis(idx, orden, axis=1) + 1
+
+
+def _ahorros(d: np.ndarray, vecinos: np.ndarray):
+    i = np.repeat(np.arange(1, len(d)), vecinos.shape[1])
+    j = vecinos.ravel()
+    # kNN no es simétrico: el par vale si cualquiera de los dos tiene al otro de vecino
+    n = len(d)
+    par = np.unique(np.minimum(i, j) * n + np.maximum(i, j))
+    i, j = par // n, par % n
+    s = d[0, i] + d[0, j] - d[i, j]
+    orden = np.argsort(-s, kind="stable")
+    orden = orden[s[orden] > 0]
+    return i[orden], j[orden]
+
+
+def clarke_wright(d: np.ndarray, demanda, capacidad: float, vecinos: np.ndarray, clientes=None) -> list:
+    """Rutas (listas de clientes, sin el depósito) con carga ≤ capacidad."""
+    clientes = list(range(1, len(d)) if clientes is None else clientes)
+    rutas = {c: [c] for c in clientes}
+    ruta_de = {c: c for c in clientes}
+    carga = {c: float(demanda[c]) for c in clientes}
+
+    for i, j in zip(*_ahorros(d, vecinos)):
+        i, j = int(i), int(j)
+        if i not in ruta_de or j not in ruta_de:
+            continue
+        ri, rj = ruta_de[i], ruta_de[j]
+        if ri == rj or carga[ri] + carga[rj] > capacidad:
+            continue
+        a, b = rutas[ri], rutas[rj]
+        # i y j tienen que estar en un extremo de su ruta
+        if a[-1] != i:
+            if a[0] != i:
+                continue
+            a.reverse()
+        if b[0] != j:
+            if b[-1] != j:
+                continue
+            b.reverse()
+        a.extend(b)
+        carga[ri] += carga.pop(rj)
+        del rutas[rj]
+        for c in b:
+            ruta_de[c] = ri
+    return list(rutas.values())
+
+
+def asignar_vehiculos(rutas: list, demanda, capacidades: list):
+    """Mejor ajuste: cada ruta (de mayor a menor carga) al vehículo libre más chico que la aguanta."""
+    libres = sorted(range(len(capacidades)), key=lambda v: capacidades[v])
+    asignadas, sobrantes = {}, []
+    for ruta in sorted(rutas, key=lambda r: -sum(demanda[c] for c in r)):
+        carga = sum(demanda[c] for c in ruta)
+        v = next((v for v in libres if capacidades[v] >= carga), None)
+        if v is None:
+            sobrantes.append(ruta)
+            continue
+        libres.remove(v)
+        asignadas[v] = ruta
+    return asignadas, sobrantes
+
+
+def _costo(d, ruta) -> float:
+    if not ruta:
+        return 0.0
+    return float(d[0, ruta[0]] + d[ruta[-1], 0] + sum(d[a, b] for a, b in zip(ruta, ruta[1:])))
+
+
+def reubicar(d, rutas: dict, demanda, capacidades, vecinos, deadline) -> bool:
+    """Mueve clientes a otra ruta junto a uno de sus vecinos si baja la distancia total."""
+    ruta_de, pos = {}, {}
+    carga = {v: sum(demanda[c] for c in r) for v, r in rutas.items()}
+
+    def indexar(v):
+        for p, c in enumerate(rutas[v]):
+            ruta_de[c], pos[c] = v, p
+
+    for v in rutas:
+        indexar(v)
+
+    mejoro = False
+    for c in list(ruta_de):
+        if time.perf_counter() > deadline:
+            break
+        v1 = ruta_de[c]
+        r1 = rutas[v1]
+        p = pos[c]
+        prev = r1[p - 1] if p > 0 else 0
+        nxt = r1[p + 1] if p + 1 < len(r1) else 0
+        ganancia = d[prev, c] + d[c, nxt] - d[prev, nxt]
+
+        mejor = None
+        for vecino in vecinos[c - 1]:
+            vecino = int(vecino)
+            v2 = ruta_de.get(vecino)
+            if v2 is None or v2 == v1 or carga[v2] + demanda[c] > capacidades[v2]:
+                continue
+            r2 = rutas[v2]
+            q = pos[vecino]
+            # Antes o después del vecino
+            for a, b, donde in (
+                (r2[q - 1] if q > 0 else 0, vecino, q),
+                (vecino, r2[q + 1] if q + 1 < len(r2) else 0, q + 1),
+            ):
+                delta = d[a, c] + d[c, b] - d[a, b] - ganancia
+                if delta < -1e-9 and (mejor is None or delta < mejor[0]):
+                    mejor = (delta, v2, donde)
+
+        if mejor:
+            _, v2, donde = mejor
+            r1.pop(p)
+            rutas[v2].insert(donde, c)
+            carga[v1] -= demanda[c]
+            carga[v2] += demanda[c]
+            indexar(v1)
+            indexar(v2)
+            mejoro = True
+    return mejoro
+
+
+def insertar_sobrantes(d, rutas: dict, clientes: list, demanda, capacidades) -> list:
+    """Inserción más barata de los clientes que se quedaron sin vehículo; devuelve los que no cupieron."""
+    carga = {v: sum(demanda[c] for c in r) for v, r in rutas.items()}
+    fuera = []
+    for c in sorted(clientes, key=lambda c: -demanda[c]):
+        mejor = None
+        for v, r in rutas.items():
+            if carga[v] + demanda[c] > capacidades[v]:
+                continue
+            nodos = [0] + r + [0]
+            for p in range(len(nodos) - 1):
+                a, b = nodos[p], nodos[p + 1]
+                delta = d[a, c] + d[c, b] - d[a, b]
+                if mejor is None or delta < mejor[0]:
+                    mejor = (delta, v, p)
+        if mejor is None:
+            fuera.append(c)
+            continue
+        _, v, p = mejor
+        rutas[v].insert(p, c)
+        carga[v] += demanda[c]
+    return fuera
+
+
+def _mejorar_ruta(d, ruta, budget) -> list:
+    if len(ruta) < 3:
+        return ruta
+    nodos = [0] + ruta
+    sub = _como_lista(d[np.ix_(nodos, nodos)])
+    local = mejorar(sub, list(range(len(nodos))) + [0], budget)
+    return [nodos[i] for i in local[1:-1]]
+
+
+def solve_cvrp(d, demanda, capacidades: list, time_budget_s: float = None, k: int = VRP_VECINOS) -> dict:
+    """Resuelve el CVRP.
+
+    d: matriz (N, N) con el depósito en 0; demanda: (N,) con demanda[0] = 0;
+    capacidades: una por vehículo (None = sin límite).
+    Devuelve {"rutas": {vehiculo: [clientes]}, "sin_asignar": [clientes]}.
+    """
+    d = np.asarray(d, dtype=float)
+    finitos = d[np.isfinite(d)]
+    d = np.nan_to_num(d, nan=(finitos.max() * 10 if finitos.size else 1e9))
+    demanda = [float(x or 0) for x in demanda]
+    capacidades = [float("inf") if c is None else float(c) for c in capacidades]
+    budget = VRP_TIME_BUDGET_S if time_budget_s is None else time_budget_s
+    deadline = time.perf_counter() + budget
+
+    if len(d) < 2 or not capacidades:
+        return {"rutas": {}, "sin_asignar": list(range(1, len(d)))}
+
+    # Entregas que no caben en ningún vehículo
+    maxima = max(capacidades)
+    sin_asignar = [c for c in range(1, len(d)) if demanda[c] > maxima]
+    pendientes = [c for c in range(1, len(d)) if demanda[c] <= maxima]
+
+    vecinos = vecinos_cercanos(d, k) if len(d) > 2 else np.zeros((1, 0), dtype=int)
+
+    # Flota mixta: lo que no entra en un vehículo libre se vuelve a agrupar con
+    # la capacidad mayor que queda, hasta quedarse sin vehículos
+    asignadas = {}
+    libres = list(range(len(capacidades)))
+    while pendientes and libres:
+        capacidad = max(capacidades[v] for v in libres)
+        rutas = clarke_wright(d, demanda, capacidad, vecinos, pendientes)
+        nuevas, sobrantes = asignar_vehiculos(rutas, demanda, [capacidades[v] for v in libres])
+        if not nuevas:
+            break
+        for i, ruta in nuevas.items():
+            asignadas[libres[i]] = ruta
+        libres = [v for i, v in enumerate(libres) if i not in nuevas]
+        pendientes = [c for r in sobrantes for c in r]
+
+    sin_asignar += insertar_sobrantes(d, asignadas, pendientes, demanda, capacidades)
+
+    # Búsqueda local hasta agotar la mitad del presupuesto; el resto para cada ruta
+    mitad = time.perf_counter() + (deadline - time.perf_counter()) / 2
+    while time.perf_counter() < mitad and reubicar(d, asignadas, demanda, capacidades, vecinos, mitad):
+        pass
+
+    for v, ruta in list(asignadas.items()):
+        restante = max(0.0, deadline - time.perf_counter())
+        asignadas[v] = _mejorar_ruta(d, ruta, restante / max(1, len(asignadas)))
+
+    return {
+        "rutas": {v: r for v, r in asignadas.items() if r},
+        "sin_asignar": sin_asignar,
+    }
+
+
+def costo_total(d, rutas: dict) -> float:
+    """Suma de las rutas; un tramo sin dato (NaN) pesa con el mismo castigo que tsp._como_lista."""
+    d = np.asarray(_como_lista(d), dtype=float)
+    return sum(_costo(d, r) for r in rutas.values())
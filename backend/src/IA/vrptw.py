@@ -0,0 +1,347 @@
+"""
+Ruteo con ventanas de tiempo (VRPTW).
+
+Cada entrega tiene una ventana [inicio, fin] en segundos desde medianoche y
+un tiempo de servicio. Se llega, se espera si es temprano y se atiende.
+
+Construcción por inserción: se toman las entregas de la ventana más urgente
+a la menos urgente y cada una va a la posición más barata (distancia + tiempo
+extra) que respete capacidad y ventanas, probando solo junto a sus K vecinos
+más cercanos y en vehículos vacíos.
+
+La factibilidad de insertar es O(1): cada ruta guarda, por posición, cuánto
+se puede retrasar el inicio de servicio sin romper ninguna ventana posterior
+(holgura hacia adelante, Savelsbergh 1992). Solo al aceptar una inserción se
+recalcula la ruta afectada.
+
+Si junto a sus vecinos no hay hueco a tiempo se prueban todas las
+posiciones; lo que aun así no cabe se inserta donde menos retraso cause
+dentro de las rutas más cercanas (o al final de la ruta más barata si ya
+se acabó el tiempo) y su hora de llegada queda fija como nuevo límite,
+para no empeorarla después. Al final se reubican clientes entre rutas con la misma prueba O(1).
+"""
+import math
+import os
+import time
+
+import numpy as np
+
+from src.IA.vrp import vecinos_cercanos, VRP_VECINOS
+
+VRPTW_TIME_BUDGET_S = float(os.getenv("VRPTW_TIME_BUDGET_S", "5.0"))
+# Metros que "vale" cada segundo de tiempo extra en la ruta al elegir dónde insertar
+VRPTW_PESO_TIEMPO = float(os.getenv("VRPTW_PESO_TIEMPO", "5.0"))
+# Rutas (las de cliente más cercano) en las que se busca hueco para lo que no llega a tiempo
+VRPTW_PLAN_B_RUTAS = int(os.getenv("VRPTW_PLAN_B_RUTAS", "5"))
+
+class _Ruta:
+    """Secuencia depósito → clientes → depósito con su horario calculado."""
+
+    def __init__(self, capacidad, p):
+        self.capacidad = capacidad
+        self.clientes = []
+        self.carga = 0.0
+        self.p = p  # parámetros compartidos del problema
+        self.recalcular()
+
+    def recalcular(self):
+        p = self.p
+        nodos = [0] + self.clientes + [0]
+        m = len(nodos)
+        llegada = [0.0] * m
+        inicio = [0.0] * m
+        llegada[0] = inicio[0] = p.salida
+        for k in range(1, m):
+            i, j = nodos[k - 1], nodos[k]
+            llegada[k] = inicio[k - 1] + p.servicio[i] + p.t[i][j]
+            inicio[k] = max(llegada[k], p.inicio[j])
+
+        # holgura[k]: cuánto puede retrasarse inicio[k] sin pasar ninguna ventana desde k
+        holgura = [0.0] * m
+        holgura[m - 1] = p.limite[0] - inicio[m - 1]
+        for k in range(m - 2, -1, -1):
+            espera = inicio[k + 1] - llegada[k + 1]
+            holgura[k] = min(p.limite[nodos[k]] - inicio[k], espera + holgura[k + 1])
+
+        self.nodos, self.llegada, self.inicio, self.holgura = nodos, llegada, inicio, holgura
+        self.pos = {c: k for k, c in enumerate(nodos[1:-1], start=1)}
+        self._np = None
+
+    def _arrays(self):
+        if self._np is None:
+            nodos = np.array(self.nodos)
+            self._np = (nodos[:-1], nodos[1:], np.array(self.inicio), np.array(self.holgura))
+        return self._np
+
+    def mejor_posicion(self, u):
+        """(costo, pos) de la mejor inserción factible de u en toda la ruta, vectorizado; None si no hay."""
+        p = self.p
+        i, j, inicio, holgura = self._arrays()
+        inicio_u = np.maximum(inicio[:-1] + p.servicio_np[i] + p.t_np[i, u], p.inicio[u])
+        empuje = np.maximum(inicio_u + p.servicio[u] + p.t_np[u, j], p.inicio_np[j]) - inicio[1:]
+        factible = (inicio_u <= p.limite[u]) & (empuje <= holgura[1:] + 1e-9)
+        if not factible.any():
+            return None
+        costo = p.d_np[i, u] + p.d_np[u, j] - p.d_np[i, j] + VRPTW_PESO_TIEMPO * np.maximum(0.0, empuje)
+        costo[~factible] = np.inf
+        pos = int(np.argmin(costo))
+        return float(costo[pos]), pos
+
+    def evaluar(self, u, pos):
+        """(costo, factible) de insertar u entre nodos[pos] y nodos[pos + 1], en O(1)."""
+        p = self.p
+        i, j = self.nodos[pos], self.nodos[pos + 1]
+        llegada_u = self.inicio[pos] + p.servicio[i] + p.t[i][u]
+        inicio_u = max(llegada_u, p.inicio[u])
+        llegada_j = inicio_u + p.servicio[u] + p.t[u][j]
+        empuje = max(llegada_j, p.inicio[j]) - self.inicio[pos + 1]
+        factible = inicio_u <= p.limite[u] and empuje <= self.holgura[pos + 1] + 1e-9
+        costo = p.d[i][u] + p.d[u][j] - p.d[i][j] + VRPTW_PESO_TIEMPO * max(0.0, empuje)
+        return costo, factible
+
+    def insertar(self, u, pos, demanda):
+        self.clientes.insert(pos, u)
+        self.carga += demanda
+        self.recalcular()
+
+    def quitar(self, u, demanda):
+        self.clientes.remove(u)
+        self.carga -= demanda
+        self.recalcular()
+
+    def retraso_si(self, u, pos, cota=math.inf) -> float:
+        """Retraso total que añade insertar u en pos.
+
+        O(1) si el empuje cabe en la holgura (solo puede llegar tarde u);
+        si no, se simula el resto de la ruta y se corta al pasar `cota`.
+        """
+        p = self.p
+        i, j = self.nodos[pos], self.nodos[pos + 1]
+        inicio_u = max(self.inicio[pos] + p.servicio[i] + p.t[i][u], p.inicio[u])
+        total = max(0.0, inicio_u - p.limite[u])
+        empuje = max(inicio_u + p.servicio[u] + p.t[u][j], p.inicio[j]) - self.inicio[pos + 1]
+        if empuje <= self.holgura[pos + 1] + 1e-9:
+            return total
+
+        t_inicio, anterior = inicio_u, u
+        for k in range(pos + 1, len(self.nodos)):
+            c = self.nodos[k]
+            t_inicio = max(t_inicio + p.servicio[anterior] + p.t[anterior][c], p.inicio[c])
+            # Desde aquí el horario ya coincide con el actual: no hay más retraso nuevo
+            if t_inicio <= self.inicio[k]:
+                break
+            total += max(0.0, t_inicio - p.limite[c]) - max(0.0, self.inicio[k] - p.limite[c])
+            if total >= cota:
+                break
+            anterior = c
+        return total
+
+
+class _Problema:
+    def __init__(self, d, t, inicio, limite, servicio, salida):
+        # Listas para los accesos escalares (más rápidos) y arrays para el barrido vectorizado
+        self.d_np, self.t_np = d, t
+        self.d, self.t = d.tolist(), t.tolist()
+        self.inicio, self.limite = inicio, limite
+        self.inicio_np = np.array(inicio)
+        self.servicio, self.salida = servicio, salida
+        self.servicio_np = np.array(servicio)
+
+
+def _sin_huecos(m):
+    m = np.asarray(m, dtype=float)
+    finitos = m[np.isfinite(m)]
+    return np.nan_to_num(m, nan=(finitos.max() * 10 if finitos.size else 1e9))
+
+
+def solve_vrptw(
+    d,
+    t,
+    ventanas: list,
+    servicio: list,
+    demanda: list,
+    capacidades: list,
+    salida: float = 0.0,
+    time_budget_s: float = None,
+    k: int = VRP_VECINOS,
+) -> dict:
+    """Resuelve el VRPTW.
+
+    d: metros (N, N) y t: segundos (N, N), con el depósito en 0.
+    ventanas: (inicio, fin) por nodo en segundos; la del depósito es la jornada.
+    Devuelve {"rutas": {vehiculo: [clientes]}, "horarios": {cliente: {...}}, "sin_asignar": [...]}.
+    """
+    budget = VRPTW_TIME_BUDGET_S if time_budget_s is None else time_budget_s
+    deadline = time.perf_counter() + budget
+    n = len(ventanas)
+    demanda = [float(x or 0) for x in demanda]
+    capacidades = [math.inf if c is None else float(c) for c in capacidades]
+
+    dist = np.asarray(d, dtype=float)
+    p = _Problema(
+        _sin_huecos(dist),
+        _sin_huecos(t),
+        [float(v[0]) for v in ventanas],
+        [float(v[1]) for v in ventanas],
+        [float(s or 0) for s in servicio],
+        float(salida),
+    )
+    if n < 2 or not capacidades:
+        return {"rutas": {}, "horarios": {}, "sin_asignar": list(range(1, n))}
+
+    vecinos = vecinos_cercanos(np.nan_to_num(dist, nan=np.inf), k) if n > 2 else np.zeros((1, 0), dtype=int)
+    rutas = [_Ruta(c, p) for c in capacidades]
+    ruta_de = {}
+    sin_asignar = [c for c in range(1, n) if demanda[c] > max(capacidades)]
+
+    def candidatos(u):
+        """Posiciones junto a los vecinos ya ruteados, más un vehículo vacío de cada capacidad."""
+        vistos = set()
+        for vecino in vecinos[u - 1]:
+            r = ruta_de.get(int(vecino))
+            if r is None or r in vistos:
+                continue
+            vistos.add(r)
+            ruta = rutas[r]
+            q = ruta.pos[int(vecino)]
+            yield r, q - 1
+            yield r, q
+        capacidades_vistas = set()
+        for r, ruta in enumerate(rutas):
+            if not ruta.clientes and ruta.capacidad not in capacidades_vistas:
+                capacidades_vistas.add(ruta.capacidad)
+                yield r, 0
+
+    def mejor_insercion_global(u):
+        mejor = None
+        for r, ruta in enumerate(rutas):
+            if ruta.carga + demanda[u] > ruta.capacidad:
+                continue
+            encontrada = ruta.mejor_posicion(u)
+            if encontrada and (mejor is None or encontrada[0] < mejor[0]):
+                mejor = (encontrada[0], r, encontrada[1])
+        return mejor
+
+    def mejor_insercion(u, excluir=None):
+        mejor = None
+        for r, pos in candidatos(u):
+            ruta = rutas[r]
+            if r == excluir or ruta.carga + demanda[u] > ruta.capacidad:
+                continue
+            costo, factible = ruta.evaluar(u, pos)
+            if factible and (mejor is None or costo < mejor[0]):
+                mejor = (costo, r, pos)
+        return mejor
+
+    # Lo más urgente primero
+    excluidas = set(sin_asignar)
+    orden = sorted((c for c in range(1, n) if c not in excluidas), key=lambda c: (p.limite[c], p.inicio[c]))
+    tarde = []
+    for u in orden:
+        mejor = mejor_insercion(u)
+        if mejor is None:
+            tarde.append(u)
+            continue
+        _, r, pos = mejor
+        rutas[r].insertar(u, pos, demanda[u])
+        for c in rutas[r].clientes:
+            ruta_de[c] = r
+
+    # Sin hueco cerca de sus vecinos: probar a tiempo en cualquier posición (O(1) cada una, vectorizado por ruta)
+    sin_hueco, tarde = tarde, []
+    for u in sin_hueco:
+        mejor = mejor_insercion_global(u)
+        if mejor is None:
+            tarde.append(u)
+            continue
+        _, r, pos = mejor
+        rutas[r].insertar(u, pos, demanda[u])
+        for c in rutas[r].clientes:
+            ruta_de[c] = r
+
+    def rutas_cercanas(u):
+        """Índices de las VRPTW_PLAN_B_RUTAS rutas con capacidad cuyo cliente más cercano está más cerca de u."""
+        cercania = []
+        for r, ruta in enumerate(rutas):
+            if ruta.carga + demanda[u] > ruta.capacidad:
+                continue
+            nodos = ruta.clientes or [0]
+            cercania.append((float(p.d_np[u, nodos].min()), r))
+        cercania.sort()
+        return [r for _, r in cercania[:VRPTW_PLAN_B_RUTAS]]
+
+    def al_final(u):
+        """Sin tiempo: la ruta con capacidad cuyo final queda más barato alargar."""
+        mejor = None
+        for r, ruta in enumerate(rutas):
+            if ruta.carga + demanda[u] > ruta.capacidad:
+                continue
+            ultimo = ruta.nodos[-2]
+            costo = p.d[ultimo][u] + p.d[u][0] - p.d[ultimo][0]
+            if mejor is None or costo < mejor[0]:
+                mejor = (costo, r, len(ruta.nodos) - 2)
+        return mejor
+
+    def mejor_retraso(u):
+        mejor = None
+        for r in rutas_cercanas(u):
+            ruta = rutas[r]
+            for pos in range(len(ruta.nodos) - 1):
+                costo, _ = ruta.evaluar(u, pos)
+                retraso = ruta.retraso_si(u, pos, mejor[0][0] if mejor else math.inf)
+                if mejor is None or (retraso, costo) < mejor[0]:
+                    mejor = ((retraso, costo), r, pos)
+        return mejor
+
+    # Plan B: donde menos retraso cause entre las rutas más cercanas; agotado el tiempo, al final de la más barata
+    for u in tarde:
+        mejor = mejor_retraso(u) if time.perf_counter() < deadline else al_final(u)
+        if mejor is None:
+            sin_asignar.append(u)
+            continue
+        _, r, pos = mejor
+        ruta = rutas[r]
+        ruta.insertar(u, pos, demanda[u])
+        # Las llegadas ya tarde quedan como límite: no se permite empeorarlas
+        for k, c in enumerate(ruta.nodos[1:-1], start=1):
+            p.limite[c] = max(p.limite[c], ruta.inicio[k])
+        ruta.recalcular()
+        for c in ruta.clientes:
+            ruta_de[c] = r
+
+    # Reubicación entre rutas con la misma prueba O(1)
+    mejoro = True
+    while mejoro and time.perf_counter() < deadline:
+        mejoro = False
+        for u in list(ruta_de):
+            if time.perf_counter() > deadline:
+                break
+            r1 = ruta_de[u]
+            ruta = rutas[r1]
+            q = ruta.pos[u]
+            i, j = ruta.nodos[q - 1], ruta.nodos[q + 1]
+            ganancia = p.d[i][u] + p.d[u][j] - p.d[i][j]
+            mejor = mejor_insercion(u, excluir=r1)
+            if mejor is None or mejor[0] >= ganancia - 1e-9:
+                continue
+            _, r2, pos = mejor
+            ruta.quitar(u, demanda[u])
+            rutas[r2].insertar(u, pos, demanda[u])
+            for c in rutas[r2].clientes:
+                ruta_de[c] = r2
+            mejoro = True
+
+    horarios = {}
+    for ruta in rutas:
+        for k, c in enumerate(ruta.nodos[1:-1], start=1):
+            horarios[c] = {
+                "llegada": ruta.llegada[k],
+                "inicio_servicio": ruta.inicio[k],
+                "retraso": max(0.0, ruta.inicio[k] - float(ventanas[c][1])),
+            }
+
+    return {
+        "rutas": {v: list(r.clientes) for v, r in enumerate(rutas) if r.clientes},
+        "horarios": horarios,
+        "sin_asignar": sin_asignar,
+    }
@@ -1,6 +1,18 @@
+import json
 from fastapi import WebSocket, WebSocketDisconnect
 from .estado import state
 
+# Mensajes que el cliente puede mandar por /ws: {"type": ..., ...} -> manejador(mensaje) -> dict de respuesta
+manejadores = {}
+
+async def difundir(mensaje: dict):
+    # Copia: un cliente puede desconectarse mientras se envía
+    for ws in list(state["websockets"]):
+        try:
+            await ws.send_json(mensaje)
+        except Exception:
+            state["websockets"].discard(ws)
+
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     state["websockets"].add(websocket)
@@ -12,6 +24,13 @@ async def websocket_endpoint(websocket: WebSocket):
                 "ruta_geom": [{"lat": p[0], "lng": p[1]} for p in state["ruta_geom"]]
             })
         while True:
-            await websocket.receive_text()
+            texto = await websocket.receive_text()
+            try:
+                mensaje = json.loads(texto)
+            except ValueError:
+                continue
+            manejador = manejadores.get(mensaje.get("type")) if isinstance(mensaje, dict) else None
+            if manejador:
+                await websocket.send_json(manejador(mensaje))
     except WebSocketDisconnect:
-        state["websockets"].remove(websocket)
\ No newline at end of file
+        state["websockets"].discard(websocket)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List
 
@@ -6,6 +6,7 @@ from typing import List
 from database import get_db
 import crud
 import schemas
+from src.services.geocode_pipeline import backfill
 
 
 router = APIRouter(prefix="/clientes", tags=["Clientes"])
@@ -15,6 +16,20 @@ router = APIRouter(prefix="/clientes", tags=["Clientes"])
 def listar_clientes(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     return crud.get_clientes(db, skip=skip, limit=limit)
 
+# Geocodificación masiva (antes de /{id_cliente} para que no la capture)
+@router.post("/geocodificacion/backfill")
+def iniciar_backfill(reiniciar: bool = Query(False)):
+    """Arranca o reanuda el backfill de coordenadas; responde sin esperar."""
+    return backfill.iniciar(reiniciar=reiniciar)
+
+@router.get("/geocodificacion/progreso")
+def progreso_backfill():
+    return backfill.estado()
+
+@router.post("/geocodificacion/cancelar")
+def cancelar_backfill():
+    return backfill.cancelar()
+
 # Obtener un cliente por ID
 @router.get("/{id_cliente}", response_model=schemas.Cliente)
 def obtener_cliente(id_cliente: int, db: Session = Depends(get_db)):
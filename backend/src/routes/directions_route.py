@@ -1,8 +1,13 @@
 from fastapi import APIRouter, Query
-from src.services.navigation_sdk import get_route
+from src.services.navigation_sdk import directions_cache, get_route
 
 router = APIRouter(prefix="/directions", tags=["Directions"])
 
 @router.get("/")
 def directions_endpoint(origin: str = Query(...), destination: str = Query(...)):
-    return get_route(origin, destination)
+    return get_route(origin, destination, with_geometry=True)
+
+# Uso de la caché de direcciones (entradas, bytes en memoria, aciertos)
+@router.get("/stats")
+def directions_stats():
+    return directions_cache.stats()
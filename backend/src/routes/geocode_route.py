@@ -1,5 +1,8 @@
-from fastapi import APIRouter, Query
-from src.services.geocoding import geocode
+import json
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from src.services.geocoding import geocode, geocode_batch, geocode_cache
 
 router = APIRouter(prefix="/geocode", tags=["Geocoding"])
 
@@ -7,3 +10,53 @@ router = APIRouter(prefix="/geocode", tags=["Geocoding"])
 def geocode_endpoint(address: str = Query(...)):
     lat, lng = geocode(address)
     return {"latitud": lat, "longitud": lng}
+
+# Aciertos/fallos de la caché y ahorro estimado de cuota y latencia
+@router.get("/stats")
+def geocode_stats():
+    return geocode_cache.stats()
+
+
+def _leer_direcciones(raw: bytes, content_type: str) -> list:
+    """Acepta una lista JSON, {"addresses": [...]} o NDJSON (una dirección por línea).
+
+    El cuerpo llega completo: se deduplica el lote entero antes de pedir nada.
+    Cualquier otra forma (un número, un texto suelto, un elemento o una línea
+    que no es dirección) lanza ValueError.
+    """
+    texto = raw.decode("utf-8")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        direcciones = []
+        for numero, linea in enumerate(texto.splitlines(), start=1):
+            linea = linea.strip()
+            if not linea:
+                continue
+            item = json.loads(linea)
+            if isinstance(item, dict):
+                item = item.get("address")
+            if not isinstance(item, str):
+                raise ValueError(f"línea {numero}: se espera una dirección")
+            direcciones.append(item)
+        return direcciones
+
+    data = json.loads(texto)
+    if isinstance(data, dict):
+        data = data.get("addresses", [])
+    if not isinstance(data, list):
+        raise ValueError("se espera una lista de direcciones")
+    for numero, item in enumerate(data, start=1):
+        if not isinstance(item, str):
+            raise ValueError(f"elemento {numero}: se espera una dirección")
+    return data
+
+
+# Lote de direcciones (se lee completo): responde NDJSON conforme se van resolviendo
+@router.post("/batch")
+async def geocode_batch_endpoint(request: Request, region: str = Query(None)):
+    try:
+        direcciones = _leer_direcciones(await request.body(), request.headers.get("content-type", ""))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cuerpo inválido: se espera lista JSON o NDJSON")
+
+    lineas = (json.dumps(fila, ensure_ascii=False) + "\n" for fila in geocode_batch(direcciones, region))
+    return StreamingResponse(lineas, media_type="application/x-ndjson")
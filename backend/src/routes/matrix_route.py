@@ -1,11 +1,20 @@
-from fastapi import APIRouter, Query
-from src.services.matrix import get_distance_matrix
+from fastapi import APIRouter, HTTPException, Query
+from src.services.matrix import ENGINES, compute_matrix, get_distance_matrix
 
 router = APIRouter(prefix="/matrix", tags=["Distance Matrix"])
 
 @router.get("/")
 def matrix_endpoint(
     origins: list[str] = Query(...),
-    destinations: list[str] = Query(...)
+    destinations: list[str] = Query(...),
+    dense: bool = Query(False),
+    engine: str = Query("google")
 ):
+    if engine not in ENGINES:
+        raise HTTPException(status_code=400, detail=f"engine debe ser uno de {', '.join(ENGINES)}")
+
+    # dense=true: matrices de metros/segundos con null en los huecos
+    # (local/hybrid siempre responden en formato denso)
+    if dense or engine != "google":
+        return compute_matrix(origins, destinations, engine=engine).to_dict()
     return get_distance_matrix(origins, destinations)
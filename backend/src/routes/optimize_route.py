@@ -4,9 +4,13 @@ from src.services.optimize import optimize_route   # ← ESTA ES LA RUTA CORRECT
 router = APIRouter(prefix="/optimize", tags=["Route Optimization"])
 
 @router.get("/")
-def optimize_endpoint(locations: list[str] = Query(...)):
+def optimize_endpoint(locations: list[str] = Query(...), compact: bool = Query(False)):
     result = optimize_route(locations)
 
+    # compact=true: sin "raw" y con la polilínea codificada en vez de expandida
+    if compact and isinstance(result, dict) and "summary" in result:
+        return result["summary"]
+
     # Si se decodificó la geometría, la incluimos en la respuesta
     if isinstance(result, dict) and "decoded_geometry" in result:
         return {
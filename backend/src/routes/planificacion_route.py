@@ -0,0 +1,107 @@
+import asyncio
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from sqlalchemy.orm import Session
+from database import SessionLocal, get_db
+import crud
+import models
+import schemas
+from src.services import planning_jobs
+from src.services.matrix import ENGINES
+
+router = APIRouter(prefix="/planificacion", tags=["Planificación"])
+
+
+def _trabajo_o_404(db: Session, id_trabajo: int) -> models.TrabajoPlanificacion:
+    trabajo = db.get(models.TrabajoPlanificacion, id_trabajo)
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return trabajo
+
+# =========================================
+# POST: Planificar el día en segundo plano
+# =========================================
+@router.post("/trabajos", response_model=schemas.TrabajoPlanificacion, status_code=202)
+def crear_trabajo(
+    data: schemas.PlanificarRutas,
+    engine: str = Query(crud.VRP_MATRIX_ENGINE),
+    forzar: bool = Query(False),
+    db: Session = Depends(get_db),
+):
+    if engine not in ENGINES:
+        raise HTTPException(status_code=400, detail=f"engine debe ser uno de {', '.join(ENGINES)}")
+    return planning_jobs.a_schema(planning_jobs.enviar(db, data, engine, forzar=forzar))
+
+# =========================================
+# GET: Listar trabajos (sin resultado)
+# =========================================
+@router.get("/trabajos", response_model=list[schemas.TrabajoPlanificacion])
+def listar_trabajos(
+    fecha: Optional[date] = Query(None),
+    estado: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+):
+    query = db.query(models.TrabajoPlanificacion)
+    if fecha:
+        query = query.filter(models.TrabajoPlanificacion.fecha == fecha)
+    if estado:
+        query = query.filter(models.TrabajoPlanificacion.estado == estado)
+    trabajos = query.order_by(models.TrabajoPlanificacion.id_trabajo.desc()).limit(100).all()
+    return [planning_jobs.a_schema(t).model_copy(update={"resultado": None}) for t in trabajos]
+
+# =========================================
+# GET: Estado, progreso y resultado
+# =========================================
+@router.get("/trabajos/{id_trabajo}", response_model=schemas.TrabajoPlanificacion)
+def obtener_trabajo(id_trabajo: int, db: Session = Depends(get_db)):
+    return planning_jobs.a_schema(_trabajo_o_404(db, id_trabajo))
+
+# =========================================
+# POST: Volver a ejecutar (reemplaza las rutas guardadas)
+# =========================================
+@router.post("/trabajos/{id_trabajo}/reejecutar", response_model=schemas.TrabajoPlanificacion, status_code=202)
+def reejecutar_trabajo(id_trabajo: int, db: Session = Depends(get_db)):
+    return planning_jobs.a_schema(planning_jobs.reejecutar(db, _trabajo_o_404(db, id_trabajo)))
+
+# =========================================
+# POST: Cancelar
+# =========================================
+@router.post("/trabajos/{id_trabajo}/cancelar", response_model=schemas.TrabajoPlanificacion)
+def cancelar_trabajo(id_trabajo: int, db: Session = Depends(get_db)):
+    return planning_jobs.a_schema(planning_jobs.cancelar(db, _trabajo_o_404(db, id_trabajo)))
+
+# =========================================
+# WS: Progreso en vivo hasta que termina
+# =========================================
+def _estado_actual(id_trabajo: int):
+    db = SessionLocal()
+    try:
+        trabajo = db.get(models.TrabajoPlanificacion, id_trabajo)
+        return planning_jobs.a_schema(trabajo) if trabajo else None
+    finally:
+        db.close()
+
+
+@router.websocket("/trabajos/{id_trabajo}/ws")
+async def seguir_trabajo(websocket: WebSocket, id_trabajo: int):
+    await websocket.accept()
+    anterior = None
+    try:
+        while True:
+            # El progreso lo escribe otro proceso: se consulta la fila
+            trabajo = await asyncio.to_thread(_estado_actual, id_trabajo)
+            if trabajo is None:
+                await websocket.send_json({"error": "Trabajo no encontrado"})
+                break
+            resumen = (trabajo.estado, trabajo.etapa, trabajo.progreso)
+            if resumen != anterior:
+                await websocket.send_json(trabajo.model_dump(mode="json"))
+                anterior = resumen
+            if trabajo.estado not in planning_jobs.ACTIVOS:
+                break
+            await asyncio.sleep(planning_jobs.PLANNING_PROGRESO_INTERVALO_S)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
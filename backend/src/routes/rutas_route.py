@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 from database import get_db
+import crud
 import models
 import schemas
+from src.services import live_reopt, route_cache
+from src.services.matrix import ENGINES
 
 router = APIRouter(prefix="/rutas", tags=["Rutas"])
 
@@ -41,6 +47,83 @@ def crear_ruta(data: schemas.RutaCreate, db: Session = Depends(get_db)):
     db.refresh(nueva)
     return nueva
 
+# =========================================
+# POST: Optimizar orden de visita (TSP)
+# =========================================
+@router.post("/optimizar", response_model=list[schemas.ResultadoRutaOptimizada])
+def optimizar_ruta(
+    data: schemas.ListaClientesOptimizar,
+    engine: str = Query(crud.OPTIMIZE_MATRIX_ENGINE),
+    time_budget_s: float = Query(None, gt=0, le=30),
+    regresar: bool = Query(False),
+    starts: int = Query(crud.OPTIMIZE_STARTS, ge=1, le=64),
+    usar_cache: bool = Query(True),
+    db: Session = Depends(get_db),
+):
+    if engine not in ENGINES:
+        raise HTTPException(status_code=400, detail=f"engine debe ser uno de {', '.join(ENGINES)}")
+    return crud.optimizar_ruta(
+        db, data.cliente_ids, engine=engine, time_budget_s=time_budget_s, regresar=regresar, starts=starts,
+        usar_cache=usar_cache,
+    )
+
+# Uso de la caché de rutas optimizadas (aciertos, entradas en memoria)
+@router.get("/optimizar/cache")
+def optimizar_cache_stats():
+    return route_cache.stats()
+
+# =========================================
+# POST: Planificar el día en varios vehículos (CVRP)
+# =========================================
+@router.post("/planificar", response_model=schemas.ResultadoPlanificacion)
+def planificar_rutas(
+    data: schemas.PlanificarRutas,
+    engine: str = Query(crud.VRP_MATRIX_ENGINE),
+    db: Session = Depends(get_db),
+):
+    if engine not in ENGINES:
+        raise HTTPException(status_code=400, detail=f"engine debe ser uno de {', '.join(ENGINES)}")
+    return crud.planificar_rutas(db, data, engine=engine)
+
+# =========================================
+# POST: Posición GPS del repartidor
+# =========================================
+@router.post("/{id_ruta}/posicion")
+async def registrar_posicion(id_ruta: int, data: schemas.PosicionGPS):
+    live_reopt.registrar_posicion(id_ruta, data.lat, data.lng)
+    await live_reopt.difundir(id_ruta, {"type": "position", "id_ruta": id_ruta, "lat": data.lat, "lng": data.lng})
+    return {"ok": True}
+
+# =========================================
+# WS: Canal de la ruta (posición y re-optimizaciones)
+# =========================================
+@router.websocket("/{id_ruta}/ws")
+async def canal_ruta(websocket: WebSocket, id_ruta: int):
+    await websocket.accept()
+    live_reopt.suscribir(id_ruta, websocket)
+    try:
+        while True:
+            # La app del repartidor también puede mandar su posición por aquí
+            try:
+                mensaje = json.loads(await websocket.receive_text())
+            except ValueError:
+                continue
+            if isinstance(mensaje, dict) and mensaje.get("type") == "position":
+                try:
+                    posicion = schemas.PosicionGPS(lat=mensaje.get("lat"), lng=mensaje.get("lng"))
+                except ValidationError:
+                    continue
+                live_reopt.registrar_posicion(id_ruta, posicion.lat, posicion.lng)
+                await live_reopt.difundir(
+                    id_ruta,
+                    {"type": "position", "id_ruta": id_ruta, "lat": posicion.lat, "lng": posicion.lng},
+                    excepto=websocket,
+                )
+    except WebSocketDisconnect:
+        pass
+    finally:
+        live_reopt.desuscribir(id_ruta, websocket)
+
 # =========================================
 # DELETE: Eliminar ruta
 # =========================================
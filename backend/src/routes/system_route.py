@@ -6,6 +6,7 @@ import os
 from database import get_db          # ← CORRECTO
 from auth import hash_password       # ← CORRECTO
 import crud                          # ← ESTO SÍ SE CAMBIA
+from src.services import utils as maps_utils
 
 router = APIRouter(prefix="/system", tags=["Sistema"])
 
@@ -45,3 +46,9 @@ def reset_superadmin(data: ResetRequest, db: Session = Depends(get_db)):
         "mensaje": "Contraseña del superadmin ha sido restablecida.",
         "nueva_contraseña": nueva_password
     }
+
+
+# 📊 Métricas del proveedor de mapas (llamadas reales vs. coalescidas)
+@router.get("/provider-stats")
+def provider_stats():
+    return maps_utils.metrics()
@@ -0,0 +1,306 @@
+"""
+Caché en dos niveles para las respuestas del proveedor de mapas:
+un LRU en memoria del proceso delante de una tabla SQLite en disco.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_PATH = os.getenv(
+    "MAPS_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "..", "cache", "maps_cache.sqlite3"),
+)
+
+# Marca para distinguir "no está en caché" de un valor None cacheado (caché negativa)
+MISS = object()
+
+
+class LRUCache:
+    """LRU en memoria con expiración por entrada. Seguro entre hilos."""
+
+    def __init__(self, maxsize=10_000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key, MISS)
+            if item is MISS:
+                return MISS
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return MISS
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ByteLRUCache(LRUCache):
+    """LRU que expulsa por tamaño total en bytes en vez de por número de entradas."""
+
+    OVERHEAD = 64  # tupla, clave y referencias por entrada (aprox.)
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, sizeof=None):
+        super().__init__(maxsize=None)
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._sizeof = sizeof or (lambda key, value: len(key) + len(json.dumps(value)))
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        size = self._sizeof(key, value) + self.OVERHEAD
+        with self._lock:
+            anterior = self._data.pop(key, None)
+            if anterior is not None:
+                self.nbytes -= anterior[2]
+            self._data[key] = (value, expires_at, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes and len(self._data) > 1:
+                _, (_, _, expulsado) = self._data.popitem(last=False)
+                self.nbytes -= expulsado
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key, MISS)
+            if item is MISS:
+                return MISS
+            value, expires_at, size = item
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                self.nbytes -= size
+                return MISS
+            self._data.move_to_end(key)
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is not None:
+                self.nbytes -= item[2]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+
+class SQLiteStore:
+    """Tabla clave/valor (JSON) en SQLite, separada por namespace."""
+
+    def __init__(self, path=CACHE_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS cache (
+                    ns TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT,
+                    expires_at REAL,
+                    PRIMARY KEY (ns, key)
+                )"""
+            )
+
+    def get(self, ns, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE ns = ? AND key = ?", (ns, key)
+            ).fetchone()
+        if row is None:
+            return MISS, None
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            self.delete(ns, key)
+            return MISS, None
+        return json.loads(value), expires_at
+
+    def set(self, ns, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (ns, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (ns, key, json.dumps(value), expires_at),
+            )
+
+    def get_many(self, ns, keys):
+        """Devuelve {key: (value, expires_at)} solo para las claves vigentes."""
+        encontrados = {}
+        ahora = time.time()
+        keys = list(keys)
+        for inicio in range(0, len(keys), 500):
+            lote = keys[inicio:inicio + 500]
+            marcas = ",".join("?" * len(lote))
+            with self._lock:
+                filas = self._conn.execute(
+                    f"SELECT key, value, expires_at FROM cache WHERE ns = ? AND key IN ({marcas})",
+                    (ns, *lote),
+                ).fetchall()
+            for key, value, expires_at in filas:
+                if expires_at is None or expires_at >= ahora:
+                    encontrados[key] = (json.loads(value), expires_at)
+        return encontrados
+
+    def set_many(self, ns, items, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        filas = [(ns, key, json.dumps(value), expires_at) for key, value in items]
+        with self._lock:
+            # Una sola transacción: en autocommit cada fila sería un commit a disco
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO cache (ns, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                    filas,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, ns, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE ns = ? AND key = ?", (ns, key))
+
+    def purge_expired(self):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),)
+            )
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SQLiteStore()
+    return _store
+
+
+class TieredCache:
+    """LRU en memoria + SQLite, con TTL, caché negativa y contadores."""
+
+    def __init__(self, ns, maxsize=10_000, ttl=None, negative_ttl=None, store=None, memory=None):
+        self.ns = ns
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory = memory if memory is not None else LRUCache(maxsize)
+        self._store = store
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits_memoria": 0,
+            "hits_disco": 0,
+            "hits_negativos": 0,
+            "misses": 0,
+            "llamadas_proveedor": 0,
+            "ms_proveedor": 0.0,
+        }
+
+    @property
+    def store(self):
+        return self._store or get_store()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not MISS:
+            self._count("hits_memoria")
+        else:
+            value, expires_at = self.store.get(self.ns, key)
+            if value is MISS:
+                self._count("misses")
+                return MISS
+            self._count("hits_disco")
+            self.memory.set(key, value, expires_at - time.time() if expires_at else None)
+        if value is None:
+            self._count("hits_negativos")
+        return value
+
+    def set(self, key, value):
+        ttl = self.negative_ttl if value is None else self.ttl
+        self.memory.set(key, value, ttl)
+        self.store.set(self.ns, key, value, ttl)
+
+    def get_many(self, keys):
+        """Como get() para varias claves; las ausentes no aparecen en el resultado."""
+        encontrados, faltan = {}, []
+        for key in keys:
+            value = self.memory.get(key)
+            if value is MISS:
+                faltan.append(key)
+            else:
+                encontrados[key] = value
+        self._count("hits_memoria", len(encontrados))
+
+        if faltan:
+            en_disco = self.store.get_many(self.ns, faltan)
+            for key, (value, expires_at) in en_disco.items():
+                self.memory.set(key, value, expires_at - time.time() if expires_at else None)
+                encontrados[key] = value
+            self._count("hits_disco", len(en_disco))
+            self._count("misses", len(faltan) - len(en_disco))
+        return encontrados
+
+    def set_many(self, items):
+        items = list(items)
+        for key, value in items:
+            self.memory.set(key, value, self.ttl)
+        self.store.set_many(self.ns, items, self.ttl)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        self.store.delete(self.ns, key)
+
+    def record_upstream(self, elapsed_s):
+        """Registra una llamada real al proveedor (para estimar el ahorro)."""
+        with self._lock:
+            self._stats["llamadas_proveedor"] += 1
+            self._stats["ms_proveedor"] += elapsed_s * 1000
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+        hits = s["hits_memoria"] + s["hits_disco"]
+        total = hits + s["misses"]
+        ms_medio = s["ms_proveedor"] / s["llamadas_proveedor"] if s["llamadas_proveedor"] else 0.0
+        s["ms_proveedor"] = round(s["ms_proveedor"], 1)
+        s["hit_ratio"] = round(hits / total, 4) if total else 0.0
+        s["llamadas_ahorradas"] = hits
+        s["ms_ahorrados_estimados"] = round(hits * ms_medio, 1)
+        s["entradas_memoria"] = len(self.memory)
+        if isinstance(self.memory, ByteLRUCache):
+            s["bytes_memoria"] = self.memory.nbytes
+        return s
@@ -0,0 +1,111 @@
+"""
+Distancias entre coordenadas (lat, lng) en metros.
+
+Tres niveles de precisión, de más rápido a más exacto:
+- "equirectangular": proyección plana local; a escala de ciudad coincide
+  con haversine salvo diferencias de 1e-4 %.
+- "haversine": círculo máximo sobre la esfera; hasta ~0.5 % de error frente
+  al elipsoide (el modelo de esfera, no la fórmula).
+- "geodesic": elipsoide WGS-84 (Karney, geopy); solo para pocos pares.
+
+Para ordenar candidatos (vecino más cercano, inserción más barata) basta el
+equirectangular; DISTANCE_PRECISION fija el nivel por defecto. Hay versión
+escalar (math, sin NumPy) y núcleos vectorizados uno→muchos y muchos→muchos.
+"""
+import math
+import os
+
+import numpy as np
+
+EARTH_RADIUS_M = 6_371_008.8
+
+PRECISIONS = ("equirectangular", "haversine", "geodesic")
+DISTANCE_PRECISION = os.getenv("DISTANCE_PRECISION", "haversine")
+
+
+def _nivel(precision):
+    precision = precision or DISTANCE_PRECISION
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision debe ser uno de {PRECISIONS}")
+    return precision
+
+
+# ---------- escalares ----------
+
+def haversine_m(a, b) -> float:
+    lat1, lng1 = math.radians(a[0]), math.radians(a[1])
+    lat2, lng2 = math.radians(b[0]), math.radians(b[1])
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(max(h, 0.0), 1.0)))
+
+
+def equirectangular_m(a, b) -> float:
+    lat1, lat2 = math.radians(a[0]), math.radians(b[0])
+    x = math.radians(b[1] - a[1]) * math.cos((lat1 + lat2) / 2)
+    return EARTH_RADIUS_M * math.hypot(x, lat2 - lat1)
+
+
+def geodesic_m(a, b) -> float:
+    # geopy solo hace falta en este nivel
+    from geopy.distance import geodesic
+
+    return geodesic(a, b).meters
+
+
+_ESCALARES = {"equirectangular": equirectangular_m, "haversine": haversine_m, "geodesic": geodesic_m}
+
+
+def distance_m(a, b, precision: str = None) -> float:
+    """Distancia entre dos puntos con el nivel pedido (o DISTANCE_PRECISION)."""
+    return _ESCALARES[_nivel(precision)](a, b)
+
+
+# ---------- vectorizados ----------
+
+def haversine_matrix(a, b=None) -> np.ndarray:
+    """Matriz N×M de distancias en metros entre los puntos (lat, lng) de `a` y `b`.
+
+    Se calcula en una sola operación con broadcasting; si `b` es None se usa `a`.
+    """
+    a = np.radians(np.asarray(a, dtype=float).reshape(-1, 2))
+    b = a if b is None else np.radians(np.asarray(b, dtype=float).reshape(-1, 2))
+
+    lat1, lng1 = a[:, 0:1], a[:, 1:2]
+    lat2, lng2 = b[:, 0], b[:, 1]
+    h = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def equirectangular_matrix(a, b=None) -> np.ndarray:
+    """Como haversine_matrix con la aproximación plana (sin trigonometría inversa)."""
+    a = np.radians(np.asarray(a, dtype=float).reshape(-1, 2))
+    b = a if b is None else np.radians(np.asarray(b, dtype=float).reshape(-1, 2))
+
+    lat1, lng1 = a[:, 0:1], a[:, 1:2]
+    lat2, lng2 = b[:, 0], b[:, 1]
+    x = (lng2 - lng1) * np.cos((lat1 + lat2) / 2)
+    y = lat2 - lat1
+    return EARTH_RADIUS_M * np.sqrt(x * x + y * y)
+
+
+def geodesic_matrix(a, b=None) -> np.ndarray:
+    """Elipsoide par a par (lento: O(N·M) llamadas a geopy)."""
+    a = np.asarray(a, dtype=float).reshape(-1, 2)
+    b = a if b is None else np.asarray(b, dtype=float).reshape(-1, 2)
+    return np.array([[geodesic_m(p, q) for q in b] for p in a]).reshape(len(a), len(b))
+
+
+_MATRICES = {"equirectangular": equirectangular_matrix, "haversine": haversine_matrix, "geodesic": geodesic_matrix}
+
+
+def distance_matrix(a, b=None, precision: str = None) -> np.ndarray:
+    """Muchos→muchos: matriz N×M en metros."""
+    return _MATRICES[_nivel(precision)](a, b)
+
+
+def one_to_many(origen, puntos, precision: str = None) -> np.ndarray:
+    """Uno→muchos: vector de distancias desde `origen` a cada punto."""
+    return distance_matrix([origen], puntos, precision)[0]
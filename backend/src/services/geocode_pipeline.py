@@ -0,0 +1,274 @@
+"""
+Geocodificación de clientes en segundo plano.
+
+- Al crear o cambiar la dirección de un cliente se encola su id y un hilo
+  trabajador rellena latitud/longitud; la petición HTTP no espera.
+- El backfill recorre por id los clientes sin coordenadas (o con coordenadas
+  viejas) en páginas, guardando el cursor en el SQLite de la caché para poder
+  reanudarse tras un reinicio.
+- Cada cliente guarda cuándo y de dónde salieron sus coordenadas
+  (coords_actualizadas_en / coords_origen). La hora es siempre la de la base
+  de datos (NOW()), igual que en la migración db/03.
+"""
+import logging
+import os
+import queue
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, or_
+
+import models
+from database import SessionLocal
+from src.services.cache import MISS, get_store
+from src.services.geocoding import geocode, geocode_batch
+
+logger = logging.getLogger(__name__)
+
+# Coordenadas geocodificadas más viejas que esto se vuelven a pedir en el backfill
+GEOCODE_COORDS_MAX_AGE_DAYS = int(os.getenv("GEOCODE_COORDS_MAX_AGE_DAYS", "180"))
+GEOCODE_BACKFILL_PAGE = int(os.getenv("GEOCODE_BACKFILL_PAGE", "200"))
+GEOCODE_REGION = os.getenv("GEOCODE_REGION") or None
+
+ORIGEN_MANUAL = "manual"
+ORIGEN_GEOCODE = "geocode"
+ORIGEN_SIN_RESULTADO = "sin_resultado"
+
+_STORE_NS = "geocode_backfill"
+
+_cola = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _aplicar(cliente, coords):
+    lat, lng = coords if coords else (None, None)
+    cliente.latitud = lat
+    cliente.longitud = lng
+    cliente.coords_origen = ORIGEN_GEOCODE if lat is not None else ORIGEN_SIN_RESULTADO
+    cliente.coords_actualizadas_en = func.now()
+
+
+def _recargar(db, ids):
+    """Relee y bloquea hasta confirmar: mientras se consultaba al proveedor pudieron capturarse a mano."""
+    return (
+        db.query(models.Cliente)
+        .filter(models.Cliente.id_cliente.in_(ids))
+        .populate_existing()
+        .with_for_update()
+        .all()
+    )
+
+
+def _sigue_vigente(cliente, direccion) -> bool:
+    """Las coordenadas manuales no se pisan y una dirección nueva ya tiene su propio encargo."""
+    return cliente.coords_origen != ORIGEN_MANUAL and cliente.direccion == direccion
+
+
+# =======================================================
+# Geocodificación al escribir
+# =======================================================
+
+def _geocodificar_cliente(id_cliente):
+    db = SessionLocal()
+    try:
+        cliente = db.query(models.Cliente).filter(models.Cliente.id_cliente == id_cliente).first()
+        if not cliente or not (cliente.direccion or "").strip():
+            return
+        direccion = cliente.direccion
+        coords = geocode(direccion, GEOCODE_REGION)
+        if not _recargar(db, [id_cliente]) or not _sigue_vigente(cliente, direccion):
+            return
+        _aplicar(cliente, coords)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _trabajar():
+    while True:
+        id_cliente = _cola.get()
+        try:
+            _geocodificar_cliente(id_cliente)
+        except Exception:
+            # Queda sin coordenadas: no hay reintento automático, lo recoge el próximo backfill
+            logger.exception("No se pudo geocodificar el cliente %s", id_cliente)
+        finally:
+            _cola.task_done()
+
+
+def encolar(id_cliente: int):
+    """Pide coordenadas para el cliente sin bloquear al que llama."""
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = threading.Thread(target=_trabajar, name="geocode-pipeline", daemon=True)
+                _worker.start()
+    _cola.put(id_cliente)
+
+
+def pendientes_en_cola() -> int:
+    return _cola.qsize()
+
+
+# =======================================================
+# Backfill reanudable
+# =======================================================
+
+class BackfillJob:
+    """Un solo backfill a la vez; el progreso y el cursor persisten en SQLite."""
+
+    def __init__(self, store=None):
+        self._store = store
+        self._lock = threading.Lock()
+        self._thread = None
+        self._cancelar = threading.Event()
+        self._progreso = None
+
+    @property
+    def progreso(self):
+        # Se carga al primer uso para no abrir el SQLite al importar
+        if self._progreso is None:
+            self._progreso = self._cargar()
+        return self._progreso
+
+    @progreso.setter
+    def progreso(self, value):
+        self._progreso = value
+
+    @property
+    def store(self):
+        return self._store or get_store()
+
+    def _cargar(self):
+        try:
+            guardado, _ = self.store.get(_STORE_NS, "progreso")
+        except Exception:
+            guardado = MISS
+        if guardado is MISS:
+            return self._inicial()
+        if guardado.get("estado") == "en_curso":
+            # El proceso murió a mitad: se reanuda desde el cursor
+            guardado["estado"] = "interrumpido"
+        return guardado
+
+    @staticmethod
+    def _inicial():
+        return {
+            "estado": "inactivo",
+            "cursor": 0,
+            "total": 0,
+            "procesados": 0,
+            "geocodificados": 0,
+            "sin_resultado": 0,
+            "errores": 0,
+            "iniciado_en": None,
+            "terminado_en": None,
+        }
+
+    def _guardar(self):
+        self.store.set(_STORE_NS, "progreso", self.progreso)
+
+    def _filtro(self, query):
+        # Mismo reloj con el que se escribió coords_actualizadas_en
+        limite = query.session.query(func.now()).scalar() - timedelta(days=GEOCODE_COORDS_MAX_AGE_DAYS)
+        return query.filter(
+            models.Cliente.direccion.isnot(None),
+            models.Cliente.direccion != "",
+            or_(
+                models.Cliente.latitud.is_(None),
+                models.Cliente.longitud.is_(None),
+                # Las coordenadas capturadas a mano no caducan (NULL != 'manual' no es verdadero en SQL)
+                or_(models.Cliente.coords_origen.is_(None), models.Cliente.coords_origen != ORIGEN_MANUAL)
+                & or_(
+                    models.Cliente.coords_actualizadas_en.is_(None),
+                    models.Cliente.coords_actualizadas_en < limite,
+                ),
+            ),
+        )
+
+    def iniciar(self, reiniciar: bool = False) -> dict:
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return self.estado()
+            if reiniciar or self.progreso["estado"] in ("inactivo", "terminado"):
+                self.progreso = self._inicial()
+            self.progreso["estado"] = "en_curso"
+            self.progreso["iniciado_en"] = self.progreso["iniciado_en"] or datetime.utcnow().isoformat()
+            self.progreso["terminado_en"] = None
+            self._guardar()
+            self._cancelar.clear()
+            self._thread = threading.Thread(target=self._correr, name="geocode-backfill", daemon=True)
+            self._thread.start()
+            return self.estado()
+
+    def cancelar(self) -> dict:
+        self._cancelar.set()
+        return self.estado()
+
+    def estado(self) -> dict:
+        progreso = dict(self.progreso)
+        total = progreso["total"]
+        progreso["porcentaje"] = round(100 * progreso["procesados"] / total, 1) if total else None
+        progreso["en_cola"] = pendientes_en_cola()
+        return progreso
+
+    def _correr(self):
+        db = SessionLocal()
+        try:
+            # Total restante desde el cursor más lo ya procesado
+            restantes = self._filtro(db.query(models.Cliente)).filter(
+                models.Cliente.id_cliente > self.progreso["cursor"]
+            ).count()
+            self.progreso["total"] = self.progreso["procesados"] + restantes
+            self._guardar()
+
+            while not self._cancelar.is_set():
+                pagina = (
+                    self._filtro(db.query(models.Cliente))
+                    .filter(models.Cliente.id_cliente > self.progreso["cursor"])
+                    .order_by(models.Cliente.id_cliente)
+                    .limit(GEOCODE_BACKFILL_PAGE)
+                    .all()
+                )
+                if not pagina:
+                    break
+                self._procesar_pagina(db, pagina)
+
+            self.progreso["estado"] = "cancelado" if self._cancelar.is_set() else "terminado"
+        except Exception:
+            logger.exception("Backfill de geocodificación interrumpido")
+            self.progreso["estado"] = "error"
+        finally:
+            self.progreso["terminado_en"] = datetime.utcnow().isoformat()
+            self._guardar()
+            db.close()
+
+    def _procesar_pagina(self, db, pagina):
+        por_direccion = {}
+        for cliente in pagina:
+            por_direccion.setdefault(cliente.direccion, []).append(cliente)
+
+        filas = list(geocode_batch(list(por_direccion), GEOCODE_REGION))
+        _recargar(db, [cliente.id_cliente for cliente in pagina])
+        for fila in filas:
+            for cliente in por_direccion.get(fila["address"], []):
+                if fila.get("error"):
+                    # El cursor pasa de largo: se reintenta en el próximo backfill, no en este
+                    self.progreso["errores"] += 1
+                    continue
+                if not _sigue_vigente(cliente, fila["address"]):
+                    continue
+                coords = (fila["latitud"], fila["longitud"]) if fila["latitud"] is not None else None
+                _aplicar(cliente, coords)
+                self.progreso["geocodificados" if coords else "sin_resultado"] += 1
+
+        db.commit()
+        # El cursor avanza solo tras confirmar la página en la base de datos
+        self.progreso["cursor"] = pagina[-1].id_cliente
+        self.progreso["procesados"] += len(pagina)
+        self._guardar()
+
+
+backfill = BackfillJob()
@@ -1,16 +1,155 @@
-from src.services.utils import get
+import asyncio
+import os
+import re
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def geocode(address: str, region: str = None):
-    url = "https://maps.googleapis.com/maps/api/geocode/json"
+from src.services.utils import MAPS_BASE_URL, aget, get
+from src.services.cache import MISS, TieredCache
+from src.services.rate_limit import TokenBucket
+
+# TTL en segundos (positivo: 90 días, negativo: 1 día)
+GEOCODE_TTL = int(os.getenv("GEOCODE_CACHE_TTL", str(90 * 24 * 3600)))
+GEOCODE_NEGATIVE_TTL = int(os.getenv("GEOCODE_NEGATIVE_TTL", str(24 * 3600)))
+GEOCODE_LRU_SIZE = int(os.getenv("GEOCODE_LRU_SIZE", "20000"))
+
+# Geocodificación por lotes: hilos concurrentes y límite global de QPS
+GEOCODE_BATCH_WORKERS = int(os.getenv("GEOCODE_BATCH_WORKERS", "8"))
+GEOCODE_BATCH_QPS = float(os.getenv("GEOCODE_BATCH_QPS", "40"))
+
+geocode_cache = TieredCache(
+    "geocode",
+    maxsize=GEOCODE_LRU_SIZE,
+    ttl=GEOCODE_TTL,
+    negative_ttl=GEOCODE_NEGATIVE_TTL,
+)
+
+# Compartido por todos los lotes en curso para respetar el QPS global
+batch_bucket = TokenBucket(GEOCODE_BATCH_QPS)
+
+
+def normalizar_direccion(address: str) -> str:
+    """Minúsculas, sin acentos ni puntuación y con espacios colapsados."""
+    texto = unicodedata.normalize("NFKD", address or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).lower()
+    texto = re.sub(r"[^\w#]+", " ", texto)
+    return " ".join(texto.split())
+
+
+def _cache_key(address: str, region: str = None) -> str:
+    return f"{(region or '').lower()}|{normalizar_direccion(address)}"
+
+
+def lookup_cached(address: str, region: str = None):
+    """Devuelve (lat, lng) o (None, None) si está en caché, o MISS si no."""
+    value = geocode_cache.get(_cache_key(address, region))
+    if value is MISS:
+        return MISS
+    return tuple(value) if value else (None, None)
+
+
+GEOCODE_URL = f"{MAPS_BASE_URL}/maps/api/geocode/json"
+
+
+def _params(address: str, region: str = None) -> dict:
     params = {"address": address}
 
     if region:
         params["region"] = region
 
-    data = get(url, params)
+    return params
+
 
+def _procesar_respuesta(address: str, region: str, data: dict):
     if data["results"]:
         location = data["results"][0]["geometry"]["location"]
+        geocode_cache.set(_cache_key(address, region), [location["lat"], location["lng"]])
         return location["lat"], location["lng"]
 
+    # Solo se cachea en negativo cuando el proveedor confirma que no hay resultado
+    if data.get("status", "ZERO_RESULTS") == "ZERO_RESULTS":
+        geocode_cache.set(_cache_key(address, region), None)
+
     return None, None
+
+
+def geocode(address: str, region: str = None):
+    cached = lookup_cached(address, region)
+    if cached is not MISS:
+        return cached
+
+    t0 = time.perf_counter()
+    data = get(GEOCODE_URL, _params(address, region))
+    geocode_cache.record_upstream(time.perf_counter() - t0)
+
+    return _procesar_respuesta(address, region, data)
+
+
+async def geocode_async(address: str, region: str = None):
+    """Igual que geocode() pero sin bloquear el event loop (la caché en disco va a un hilo)."""
+    cached = await asyncio.to_thread(lookup_cached, address, region)
+    if cached is not MISS:
+        return cached
+
+    t0 = time.perf_counter()
+    data = await aget(GEOCODE_URL, _params(address, region))
+    geocode_cache.record_upstream(time.perf_counter() - t0)
+
+    return await asyncio.to_thread(_procesar_respuesta, address, region, data)
+
+
+def _resultado(direccion, coords, cached, error=None):
+    lat, lng = coords if coords else (None, None)
+    fila = {"address": direccion, "latitud": lat, "longitud": lng, "cached": cached}
+    if error:
+        fila["error"] = error
+    return fila
+
+
+def _geocode_limitado(address, region):
+    batch_bucket.acquire()
+    return geocode(address, region)
+
+
+def geocode_batch(addresses: list, region: str = None, workers: int = GEOCODE_BATCH_WORKERS):
+    """Geocodifica un lote y va devolviendo resultados conforme terminan.
+
+    Las direcciones se deduplican por su forma normalizada; lo que ya está en
+    caché sale de inmediato y el resto se resuelve con un pool acotado de hilos
+    que respeta GEOCODE_BATCH_QPS.
+    """
+    grupos = {}
+    for address in addresses:
+        if address and address.strip():
+            grupos.setdefault(_cache_key(address, region), []).append(address)
+
+    pendientes = {}
+    for key, originales in grupos.items():
+        cached = lookup_cached(originales[0], region)
+        if cached is MISS:
+            pendientes[key] = originales
+            continue
+        for original in dict.fromkeys(originales):
+            yield _resultado(original, cached, cached=True)
+
+    if not pendientes:
+        return
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(workers, len(pendientes))))
+    try:
+        futures = {
+            pool.submit(_geocode_limitado, originales[0], region): originales
+            for originales in pendientes.values()
+        }
+        for future in as_completed(futures):
+            originales = futures[future]
+            try:
+                coords, error = future.result(), None
+            except Exception as e:
+                coords, error = None, str(e)
+            for original in dict.fromkeys(originales):
+                yield _resultado(original, coords, cached=False, error=error)
+    finally:
+        # Si el cliente corta el stream no seguimos gastando cuota
+        pool.shutdown(wait=False, cancel_futures=True)
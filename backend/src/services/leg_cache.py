@@ -0,0 +1,122 @@
+"""
+Caché de tramos origen→destino (distancia y duración) entre coordenadas.
+
+La clave es el par de coordenadas redondeadas más el modo de viaje y, si se
+configura, una franja horaria. Con LEG_CACHE_SYMMETRIC=1 un tramo B→A sirve
+para A→B cuando este último no está cacheado.
+"""
+import os
+import re
+from datetime import datetime
+
+import numpy as np
+
+from src.services.cache import MISS, TieredCache
+
+LEG_CACHE_DECIMALS = int(os.getenv("LEG_CACHE_DECIMALS", "5"))  # ~1 m
+LEG_CACHE_TTL = int(os.getenv("LEG_CACHE_TTL", str(7 * 24 * 3600)))
+LEG_CACHE_SYMMETRIC = os.getenv("LEG_CACHE_SYMMETRIC", "1") == "1"
+# 0 = sin franjas; p.ej. 60 separa los tramos por hora del día
+LEG_CACHE_BUCKET_MIN = int(os.getenv("LEG_CACHE_BUCKET_MIN", "0"))
+
+leg_cache = TieredCache("legs", maxsize=int(os.getenv("LEG_CACHE_LRU_SIZE", "200000")), ttl=LEG_CACHE_TTL)
+
+_COORD_RE = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$")
+
+
+def parse_coord(texto):
+    """'lat,lng' → (lat, lng); None si es una dirección en texto."""
+    if isinstance(texto, (tuple, list)):
+        return float(texto[0]), float(texto[1])
+    match = _COORD_RE.match(texto or "")
+    if not match:
+        return None
+    return float(match.group(1)), float(match.group(2))
+
+
+def franja_horaria(cuando: datetime = None):
+    if not LEG_CACHE_BUCKET_MIN:
+        return ""
+    cuando = cuando or datetime.now()
+    return str((cuando.hour * 60 + cuando.minute) // LEG_CACHE_BUCKET_MIN)
+
+
+def _punto(coord):
+    return f"{round(coord[0], LEG_CACHE_DECIMALS)},{round(coord[1], LEG_CACHE_DECIMALS)}"
+
+
+def leg_key(a, b, mode="driving", franja=""):
+    return f"{mode}|{_punto(a)}|{_punto(b)}|{franja}"
+
+
+def get_leg(origin, destination, mode="driving"):
+    """(distancia_m, duracion_s) del tramo o None si no está en caché."""
+    a, b = parse_coord(origin), parse_coord(destination)
+    if a is None or b is None:
+        return None
+    franja = franja_horaria()
+    value = leg_cache.get(leg_key(a, b, mode, franja))
+    if value is MISS and LEG_CACHE_SYMMETRIC:
+        value = leg_cache.get(leg_key(b, a, mode, franja))
+    return None if value is MISS else tuple(value)
+
+
+def set_leg(origin, destination, distance_m, duration_s, mode="driving"):
+    a, b = parse_coord(origin), parse_coord(destination)
+    if a is None or b is None:
+        return
+    leg_cache.set(leg_key(a, b, mode, franja_horaria()), [distance_m, duration_s])
+
+
+def _puntos(textos):
+    """Clave redondeada de cada punto (None si no es coordenada), calculada una sola vez."""
+    claves = []
+    for texto in textos:
+        coord = parse_coord(texto)
+        claves.append(None if coord is None else _punto(coord))
+    return claves
+
+
+def fill_matrix(origins, destinations, distances, durations, mode="driving"):
+    """Rellena las matrices con lo que haya en caché y devuelve la máscara de celdas faltantes."""
+    n, m = len(origins), len(destinations)
+    faltan = np.ones((n, m), dtype=bool)
+    a_keys, b_keys = _puntos(origins), _puntos(destinations)
+    franja = franja_horaria()
+
+    celdas = {}
+    for i, a in enumerate(a_keys):
+        if a is None:
+            continue
+        for j, b in enumerate(b_keys):
+            if b is not None:
+                celdas[(i, j)] = f"{mode}|{a}|{b}|{franja}"
+    if not celdas:
+        return faltan
+
+    claves = set(celdas.values())
+    if LEG_CACHE_SYMMETRIC:
+        inversas = {(i, j): f"{mode}|{b_keys[j]}|{a_keys[i]}|{franja}" for (i, j) in celdas}
+        claves.update(inversas.values())
+    encontrados = leg_cache.get_many(claves)
+
+    for (i, j), key in celdas.items():
+        value = encontrados.get(key)
+        if value is None and LEG_CACHE_SYMMETRIC:
+            value = encontrados.get(inversas[(i, j)])
+        if value is not None:
+            distances[i, j], durations[i, j] = value
+            faltan[i, j] = False
+    return faltan
+
+
+def store_matrix(origins, destinations, distances, durations, mask, mode="driving"):
+    """Guarda las celdas con dato indicadas por `mask`."""
+    a_keys, b_keys = _puntos(origins), _puntos(destinations)
+    franja = franja_horaria()
+    items = []
+    for i, j in zip(*np.nonzero(mask & ~np.isnan(distances))):
+        if a_keys[i] is not None and b_keys[j] is not None:
+            items.append((f"{mode}|{a_keys[i]}|{b_keys[j]}|{franja}", [float(distances[i, j]), float(durations[i, j])]))
+    if items:
+        leg_cache.set_many(items)
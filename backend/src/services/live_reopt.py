@@ -0,0 +1,145 @@
+"""
+Re-optimización en vivo de la ruta de un repartidor.
+
+Cuando una entrega pasa a "fallido" o "retrasado" (PUT /entregas/{id} o
+POST /seguimiento/), crud avisa aquí y, fuera de la petición, se reordena lo
+que falta de su ruta (crud.reoptimizar_ruta) partiendo de la última posición
+GPS del repartidor. El nuevo orden se publica en el canal de la ruta
+(/rutas/{id_ruta}/ws).
+
+- Los eventos de una misma ruta que llegan mientras se repara se juntan en
+  una sola reparación posterior.
+- Las posiciones GPS y los canales viven en memoria: se asume un solo
+  proceso de API, igual que los trabajos de planificación.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+REOPT_ACTIVO = os.getenv("REOPT_ACTIVO", "1") == "1"
+REOPT_WORKERS = int(os.getenv("REOPT_WORKERS", "2"))
+# Una posición más vieja ya no dice dónde está el repartidor
+REOPT_GPS_MAX_EDAD_S = float(os.getenv("REOPT_GPS_MAX_EDAD_S", "300"))
+
+# Estados de entrega que disparan la reparación
+DISPARADORES = ("fallido", "retrasado")
+
+_lock = threading.Lock()
+_pool = None
+_posiciones = {}  # id_ruta → (lat, lng, instante monotónico)
+_canales = {}  # id_ruta → set de WebSocket
+_loop = None  # bucle de la app, para publicar desde los hilos de reparación
+_en_cola = {}  # id_ruta → motivos pendientes de procesar
+_por_ruta = {}  # id_ruta → Lock: una reparación a la vez por ruta
+
+
+def _get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=REOPT_WORKERS, thread_name_prefix="reopt")
+        return _pool
+
+
+def close_pool():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+# ---------- posición del repartidor ----------
+
+def registrar_posicion(id_ruta: int, lat: float, lng: float):
+    _posiciones[id_ruta] = (float(lat), float(lng), time.monotonic())
+
+
+def ultima_posicion(id_ruta: int):
+    """(lat, lng) si es reciente; None si no hay o ya caducó."""
+    posicion = _posiciones.get(id_ruta)
+    if posicion is None or time.monotonic() - posicion[2] > REOPT_GPS_MAX_EDAD_S:
+        return None
+    return posicion[:2]
+
+
+# ---------- canal de la ruta ----------
+
+def suscribir(id_ruta: int, websocket):
+    global _loop
+    _loop = asyncio.get_running_loop()
+    _canales.setdefault(id_ruta, set()).add(websocket)
+
+
+def desuscribir(id_ruta: int, websocket):
+    clientes = _canales.get(id_ruta)
+    if clientes is not None:
+        clientes.discard(websocket)
+        if not clientes:
+            _canales.pop(id_ruta, None)
+
+
+async def difundir(id_ruta: int, mensaje: dict, excepto=None):
+    # Copia: un cliente puede desconectarse mientras se envía
+    for ws in list(_canales.get(id_ruta, ())):
+        if ws is excepto:
+            continue
+        try:
+            await ws.send_json(mensaje)
+        except Exception:
+            desuscribir(id_ruta, ws)
+
+
+def publicar(id_ruta: int, mensaje: dict):
+    """Desde un hilo: encola el envío en el bucle de la app (no espera a que salga)."""
+    if _loop is None or not _canales.get(id_ruta):
+        return
+    asyncio.run_coroutine_threadsafe(difundir(id_ruta, mensaje), _loop)
+
+
+# ---------- reparación ----------
+
+def programar(id_ruta: int, id_entrega: int, estado: str):
+    """Lo llama crud tras confirmar el cambio de estado; vuelve enseguida."""
+    if not REOPT_ACTIVO:
+        return
+    motivo = {"id_entrega": id_entrega, "estado": estado, "t": time.perf_counter()}
+    with _lock:
+        if id_ruta in _en_cola:
+            _en_cola[id_ruta].append(motivo)
+            return
+        _en_cola[id_ruta] = [motivo]
+    _get_pool().submit(_reparar, id_ruta)
+
+
+def _reparar(id_ruta: int):
+    # Import diferido: crud importa este módulo
+    import crud
+
+    with _lock:
+        candado = _por_ruta.setdefault(id_ruta, threading.Lock())
+    with candado:
+        with _lock:
+            motivos = _en_cola.pop(id_ruta, [])
+        if not motivos:
+            return
+        db = SessionLocal()
+        try:
+            mensaje = crud.reoptimizar_ruta(db, id_ruta, posicion=ultima_posicion(id_ruta))
+        except Exception:
+            db.rollback()
+            logger.exception("No se pudo re-optimizar la ruta %s", id_ruta)
+            return
+        finally:
+            db.close()
+    mensaje["motivos"] = [{"id_entrega": m["id_entrega"], "estado": m["estado"]} for m in motivos]
+    # Desde el primer evento juntado hasta publicar
+    mensaje["ms"] = round((time.perf_counter() - motivos[0]["t"]) * 1000, 1)
+    publicar(id_ruta, mensaje)
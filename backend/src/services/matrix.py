@@ -1,11 +1,320 @@
-from src.services.utils import get
+import asyncio
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 
-def get_distance_matrix(origins: list, destinations: list):
-    url = "https://maps.googleapis.com/maps/api/distancematrix/json"
-    params = {
+import numpy as np
+
+from src.services import leg_cache
+from src.services.distance import haversine_m, haversine_matrix
+from src.services import utils
+from src.services.utils import MAPS_BASE_URL, aget, get
+
+MATRIX_URL = f"{MAPS_BASE_URL}/maps/api/distancematrix/json"
+
+# Límites del proveedor por petición
+MAX_ORIGINS = 25
+MAX_DESTINATIONS = 25
+MAX_ELEMENTS = int(os.getenv("MATRIX_MAX_ELEMENTS", "100"))
+
+# Teselas pedidas en paralelo
+MATRIX_WORKERS = int(os.getenv("MATRIX_WORKERS", "8"))
+
+# Motor local: velocidad media por modo (km/h) y factor de rodeo sobre la línea recta
+LOCAL_SPEED_KMH = {
+    "driving": float(os.getenv("LOCAL_SPEED_KMH_DRIVING", "30")),
+    "bicycling": float(os.getenv("LOCAL_SPEED_KMH_BICYCLING", "15")),
+    "walking": float(os.getenv("LOCAL_SPEED_KMH_WALKING", "5")),
+}
+LOCAL_DETOUR_FACTOR = float(os.getenv("LOCAL_DETOUR_FACTOR", "1.3"))
+
+ENGINES = ("google", "local", "hybrid")
+
+
+@dataclass
+class MatrixResult:
+    """Matriz densa N×M. Las celdas sin dato quedan en NaN."""
+    distances: np.ndarray  # metros
+    durations: np.ndarray  # segundos
+    failed_tiles: list = field(default_factory=list)
+    rows: list = None  # formato original del proveedor (elementos por fila)
+    estimated: np.ndarray = None  # celdas calculadas con el motor local (modo hybrid)
+
+    @property
+    def complete(self) -> bool:
+        return not np.isnan(self.distances).any()
+
+    def to_dict(self) -> dict:
+        def limpiar(arr):
+            return [[None if math.isnan(v) else v for v in fila] for fila in arr.tolist()]
+
+        data = {
+            "distances_m": limpiar(self.distances),
+            "durations_s": limpiar(self.durations),
+            "failed_tiles": self.failed_tiles,
+        }
+        if self.estimated is not None:
+            data["estimated_cells"] = [[int(i), int(j)] for i, j in zip(*np.nonzero(self.estimated))]
+        return data
+
+
+def _como_texto(punto) -> str:
+    """Acepta 'lat,lng', una dirección o una tupla (lat, lng)."""
+    if isinstance(punto, (tuple, list)):
+        return f"{float(punto[0])},{float(punto[1])}"
+    return punto
+
+
+def _resolver_coords(puntos: list) -> np.ndarray:
+    """Coordenadas (N, 2); las direcciones se geocodifican (con caché) y las no resueltas quedan en NaN."""
+    from src.services.geocoding import geocode
+
+    coords = np.full((len(puntos), 2), np.nan)
+    for i, punto in enumerate(puntos):
+        coord = leg_cache.parse_coord(punto)
+        if coord is None:
+            lat, lng = geocode(punto)
+            coord = (lat, lng) if lat is not None else None
+        if coord is not None:
+            coords[i] = coord
+    return coords
+
+
+def compute_local_matrix(origins: list, destinations: list, mode: str = "driving") -> MatrixResult:
+    """Matriz estimada sin proveedor: haversine × factor de rodeo y velocidad según el modo."""
+    distances = haversine_matrix(_resolver_coords(origins), _resolver_coords(destinations)) * LOCAL_DETOUR_FACTOR
+    speed_ms = LOCAL_SPEED_KMH.get(mode, LOCAL_SPEED_KMH["driving"]) / 3.6
+    return MatrixResult(distances, distances / speed_ms, [])
+
+
+def estimar_tramo(origin, destination, mode: str = "driving"):
+    """(metros, segundos) estimados para un par de coordenadas; None si no son coordenadas."""
+    a, b = leg_cache.parse_coord(origin), leg_cache.parse_coord(destination)
+    if a is None or b is None:
+        return None
+    distance = haversine_m(a, b) * LOCAL_DETOUR_FACTOR
+    return distance, distance / (LOCAL_SPEED_KMH.get(mode, LOCAL_SPEED_KMH["driving"]) / 3.6)
+
+
+def compute_cached_matrix(origins: list, destinations: list, mode: str = "driving") -> MatrixResult:
+    """Tramos de la caché donde los haya y estimación local en el resto; nunca llama al proveedor.
+
+    Para decisiones con latencia acotada (re-optimización en ruta): los tramos
+    entre paradas ya se pidieron al planificar, la posición del repartidor es
+    nueva cada vez.
+    """
+    origins = [_como_texto(o) for o in origins]
+    destinations = [_como_texto(d) for d in destinations]
+    result = _vacio(len(origins), len(destinations))
+    leg_cache.fill_matrix(origins, destinations, result.distances, result.durations, mode)
+    return _completar_con_local(result, origins, destinations, mode)
+
+
+def _usar_local(engine: str, result: MatrixResult) -> bool:
+    # hybrid siempre; google solo si hubo huecos y el circuito del proveedor está abierto
+    return engine == "hybrid" or (
+        utils.FALLBACK_LOCAL and result.failed_tiles and utils.degradado("distancematrix")
+    )
+
+
+def _completar_con_local(result: MatrixResult, origins, destinations, mode) -> MatrixResult:
+    huecos = np.isnan(result.distances)
+    if huecos.any():
+        local = compute_local_matrix(origins, destinations, mode)
+        result.distances[huecos] = local.distances[huecos]
+        result.durations[huecos] = local.durations[huecos]
+    result.estimated = huecos & ~np.isnan(result.distances)
+    return result
+
+
+def _params(origins: list, destinations: list, mode: str = "driving") -> dict:
+    return {
         "origins": "|".join(origins),
         "destinations": "|".join(destinations),
-        "mode": "driving"
+        "mode": mode
     }
-    data = get(url, params)
-    return data["rows"]
\ No newline at end of file
+
+
+def tile_shape(n: int, m: int) -> tuple:
+    """Tamaño de tesela (filas, columnas) que respeta los límites con el menor número de peticiones."""
+    mejor = None
+    for cols in range(1, min(MAX_DESTINATIONS, m) + 1):
+        rows = min(MAX_ORIGINS, MAX_ELEMENTS // cols, n)
+        if rows == 0:
+            break
+        peticiones = math.ceil(n / rows) * math.ceil(m / cols)
+        if mejor is None or peticiones < mejor[0]:
+            mejor = (peticiones, rows, cols)
+    return mejor[1], mejor[2]
+
+
+def tiles(n: int, m: int) -> list:
+    """Lista de teselas ((i0, i1), (j0, j1)) que cubren la matriz N×M."""
+    rows, cols = tile_shape(n, m)
+    return [
+        ((i, min(i + rows, n)), (j, min(j + cols, m)))
+        for i in range(0, n, rows)
+        for j in range(0, m, cols)
+    ]
+
+
+def _vacio(n, m):
+    return MatrixResult(np.full((n, m), np.nan), np.full((n, m), np.nan), [])
+
+
+def _ensamblar(result, resultados, rows=None):
+    """Copia cada petición (índices globales ri × cj) a la matriz completa."""
+    for ri, cj, tile_rows, error in resultados:
+        if error is not None:
+            result.failed_tiles.append({
+                "origins": ri.tolist(),
+                "destinations": cj.tolist(),
+                "error": error,
+            })
+            continue
+        for di, fila in enumerate(tile_rows):
+            for dj, elem in enumerate(fila["elements"]):
+                i, j = ri[di], cj[dj]
+                if rows is not None:
+                    rows[i][j] = elem
+                if elem.get("status") == "OK":
+                    result.distances[i, j] = elem["distance"]["value"]
+                    result.durations[i, j] = elem["duration"]["value"]
+
+
+def _bloques(faltan):
+    """Agrupa las filas por el conjunto de columnas que les faltan y parte cada grupo en teselas.
+
+    Así, al añadir paradas a una ruta ya cacheada solo se piden las celdas
+    nuevas. Si hay demasiados patrones distintos se usa la submatriz que los
+    cubre a todos.
+    """
+    ri = np.flatnonzero(faltan.any(axis=1))
+    cj = np.flatnonzero(faltan.any(axis=0))
+    if not len(ri):
+        return []
+
+    grupos = {}
+    for i in ri:
+        grupos.setdefault(faltan[i].tobytes(), []).append(i)
+
+    envolvente = [(ri, cj)]
+    por_grupo = [(np.array(filas), np.flatnonzero(faltan[filas[0]])) for filas in grupos.values()]
+
+    def peticiones(bloques):
+        return sum(len(tiles(len(r), len(c))) for r, c in bloques)
+
+    bloques = por_grupo if peticiones(por_grupo) <= peticiones(envolvente) else envolvente
+    return [
+        (r[i0:i1], c[j0:j1])
+        for r, c in bloques
+        for (i0, i1), (j0, j1) in tiles(len(r), len(c))
+    ]
+
+
+def _plan(origins, destinations, mode):
+    """Consulta la caché de tramos y devuelve las peticiones que faltan hacer al proveedor."""
+    n, m = len(origins), len(destinations)
+    result = _vacio(n, m)
+    faltan = leg_cache.fill_matrix(origins, destinations, result.distances, result.durations, mode)
+    return result, faltan, _bloques(faltan)
+
+
+def _cerrar(result, faltan, resultados, origins, destinations, mode, keep_rows):
+    rows = None
+    if keep_rows:
+        rows = [[{"status": "TILE_FAILED"} for _ in destinations] for _ in origins]
+        for i, j in zip(*np.nonzero(~faltan)):
+            rows[i][j] = {
+                "status": "OK",
+                "distance": {"value": float(result.distances[i, j])},
+                "duration": {"value": float(result.durations[i, j])},
+            }
+    _ensamblar(result, resultados, rows)
+    leg_cache.store_matrix(origins, destinations, result.distances, result.durations, faltan, mode)
+    if rows is not None:
+        result.rows = [{"elements": fila} for fila in rows]
+    return result
+
+
+def _respuesta(ri, cj, data):
+    if data.get("status", "OK") != "OK":
+        return ri, cj, None, data.get("error_message") or data["status"]
+    return ri, cj, data["rows"], None
+
+
+def _fetch_tile(origins, destinations, bloque, mode):
+    ri, cj = bloque
+    try:
+        data = get(MATRIX_URL, _params([origins[i] for i in ri], [destinations[j] for j in cj], mode))
+    except Exception as e:
+        return ri, cj, None, str(e)
+    return _respuesta(ri, cj, data)
+
+
+def compute_matrix(origins: list, destinations: list, keep_rows: bool = False, mode: str = "driving",
+                   engine: str = "google") -> MatrixResult:
+    """Divide la matriz en teselas válidas, las pide en paralelo y las reensambla.
+
+    Primero se consulta la caché de tramos y solo se piden al proveedor las
+    celdas faltantes. Si una tesela falla, sus celdas quedan en NaN y se
+    reporta en failed_tiles.
+
+    engine="local" no llama al proveedor; engine="hybrid" rellena los huecos
+    del proveedor con la estimación local.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"engine debe ser uno de {ENGINES}")
+    origins = [_como_texto(o) for o in origins]
+    destinations = [_como_texto(d) for d in destinations]
+    if engine == "local":
+        return compute_local_matrix(origins, destinations, mode)
+
+    result, faltan, plan = _plan(origins, destinations, mode)
+    resultados = []
+    if plan:
+        with ThreadPoolExecutor(max_workers=max(1, min(MATRIX_WORKERS, len(plan)))) as pool:
+            resultados = list(pool.map(lambda b: _fetch_tile(origins, destinations, b, mode), plan))
+    result = _cerrar(result, faltan, resultados, origins, destinations, mode, keep_rows)
+    if _usar_local(engine, result):
+        result = _completar_con_local(result, origins, destinations, mode)
+    return result
+
+
+async def compute_matrix_async(origins: list, destinations: list, keep_rows: bool = False, mode: str = "driving",
+                               engine: str = "google") -> MatrixResult:
+    if engine not in ENGINES:
+        raise ValueError(f"engine debe ser uno de {ENGINES}")
+    origins = [_como_texto(o) for o in origins]
+    destinations = [_como_texto(d) for d in destinations]
+    if engine == "local":
+        return await asyncio.to_thread(compute_local_matrix, origins, destinations, mode)
+
+    result, faltan, plan = await asyncio.to_thread(_plan, origins, destinations, mode)
+    sem = asyncio.Semaphore(MATRIX_WORKERS)
+
+    async def fetch(bloque):
+        ri, cj = bloque
+        async with sem:
+            try:
+                data = await aget(MATRIX_URL, _params([origins[i] for i in ri], [destinations[j] for j in cj], mode))
+            except Exception as e:
+                return ri, cj, None, str(e)
+        return _respuesta(ri, cj, data)
+
+    resultados = await asyncio.gather(*(fetch(b) for b in plan))
+    result = await asyncio.to_thread(
+        _cerrar, result, faltan, resultados, origins, destinations, mode, keep_rows
+    )
+    if _usar_local(engine, result):
+        result = await asyncio.to_thread(_completar_con_local, result, origins, destinations, mode)
+    return result
+
+
+def get_distance_matrix(origins: list, destinations: list):
+    return compute_matrix(origins, destinations, keep_rows=True).rows
+
+
+async def get_distance_matrix_async(origins: list, destinations: list):
+    return (await compute_matrix_async(origins, destinations, keep_rows=True)).rows
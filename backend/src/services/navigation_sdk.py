@@ -1,17 +1,114 @@
-from src.services.utils import get
+import asyncio
+import os
+import time
 
-def get_route(origin: str, destination: str):
-    url = "https://maps.googleapis.com/maps/api/directions/json"
-    params = {
+from src.services import leg_cache
+from src.services.cache import MISS, ByteLRUCache, TieredCache
+from src.services.geocoding import normalizar_direccion
+from src.services import utils
+from src.services.matrix import estimar_tramo
+from src.services.resilience import ProviderUnavailable
+from src.services.utils import MAPS_BASE_URL, aget, get
+
+DIRECTIONS_URL = f"{MAPS_BASE_URL}/maps/api/directions/json"
+
+DIRECTIONS_CACHE_TTL = int(os.getenv("DIRECTIONS_CACHE_TTL", str(7 * 24 * 3600)))
+DIRECTIONS_CACHE_MAX_BYTES = int(os.getenv("DIRECTIONS_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Valor compacto por par origen/destino: [polilínea codificada, metros, segundos]
+directions_cache = TieredCache(
+    "directions",
+    ttl=DIRECTIONS_CACHE_TTL,
+    memory=ByteLRUCache(
+        DIRECTIONS_CACHE_MAX_BYTES,
+        sizeof=lambda key, value: len(key) + len(value[0] or "") + 16,
+    ),
+)
+
+
+def _punto_key(punto: str) -> str:
+    coord = leg_cache.parse_coord(punto)
+    if coord is not None:
+        return leg_cache._punto(coord)
+    return normalizar_direccion(punto)
+
+
+def _cache_key(origin: str, destination: str) -> str:
+    return f"driving|{_punto_key(origin)}|{_punto_key(destination)}"
+
+
+def _params(origin: str, destination: str) -> dict:
+    return {
         "origin": origin,
         "destination": destination,
         "mode": "driving"
     }
-    data = get(url, params)
+
+
+def _formato(polyline, distance_m, duration_s):
+    return {
+        "distance_km": distance_m / 1000,
+        "duration_min": duration_s / 60,
+        "polyline": polyline,
+    }
+
+
+def _desde_cache(origin: str, destination: str, with_geometry: bool):
+    value = directions_cache.get(_cache_key(origin, destination))
+    if value is not MISS:
+        return _formato(*value)
+    if with_geometry:
+        return None
+
+    # Sin geometría basta con la caché de tramos
+    leg = leg_cache.get_leg(origin, destination)
+    if leg is None:
+        return None
+    return {"distance_km": leg[0] / 1000, "duration_min": leg[1] / 60}
+
+
+def _estimado(origin: str, destination: str, error: ProviderUnavailable):
+    """Con el circuito abierto, estimación haversine (sin polilínea) si hay coordenadas."""
+    estimado = estimar_tramo(origin, destination) if utils.FALLBACK_LOCAL else None
+    if estimado is None:
+        raise error
+    return {"distance_km": estimado[0] / 1000, "duration_min": estimado[1] / 60, "estimado": True}
+
+
+def _procesar_respuesta(origin: str, destination: str, data: dict):
     if data["routes"]:
-        leg = data["routes"][0]["legs"][0]
-        return {
-            "distance_km": leg["distance"]["value"] / 1000,
-            "duration_min": leg["duration"]["value"] / 60
-        }
-    return None
\ No newline at end of file
+        route = data["routes"][0]
+        leg = route["legs"][0]
+        polyline = route.get("overview_polyline", {}).get("points")
+        distance_m, duration_s = leg["distance"]["value"], leg["duration"]["value"]
+        directions_cache.set(_cache_key(origin, destination), [polyline, distance_m, duration_s])
+        leg_cache.set_leg(origin, destination, distance_m, duration_s)
+        return _formato(polyline, distance_m, duration_s)
+    return None
+
+
+def get_route(origin: str, destination: str, with_geometry: bool = False):
+    """Distancia y duración del tramo; con with_geometry=True exige también la polilínea."""
+    cached = _desde_cache(origin, destination, with_geometry)
+    if cached:
+        return cached
+    t0 = time.perf_counter()
+    try:
+        data = get(DIRECTIONS_URL, _params(origin, destination))
+    except ProviderUnavailable as e:
+        return _estimado(origin, destination, e)
+    directions_cache.record_upstream(time.perf_counter() - t0)
+    return _procesar_respuesta(origin, destination, data)
+
+
+async def get_route_async(origin: str, destination: str, with_geometry: bool = False):
+    cached = await asyncio.to_thread(_desde_cache, origin, destination, with_geometry)
+    if cached:
+        return cached
+    t0 = time.perf_counter()
+    try:
+        data = await aget(DIRECTIONS_URL, _params(origin, destination))
+    except ProviderUnavailable as e:
+        return _estimado(origin, destination, e)
+    directions_cache.record_upstream(time.perf_counter() - t0)
+    return await asyncio.to_thread(_procesar_respuesta, origin, destination, data)
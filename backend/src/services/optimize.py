@@ -1,20 +1,77 @@
-from src.services.utils import get
+import os
+
+from src.services.utils import ROUTES_BASE_URL, apost, post
 from polyline import decode  # ✅ Agregado para decodificar geometría
 
-def optimize_route(locations: list):
-    url = "https://routes.googleapis.com/directions/v2:computeRoutes"
+COMPUTE_ROUTES_URL = f"{ROUTES_BASE_URL}/directions/v2:computeRoutes"
+
+# Solo pedimos lo que usamos: menos latencia del proveedor y respuestas más chicas
+ROUTES_FIELD_MASK = os.getenv(
+    "ROUTES_FIELD_MASK",
+    ",".join([
+        "routes.distanceMeters",
+        "routes.duration",
+        "routes.polyline.encodedPolyline",
+        "routes.optimizedIntermediateWaypointIndex",
+        "routes.legs.distanceMeters",
+        "routes.legs.duration",
+        "routes.legs.startLocation",
+        "routes.legs.endLocation",
+    ]),
+)
+
+
+def _body(locations: list) -> dict:
     body = {
         "origin": {"address": {"formattedAddress": locations[0]}},
         "destination": {"address": {"formattedAddress": locations[-1]}},
         "intermediates": [{"address": {"formattedAddress": loc}} for loc in locations[1:-1]],
         "travelMode": "DRIVE"
     }
-    data = post(url, body)
+    if len(locations) > 3:
+        body["optimizeWaypointOrder"] = True
+    return body
+
+
+def _segundos(duracion) -> float:
+    # computeRoutes devuelve duraciones como "123s"
+    return float(str(duracion).rstrip("s") or 0)
+
+
+def resumen(data: dict, locations: list = None) -> dict:
+    """Respuesta compacta: polilínea codificada, totales, tramos y orden optimizado."""
+    route = data["routes"][0]
+    intermedios = max(0, len(locations) - 2) if locations else None
+    orden = route.get("optimizedIntermediateWaypointIndex") or (
+        list(range(intermedios)) if intermedios is not None else []
+    )
+    return {
+        "polyline": route.get("polyline", {}).get("encodedPolyline"),
+        "distance_m": route.get("distanceMeters"),
+        "duration_s": _segundos(route.get("duration", 0)),
+        "order": orden,
+        "legs": [
+            {"distance_m": leg.get("distanceMeters"), "duration_s": _segundos(leg.get("duration", 0))}
+            for leg in route.get("legs", [])
+        ],
+    }
 
+
+def _procesar_respuesta(data: dict, locations: list):
     # ✅ Decodificar geometría si está disponible
-    if "routes" in data and "polyline" in data["routes"][0]:
+    if data.get("routes") and "polyline" in data["routes"][0]:
         encoded = data["routes"][0]["polyline"]["encodedPolyline"]
         decoded_coords = decode(encoded)  # [(lat, lon), ...]
-        return {"decoded_geometry": decoded_coords, "raw": data}
+        return {"decoded_geometry": decoded_coords, "summary": resumen(data, locations), "raw": data}
+
+    return data
+
+
+def optimize_route(locations: list):
+    data = post(COMPUTE_ROUTES_URL, _body(locations), {"X-Goog-FieldMask": ROUTES_FIELD_MASK})
+    return _procesar_respuesta(data, locations)
+
 
-    return data
\ No newline at end of file
+async def optimize_route_async(locations: list):
+    data = await apost(COMPUTE_ROUTES_URL, _body(locations), {"X-Goog-FieldMask": ROUTES_FIELD_MASK})
+    return _procesar_respuesta(data, locations)
@@ -0,0 +1,354 @@
+"""
+Planificación del día completo como trabajo en segundo plano.
+
+- POST devuelve el trabajo enseguida; un pool de procesos
+  (PLANNING_WORKERS) ejecuta crud.planificar_rutas y va dejando etapa y
+  porcentaje en la fila del trabajo, así que el estado se puede consultar
+  desde cualquier proceso y sobrevive a un reinicio.
+- El mismo pedido (mismos parámetros) devuelve el mismo trabajo. Volver a
+  ejecutarlo sustituye las rutas que guardó la vez anterior en la misma
+  transacción que guarda las nuevas: nunca quedan rutas duplicadas ni a
+  medias.
+- Al arrancar la API se reencolan los trabajos pendientes o interrumpidos.
+
+Se asume un solo proceso de API despachando trabajos (los trabajadores del
+pool sí pueden ser varios).
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+import models
+from database import SessionLocal
+from schemas import PlanificarRutas, ResultadoPlanificacion, TrabajoPlanificacion
+
+logger = logging.getLogger(__name__)
+
+# Procesos que ejecutan trabajos; 0 = un hilo del propio proceso (desarrollo)
+PLANNING_WORKERS = int(os.getenv("PLANNING_WORKERS", "2"))
+PLANNING_START_METHOD = os.getenv("PLANNING_START_METHOD", "spawn")
+# Procesos para los grupos dentro de un trabajo; el paralelismo ya está entre trabajos
+PLANNING_SOLVER_WORKERS = int(os.getenv("PLANNING_SOLVER_WORKERS", "1"))
+# Reintentos de un trabajo cuyo proceso murió (OOM, segfault) antes de darlo por fallido
+PLANNING_MAX_INTENTOS = int(os.getenv("PLANNING_MAX_INTENTOS", "3"))
+# Mínimo entre escrituras de progreso en la base de datos (segundos)
+PLANNING_PROGRESO_INTERVALO_S = float(os.getenv("PLANNING_PROGRESO_INTERVALO_S", "1.0"))
+
+PENDIENTE = "pendiente"
+EJECUTANDO = "ejecutando"
+TERMINADO = "terminado"
+ERROR = "error"
+CANCELADO = "cancelado"
+ACTIVOS = (PENDIENTE, EJECUTANDO)
+
+_pool = None
+_pool_lock = threading.Lock()
+_despachados = {}  # id_trabajo → future, solo para no encolar dos veces
+
+
+class TrabajoCancelado(Exception):
+    pass
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if PLANNING_WORKERS <= 0:
+                _pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="planificacion")
+            else:
+                contexto = multiprocessing.get_context(PLANNING_START_METHOD)
+                _pool = ProcessPoolExecutor(max_workers=PLANNING_WORKERS, mp_context=contexto)
+        return _pool
+
+
+def _descartar_pool(pool):
+    """Un proceso murió y el pool quedó roto: el siguiente _get_pool crea otro."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+# =======================================================
+# Parámetros e idempotencia
+# =======================================================
+
+def _parametros(data: PlanificarRutas, engine: str) -> dict:
+    datos = data.model_dump(mode="json")
+    if datos.get("vehiculo_ids"):
+        datos["vehiculo_ids"] = sorted(datos["vehiculo_ids"])
+    return {"data": datos, "engine": engine}
+
+
+def clave_de(data: PlanificarRutas, engine: str) -> str:
+    texto = json.dumps(_parametros(data, engine), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+def a_schema(trabajo: models.TrabajoPlanificacion) -> TrabajoPlanificacion:
+    return TrabajoPlanificacion(
+        id_trabajo=trabajo.id_trabajo,
+        fecha=trabajo.fecha,
+        estado=trabajo.estado,
+        etapa=trabajo.etapa,
+        progreso=trabajo.progreso or 0,
+        error=trabajo.error,
+        intentos=trabajo.intentos or 0,
+        creado_en=trabajo.creado_en,
+        iniciado_en=trabajo.iniciado_en,
+        terminado_en=trabajo.terminado_en,
+        resultado=ResultadoPlanificacion.model_validate_json(trabajo.resultado) if trabajo.resultado else None,
+    )
+
+
+# =======================================================
+# API (proceso de la app)
+# =======================================================
+
+def enviar(db, data: PlanificarRutas, engine: str, forzar: bool = False) -> models.TrabajoPlanificacion:
+    """Crea el trabajo o devuelve el existente con los mismos parámetros.
+
+    Un trabajo terminado solo se vuelve a ejecutar con `forzar`; uno con
+    error o cancelado se reintenta.
+    """
+    clave = clave_de(data, engine)
+    existente = db.query(models.TrabajoPlanificacion).filter(models.TrabajoPlanificacion.clave == clave).first()
+    if existente is None:
+        trabajo = models.TrabajoPlanificacion(
+            fecha=data.fecha,
+            clave=clave,
+            parametros=json.dumps(_parametros(data, engine)),
+            estado=PENDIENTE,
+            progreso=0,
+            intentos=0,
+        )
+        db.add(trabajo)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Otra petición idéntica (doble clic) creó la fila entre la consulta y el insert
+            db.rollback()
+            existente = db.query(models.TrabajoPlanificacion).filter(models.TrabajoPlanificacion.clave == clave).one()
+        else:
+            db.refresh(trabajo)
+            _despachar(trabajo.id_trabajo)
+            return trabajo
+
+    if existente.estado in ACTIVOS or (existente.estado == TERMINADO and not forzar):
+        return existente
+    return reejecutar(db, existente)
+
+
+def reejecutar(db, trabajo: models.TrabajoPlanificacion) -> models.TrabajoPlanificacion:
+    if trabajo.estado in ACTIVOS:
+        return trabajo
+    trabajo.estado = PENDIENTE
+    trabajo.etapa = None
+    trabajo.progreso = 0
+    trabajo.error = None
+    trabajo.iniciado_en = None
+    trabajo.terminado_en = None
+    db.commit()
+    db.refresh(trabajo)
+    _despachar(trabajo.id_trabajo)
+    return trabajo
+
+
+def cancelar(db, trabajo: models.TrabajoPlanificacion) -> models.TrabajoPlanificacion:
+    """Un pendiente no llega a ejecutarse; uno en ejecución se detiene en la siguiente etapa sin guardar."""
+    if trabajo.estado in ACTIVOS:
+        trabajo.estado = CANCELADO
+        trabajo.terminado_en = datetime.utcnow()
+        db.commit()
+        db.refresh(trabajo)
+    return trabajo
+
+
+def reanudar():
+    """Al arrancar: lo que quedó en ejecución murió con el proceso; se reencola con lo pendiente."""
+    db = SessionLocal()
+    try:
+        trabajos = (
+            db.query(models.TrabajoPlanificacion)
+            .filter(models.TrabajoPlanificacion.estado.in_(ACTIVOS))
+            .order_by(models.TrabajoPlanificacion.id_trabajo)
+            .all()
+        )
+        for trabajo in trabajos:
+            trabajo.estado = PENDIENTE
+        db.commit()
+        for trabajo in trabajos:
+            _despachar(trabajo.id_trabajo)
+        return len(trabajos)
+    finally:
+        db.close()
+
+
+def _despachar(id_trabajo: int):
+    anterior = _despachados.get(id_trabajo)
+    if anterior is not None and not anterior.done():
+        return
+    pool = _get_pool()
+    try:
+        future = pool.submit(ejecutar, id_trabajo)
+    except BrokenExecutor:
+        _descartar_pool(pool)
+        # El callback debe apuntar al pool que de verdad corre el trabajo
+        pool = _get_pool()
+        future = pool.submit(ejecutar, id_trabajo)
+    _despachados[id_trabajo] = future
+    future.add_done_callback(lambda f: _terminado(id_trabajo, pool, f))
+
+
+def _terminado(id_trabajo, pool, future):
+    if _despachados.get(id_trabajo) is future:
+        del _despachados[id_trabajo]
+    if future.cancelled() or future.exception() is None:
+        return
+    error = future.exception()
+    logger.error("Trabajo de planificación %s falló fuera de control", id_trabajo, exc_info=error)
+    if isinstance(error, BrokenExecutor):
+        _descartar_pool(pool)
+    # ejecutar no llegó a cerrar la fila: se reintenta o se marca con error
+    db = SessionLocal()
+    try:
+        trabajo = db.get(models.TrabajoPlanificacion, id_trabajo)
+        if trabajo is None or trabajo.estado not in ACTIVOS:
+            return
+        if isinstance(error, BrokenExecutor) and (trabajo.intentos or 0) < PLANNING_MAX_INTENTOS:
+            trabajo.estado = PENDIENTE
+            reintentar = True
+        else:
+            trabajo.estado = ERROR
+            trabajo.error = f"El proceso de planificación terminó inesperadamente: {error!r}"
+            trabajo.terminado_en = datetime.utcnow()
+            reintentar = False
+        db.commit()
+    finally:
+        db.close()
+    if reintentar:
+        _despachar(id_trabajo)
+
+
+# =======================================================
+# Ejecución (proceso trabajador)
+# =======================================================
+
+def _actualizar(id_trabajo: int, **campos) -> bool:
+    """Escribe en la fila con una sesión aparte (no toca la transacción del plan); False si está cancelado."""
+    db = SessionLocal()
+    try:
+        trabajo = db.get(models.TrabajoPlanificacion, id_trabajo)
+        if trabajo is None or trabajo.estado == CANCELADO:
+            return False
+        for campo, valor in campos.items():
+            setattr(trabajo, campo, valor)
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
+def _reclamar(id_trabajo: int) -> bool:
+    """pendiente → ejecutando en una sola sentencia: solo un trabajador se lo queda."""
+    db = SessionLocal()
+    try:
+        filas = (
+            db.query(models.TrabajoPlanificacion)
+            .filter(
+                models.TrabajoPlanificacion.id_trabajo == id_trabajo,
+                models.TrabajoPlanificacion.estado == PENDIENTE,
+            )
+            .update(
+                {
+                    models.TrabajoPlanificacion.estado: EJECUTANDO,
+                    models.TrabajoPlanificacion.etapa: "en_cola",
+                    models.TrabajoPlanificacion.iniciado_en: datetime.utcnow(),
+                    models.TrabajoPlanificacion.intentos: models.TrabajoPlanificacion.intentos + 1,
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        return filas == 1
+    finally:
+        db.close()
+
+
+def _rutas_previas(db, rutas_guardadas) -> None:
+    """Deshace (sin confirmar) las rutas que guardó la ejecución anterior del trabajo."""
+    # Import diferido, como en ejecutar
+    import crud
+
+    if rutas_guardadas:
+        crud._deshacer_rutas(db, json.loads(rutas_guardadas))
+
+
+def ejecutar(id_trabajo: int):
+    # Import diferido: el proceso trabajador carga crud (y los solvers) solo al ejecutar
+    import crud
+
+    if not _reclamar(id_trabajo):
+        return
+
+    db = SessionLocal()
+    ultimo = {"etapa": None, "t": 0.0}
+
+    def progreso(etapa, porcentaje):
+        ahora = time.monotonic()
+        if etapa == ultimo["etapa"] and ahora - ultimo["t"] < PLANNING_PROGRESO_INTERVALO_S:
+            return
+        ultimo.update(etapa=etapa, t=ahora)
+        if not _actualizar(id_trabajo, etapa=etapa, progreso=int(porcentaje)):
+            raise TrabajoCancelado()
+        if etapa == "guardando" and data.guardar:
+            # Justo antes de guardar: crud confirma el reemplazo y las rutas nuevas juntos,
+            # y durante la búsqueda no se retienen bloqueos
+            _rutas_previas(db, trabajo.rutas_guardadas)
+
+    def al_guardar(ids_rutas):
+        # Misma transacción que las rutas: si el trabajo se cancela ahora, el próximo re-run las encuentra
+        trabajo.rutas_guardadas = json.dumps(ids_rutas)
+
+    try:
+        trabajo = db.get(models.TrabajoPlanificacion, id_trabajo)
+        parametros = json.loads(trabajo.parametros)
+        data = PlanificarRutas.model_validate(parametros["data"])
+        resultado = crud.planificar_rutas(
+            db, data, engine=parametros["engine"], progreso=progreso, workers=PLANNING_SOLVER_WORKERS,
+            al_guardar=al_guardar,
+        )
+        _actualizar(
+            id_trabajo,
+            estado=TERMINADO,
+            etapa=None,
+            progreso=100,
+            resultado=resultado.model_dump_json(),
+            terminado_en=datetime.utcnow(),
+        )
+    except TrabajoCancelado:
+        db.rollback()
+    except Exception as e:
+        db.rollback()
+        logger.exception("Trabajo de planificación %s con error", id_trabajo)
+        _actualizar(id_trabajo, estado=ERROR, error=str(e), terminado_en=datetime.utcnow())
+    finally:
+        db.close()
@@ -0,0 +1,44 @@
+"""
+Token bucket para limitar las llamadas por segundo al proveedor de mapas.
+"""
+import threading
+import time
+
+
+class TokenBucket:
+    """Permite `rate` operaciones por segundo con ráfagas de hasta `burst`; rate <= 0 es sin límite."""
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = float(rate)
+        self.ilimitado = self.rate <= 0
+        self.capacity = float(burst if burst is not None else max(1.0, self.rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Toma los tokens si hay; si no, devuelve cuántos segundos esperar."""
+        if self.ilimitado:
+            return 0.0
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0, timeout: float = None) -> bool:
+        """Bloquea hasta obtener los tokens. Devuelve False si vence el timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
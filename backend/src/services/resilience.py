@@ -0,0 +1,139 @@
+"""
+Protección frente a un proveedor de mapas degradado: presupuesto global de
+reintentos, backoff exponencial con jitter y circuit breaker por producto.
+"""
+import random
+import threading
+import time
+
+
+class ProviderUnavailable(Exception):
+    """El circuito del producto está abierto: se falla rápido sin llamar al proveedor."""
+
+    def __init__(self, product):
+        super().__init__(f"Proveedor de mapas no disponible ({product})")
+        self.product = product
+
+
+class RetryableResponse(Exception):
+    """Respuesta 200 con estado reintentable (OVER_QUERY_LIMIT, UNKNOWN_ERROR)."""
+
+    def __init__(self, data):
+        super().__init__(data.get("status"))
+        self.data = data
+
+
+def backoff(intento: int, base: float, maximo: float) -> float:
+    """Backoff exponencial con "full jitter": uniforme entre 0 y base·2^intento."""
+    return random.uniform(0, min(maximo, base * (2 ** intento)))
+
+
+class RetryBudget:
+    """Limita los reintentos a una fracción de las peticiones originales.
+
+    Cada petición deposita `ratio` fichas y cada reintento gasta una, así que
+    cuando el proveedor falla en masa los reintentos no multiplican la carga.
+    `min_per_sec` garantiza unos pocos reintentos aunque haya poco tráfico.
+    """
+
+    def __init__(self, ratio=0.2, min_per_sec=1.0, max_tokens=50.0):
+        self.ratio = ratio
+        self.min_per_sec = min_per_sec
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._last) * self.min_per_sec)
+        self._last = now
+
+    def deposit(self):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+class CircuitBreaker:
+    """cerrado → abierto tras `failure_threshold` fallos seguidos; medio_abierto tras `reset_timeout`."""
+
+    CERRADO = "cerrado"
+    ABIERTO = "abierto"
+    MEDIO_ABIERTO = "medio_abierto"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, probe_timeout=None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        # Una prueba sin veredicto más vieja que esto deja de bloquear a las demás
+        self.probe_timeout = reset_timeout if probe_timeout is None else probe_timeout
+        self._state = self.CERRADO
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.ABIERTO and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.MEDIO_ABIERTO
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CERRADO:
+                return True
+            if self._state == self.ABIERTO:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.MEDIO_ABIERTO
+                self._probe_in_flight = False
+            # Medio abierto: solo una petición de prueba a la vez
+            if self._probe_in_flight and time.monotonic() - self._probe_at < self.probe_timeout:
+                return False
+            self._probe_in_flight = True
+            self._probe_at = time.monotonic()
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CERRADO
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.MEDIO_ABIERTO or self._failures >= self.failure_threshold:
+                self._state = self.ABIERTO
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def record_ignored(self):
+        """Respuesta que no dice nada de la salud del proveedor: libera la prueba sin cambiar el estado."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_abandon(self):
+        """La llamada se interrumpió sin respuesta (cancelada): si era la prueba, cuenta como fallo."""
+        with self._lock:
+            if self._state == self.MEDIO_ABIERTO and self._probe_in_flight:
+                self._state = self.ABIERTO
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
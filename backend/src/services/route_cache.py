@@ -0,0 +1,114 @@
+"""
+Caché de rutas optimizadas (POST /rutas/optimizar).
+
+La clave es un hash canónico del conjunto de clientes (ordenado) con sus
+coordenadas, el depósito, el engine de la matriz, `regresar` y la franja
+horaria de la caché de tramos. Al cambiar las coordenadas de un cliente
+cambia la clave, así que la ruta vieja ya no se usa (y expira por TTL).
+
+Cada entrada recuerda con cuánto esfuerzo se resolvió (arranques y
+presupuesto) y solo se sirve a peticiones que no pidan más; una petición
+más exigente la vuelve a resolver y la reemplaza.
+
+Además se guarda, por "familia" (mismo depósito y parámetros), la lista de
+conjuntos resueltos recientemente. Si llega un conjunto que difiere en pocas
+paradas de uno de ellos, su recorrido sirve de arranque para la búsqueda
+local en vez de resolver desde cero.
+"""
+import hashlib
+import json
+import os
+
+from src.services.cache import MISS, TieredCache
+from src.services.leg_cache import franja_horaria
+
+ROUTE_CACHE_TTL = int(os.getenv("ROUTE_CACHE_TTL", str(24 * 3600)))
+# Conjuntos recientes por familia que se revisan para arrancar en caliente
+ROUTE_CACHE_RECIENTES = int(os.getenv("ROUTE_CACHE_RECIENTES", "50"))
+# Paradas añadidas + quitadas que se aceptan para arrancar en caliente
+ROUTE_CACHE_MAX_DIFERENCIA = int(os.getenv("ROUTE_CACHE_MAX_DIFERENCIA", "2"))
+# Subir para invalidar todo tras cambiar el optimizador o la matriz
+ROUTE_CACHE_VERSION = os.getenv("ROUTE_CACHE_VERSION", "1")
+
+route_cache = TieredCache("rutas_opt", maxsize=int(os.getenv("ROUTE_CACHE_LRU_SIZE", "2000")), ttl=ROUTE_CACHE_TTL)
+
+
+def _coord(valor) -> float:
+    return round(float(valor), 6)
+
+
+def _hash(datos) -> str:
+    return hashlib.sha1(json.dumps(datos, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def familia(base, engine: str, regresar: bool) -> str:
+    return _hash({
+        "base": [_coord(base[0]), _coord(base[1])],
+        "engine": engine,
+        "regresar": bool(regresar),
+        "franja": franja_horaria(),
+        "v": ROUTE_CACHE_VERSION,
+    })
+
+
+def clave(fam: str, coords: dict) -> str:
+    """coords: {id_cliente: (lat, lon)}; el orden de entrada no importa."""
+    return _hash({"f": fam, "c": sorted([int(i), _coord(p[0]), _coord(p[1])] for i, p in coords.items())})
+
+
+def buscar(key: str, esfuerzo=None):
+    """esfuerzo: (arranques, presupuesto en s) pedido; None acepta cualquier entrada."""
+    valor = route_cache.get(f"r|{key}")
+    if valor is MISS:
+        return None
+    if esfuerzo is not None:
+        starts, budget = valor.get("esfuerzo", (0, 0.0))
+        if starts < esfuerzo[0] or budget < esfuerzo[1]:
+            return None
+    return valor
+
+
+def guardar(fam: str, key: str, coords: dict, tour: list, resultado: list, esfuerzo=(1, 0.0)):
+    """tour: ids de cliente en orden de visita; resultado: la respuesta ya serializada."""
+    route_cache.set(f"r|{key}", {
+        "coords": {str(i): [_coord(p[0]), _coord(p[1])] for i, p in coords.items()},
+        "tour": [int(i) for i in tour],
+        "resultado": resultado,
+        "esfuerzo": [int(esfuerzo[0]), float(esfuerzo[1])],
+    })
+    recientes = route_cache.get(f"f|{fam}")
+    recientes = [] if recientes is MISS else [r for r in recientes if r[1] != key]
+    recientes.insert(0, [sorted(int(i) for i in coords), key])
+    route_cache.set(f"f|{fam}", recientes[:ROUTE_CACHE_RECIENTES])
+
+
+def tour_cercano(fam: str, coords: dict, esfuerzo=None):
+    """Recorrido cacheado de un conjunto casi igual, solo con los clientes que siguen en `coords`.
+
+    Un cliente que cambió de coordenadas cuenta como quitado y vuelto a
+    añadir: se saca del recorrido y se inserta de nuevo. Con `esfuerzo`
+    solo se parte de entradas resueltas con al menos ese esfuerzo.
+    """
+    recientes = route_cache.get(f"f|{fam}")
+    if recientes is MISS:
+        return None
+    actuales = {int(i) for i in coords}
+    for ids, key in recientes:
+        diferencia = len(actuales.symmetric_difference(ids))
+        if diferencia > ROUTE_CACHE_MAX_DIFERENCIA:
+            continue
+        entrada = buscar(key, esfuerzo)
+        if entrada is None:
+            continue
+        movidos = {
+            i for i in actuales.intersection(ids)
+            if entrada["coords"][str(i)] != [_coord(coords[i][0]), _coord(coords[i][1])]
+        }
+        if diferencia + 2 * len(movidos) > ROUTE_CACHE_MAX_DIFERENCIA:
+            continue
+        return [i for i in entrada["tour"] if i in actuales and i not in movidos]
+    return None
+
+
+def stats():
+    return route_cache.stats()
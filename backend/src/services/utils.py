@@ -1,28 +1,458 @@
+import asyncio
+import json
 import os
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
+from src.services.rate_limit import TokenBucket
+from src.services.resilience import (
+    CircuitBreaker,
+    ProviderUnavailable,
+    RetryableResponse,
+    RetryBudget,
+    backoff,
+)
+
+try:  # cliente asíncrono (y HTTP/2 si además está h2)
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401
+    HAS_H2 = True
+except ImportError:
+    HAS_H2 = False
+
 load_dotenv()
 API_KEY = os.getenv("GOOGLE_API_KEY")
 
-def get(url, params):
+# URLs base del proveedor (apúntalas a benchmarks/stub_server.py para pruebas sin cuota)
+MAPS_BASE_URL = os.getenv("MAPS_BASE_URL", "https://maps.googleapis.com").rstrip("/")
+ROUTES_BASE_URL = os.getenv("ROUTES_BASE_URL", "https://routes.googleapis.com").rstrip("/")
+
+# ============================
+# Cliente HTTP compartido (pool + keep-alive)
+# ============================
+POOL_SIZE = int(os.getenv("MAPS_POOL_SIZE", "20"))
+CONNECT_TIMEOUT = float(os.getenv("MAPS_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("MAPS_READ_TIMEOUT", "15"))
+USE_HTTP2 = os.getenv("MAPS_HTTP2", "1") == "1"
+
+HTTP_ERRORS = (requests.HTTPError,) + ((httpx.HTTPStatusError,) if httpx else ())
+TRANSPORT_ERRORS = (requests.ConnectionError, requests.Timeout) + ((httpx.TransportError,) if httpx else ())
+
+# ============================
+# Límite por producto, reintentos y circuit breaker
+# ============================
+PRODUCTOS = {
+    "geocode": float(os.getenv("MAPS_QPS_GEOCODE", "40")),
+    "directions": float(os.getenv("MAPS_QPS_DIRECTIONS", "40")),
+    "distancematrix": float(os.getenv("MAPS_QPS_DISTANCEMATRIX", "10")),
+    "routes": float(os.getenv("MAPS_QPS_ROUTES", "40")),
+    "otros": float(os.getenv("MAPS_QPS_OTROS", "20")),
+}
+MAX_RETRIES = int(os.getenv("MAPS_MAX_RETRIES", "4"))
+BACKOFF_BASE = float(os.getenv("MAPS_BACKOFF_BASE", "0.25"))
+BACKOFF_MAX = float(os.getenv("MAPS_BACKOFF_MAX", "8"))
+# Si el proveedor está degradado, matrix/directions estiman con haversine
+FALLBACK_LOCAL = os.getenv("MAPS_FALLBACK_LOCAL", "1") == "1"
+
+RETRYABLE_STATUS = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+# Clave mal configurada o sin cuota: no se reintenta, pero el circuito lo cuenta como fallo
+FAILURE_STATUS = {"REQUEST_DENIED", "OVER_DAILY_LIMIT"}
+AUTH_HTTP_STATUS = {401, 403}
+
+rate_limiters = {p: TokenBucket(qps) for p, qps in PRODUCTOS.items()}
+breakers = {
+    p: CircuitBreaker(
+        failure_threshold=int(os.getenv("MAPS_BREAKER_FAILURES", "5")),
+        reset_timeout=float(os.getenv("MAPS_BREAKER_RESET_S", "30")),
+    )
+    for p in PRODUCTOS
+}
+retry_budget = RetryBudget(
+    ratio=float(os.getenv("MAPS_RETRY_BUDGET_RATIO", "0.2")),
+    min_per_sec=float(os.getenv("MAPS_RETRY_BUDGET_MIN_PER_SEC", "1")),
+)
+
+_client = None
+_client_lock = threading.Lock()
+_async_client = None
+_async_client_loop = None
+
+
+def _build_client():
+    if USE_HTTP2 and HAS_H2 and httpx is not None:
+        return httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        )
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_client():
+    """Devuelve el cliente HTTP compartido por geocoding, directions, matrix y computeRoutes.
+
+    Las conexiones se reutilizan entre llamadas, así que solo la primera paga
+    el handshake TCP/TLS.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _build_client()
+    return _client
+
+
+def close_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def _timeout():
+    # httpx ya trae el timeout configurado en el cliente
+    if isinstance(get_client(), requests.Session):
+        return {"timeout": (CONNECT_TIMEOUT, READ_TIMEOUT)}
+    return {}
+
+
+# ============================
+# Single-flight: peticiones idénticas simultáneas comparten una sola llamada
+# ============================
+
+class _Llamada:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_inflight = {}
+_inflight_async = {}
+_inflight_lock = threading.Lock()
+_metrics = {
+    "llamadas_proveedor": 0,
+    "coalescidas": 0,
+    "reintentos": 0,
+    "reintentos_sin_presupuesto": 0,
+    "rechazadas_circuito": 0,
+}
+
+
+def _count(name):
+    with _inflight_lock:
+        _metrics[name] += 1
+
+
+def _request_key(method, url, params=None, body=None):
+    params = {k: v for k, v in (params or {}).items() if k != "key"}
+    return json.dumps([method, url, params, body], sort_keys=True, default=str)
+
+
+def _singleflight(key, fn):
+    with _inflight_lock:
+        llamada = _inflight.get(key)
+        lider = llamada is None
+        if lider:
+            llamada = _inflight[key] = _Llamada()
+            _metrics["llamadas_proveedor"] += 1
+        else:
+            _metrics["coalescidas"] += 1
+
+    if not lider:
+        llamada.event.wait()
+        if llamada.error is not None:
+            raise llamada.error
+        return llamada.result
+
+    try:
+        llamada.result = fn()
+        return llamada.result
+    except BaseException as e:
+        llamada.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        llamada.event.set()
+
+
+async def _singleflight_async(key, coro_fn):
+    loop = asyncio.get_running_loop()
+    futuro = _inflight_async.get(key)
+    if futuro is not None and futuro.get_loop() is loop:
+        _count("coalescidas")
+        return await asyncio.shield(futuro)
+
+    futuro = _inflight_async[key] = loop.create_future()
+    _count("llamadas_proveedor")
+    try:
+        result = await coro_fn()
+        futuro.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        futuro.cancel()
+        raise
+    except BaseException as e:
+        futuro.set_exception(e)
+        futuro.exception()  # evita el aviso "exception was never retrieved" si nadie esperaba
+        raise
+    finally:
+        if _inflight_async.get(key) is futuro:
+            del _inflight_async[key]
+
+
+def metrics():
+    """Contadores del proveedor: llamadas reales y peticiones que se unieron a una en curso."""
+    with _inflight_lock:
+        m = dict(_metrics)
+    total = m["llamadas_proveedor"] + m["coalescidas"]
+    m["ratio_coalescidas"] = round(m["coalescidas"] / total, 4) if total else 0.0
+    m["en_curso"] = len(_inflight) + len(_inflight_async)
+    m["presupuesto_reintentos"] = round(retry_budget.tokens, 2)
+    m["circuitos"] = {p: b.state for p, b in breakers.items()}
+    return m
+
+
+def producto(url: str) -> str:
+    if "computeRoutes" in url:
+        return "routes"
+    for p in ("geocode", "distancematrix", "directions"):
+        if f"/{p}/" in url:
+            return p
+    return "otros"
+
+
+def degradado(product: str) -> bool:
+    """True si el circuito del producto no está cerrado."""
+    return breakers[product].state != CircuitBreaker.CERRADO
+
+
+def _es_reintentable(e) -> bool:
+    if isinstance(e, RetryableResponse):
+        return True
+    if isinstance(e, HTTP_ERRORS):
+        return e.response.status_code == 429 or e.response.status_code >= 500
+    return isinstance(e, TRANSPORT_ERRORS)
+
+
+def _revisar(data):
+    if isinstance(data, dict) and data.get("status") in RETRYABLE_STATUS:
+        raise RetryableResponse(data)
+    return data
+
+
+def _registrar_respuesta(product, data):
+    if isinstance(data, dict) and data.get("status") in FAILURE_STATUS:
+        breakers[product].record_failure()
+    else:
+        breakers[product].record_success()
+
+
+def _registrar_no_reintentable(product, e):
+    """Auth rechazada es fallo del proveedor; otro 4xx (datos malos) no dice nada de su salud."""
+    if isinstance(e, HTTP_ERRORS) and e.response.status_code in AUTH_HTTP_STATUS:
+        breakers[product].record_failure()
+    else:
+        breakers[product].record_ignored()
+
+
+def _fallo(product, e, intento):
+    """Registra el fallo y decide si se reintenta. Devuelve la espera o None."""
+    breakers[product].record_failure()
+    if intento >= MAX_RETRIES or not breakers[product].allow():
+        return None
+    if not retry_budget.withdraw():
+        _count("reintentos_sin_presupuesto")
+        return None
+    _count("reintentos")
+    return backoff(intento, BACKOFF_BASE, BACKOFF_MAX)
+
+
+def _entrar(product):
+    if not breakers[product].allow():
+        _count("rechazadas_circuito")
+        raise ProviderUnavailable(product)
+    retry_budget.deposit()
+
+
+def _con_resiliencia(url, fn):
+    product = producto(url)
+    _entrar(product)
+    intento = 0
+    try:
+        while True:
+            rate_limiters[product].acquire()
+            try:
+                data = _revisar(fn())
+            except Exception as e:
+                if not _es_reintentable(e):
+                    _registrar_no_reintentable(product, e)
+                    raise
+                espera = _fallo(product, e, intento)
+                if espera is None:
+                    if isinstance(e, RetryableResponse):
+                        return e.data
+                    raise
+                time.sleep(espera)
+                intento += 1
+                continue
+            _registrar_respuesta(product, data)
+            return data
+    except BaseException as e:
+        # Cancelada (desconexión del cliente, wait_for, Ctrl-C): no dejar tomada la prueba del circuito
+        if not isinstance(e, Exception):
+            breakers[product].record_abandon()
+        raise
+
+
+async def _con_resiliencia_async(url, coro_fn):
+    product = producto(url)
+    _entrar(product)
+    intento = 0
+    try:
+        while True:
+            espera = rate_limiters[product].try_acquire()
+            while espera:
+                await asyncio.sleep(espera)
+                espera = rate_limiters[product].try_acquire()
+            try:
+                data = _revisar(await coro_fn())
+            except Exception as e:
+                if not _es_reintentable(e):
+                    _registrar_no_reintentable(product, e)
+                    raise
+                espera = _fallo(product, e, intento)
+                if espera is None:
+                    if isinstance(e, RetryableResponse):
+                        return e.data
+                    raise
+                await asyncio.sleep(espera)
+                intento += 1
+                continue
+            _registrar_respuesta(product, data)
+            return data
+    except BaseException as e:
+        # Cancelada (desconexión del cliente, wait_for, Ctrl-C): no dejar tomada la prueba del circuito
+        if not isinstance(e, Exception):
+            breakers[product].record_abandon()
+        raise
+
+
+def _get(url, params):
     params["key"] = API_KEY
     try:
-        response = requests.get(url, params=params)
+        response = get_client().get(url, params=params, **_timeout())
         response.raise_for_status()
-    except requests.HTTPError as e:
+    except HTTP_ERRORS as e:
         print("GET error:", e.response.text)  # ✅ Mensaje de error detallado
         raise
     return response.json()
 
-def post(url, body, headers=None):
+def _post(url, body, headers=None):
     headers = headers or {}
     headers["X-Goog-Api-Key"] = API_KEY
     headers["Content-Type"] = "application/json"
     try:
-        response = requests.post(url, json=body, headers=headers)
+        response = get_client().post(url, json=body, headers=headers, **_timeout())
         response.raise_for_status()
-    except requests.HTTPError as e:
+    except HTTP_ERRORS as e:
         print("POST error:", e.response.text)  # ✅ Mensaje de error detallado
         raise
-    return response.json()
\ No newline at end of file
+    return response.json()
+
+
+def get(url, params):
+    return _singleflight(
+        _request_key("GET", url, params),
+        lambda: _con_resiliencia(url, lambda: _get(url, dict(params))),
+    )
+
+def post(url, body, headers=None):
+    key = _request_key("POST", url, {"headers": headers}, body)
+    return _singleflight(
+        key,
+        lambda: _con_resiliencia(url, lambda: _post(url, body, dict(headers or {}))),
+    )
+
+
+# ============================
+# Versión asíncrona (no bloquea el event loop)
+# ============================
+
+def get_async_client():
+    """Cliente httpx.AsyncClient compartido, uno por event loop."""
+    global _async_client, _async_client_loop
+    if httpx is None:
+        raise RuntimeError("httpx no está instalado: pip install httpx")
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        _async_client = httpx.AsyncClient(
+            http2=USE_HTTP2 and HAS_H2,
+            limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        )
+        _async_client_loop = loop
+    return _async_client
+
+
+async def close_async_client():
+    global _async_client, _async_client_loop
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+        _async_client_loop = None
+
+
+async def _aget(url, params):
+    params["key"] = API_KEY
+    try:
+        response = await get_async_client().get(url, params=params)
+        response.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        print("GET error:", e.response.text)
+        raise
+    return response.json()
+
+
+async def _apost(url, body, headers=None):
+    headers = headers or {}
+    headers["X-Goog-Api-Key"] = API_KEY
+    headers["Content-Type"] = "application/json"
+    try:
+        response = await get_async_client().post(url, json=body, headers=headers)
+        response.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        print("POST error:", e.response.text)
+        raise
+    return response.json()
+
+
+async def aget(url, params):
+    return await _singleflight_async(
+        _request_key("GET", url, params),
+        lambda: _con_resiliencia_async(url, lambda: _aget(url, dict(params))),
+    )
+
+
+async def apost(url, body, headers=None):
+    key = _request_key("POST", url, {"headers": headers}, body)
+    return await _singleflight_async(
+        key,
+        lambda: _con_resiliencia_async(url, lambda: _apost(url, body, dict(headers or {}))),
+    )
@@ -0,0 +1,15 @@
+-- ============================================
+-- 🚚 PROYECTO: RUTAS DE ENTREGA - MIGRACIÓN
+-- Archivo 3: Frescura de coordenadas de clientes
+-- ============================================
+
+USE ruta_de_entrega;
+
+ALTER TABLE clientes
+    ADD COLUMN coords_actualizadas_en DATETIME NULL,
+    ADD COLUMN coords_origen VARCHAR(20) NULL;
+
+-- Las coordenadas existentes se consideran capturadas a mano
+UPDATE clientes
+SET coords_origen = 'manual', coords_actualizadas_en = NOW()
+WHERE latitud IS NOT NULL AND longitud IS NOT NULL;
@@ -0,0 +1,11 @@
+-- ============================================
+-- 🚚 PROYECTO: RUTAS DE ENTREGA - MIGRACIÓN
+-- Archivo 4: Orden de visita de las entregas
+-- ============================================
+
+USE ruta_de_entrega;
+
+ALTER TABLE entregas
+    ADD COLUMN orden INT NULL;
+
+CREATE INDEX idx_entregas_fecha_estado ON entregas (fecha_entrega, estado);
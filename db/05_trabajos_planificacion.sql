@@ -0,0 +1,26 @@
+-- ============================================
+-- 🚚 PROYECTO: RUTAS DE ENTREGA - MIGRACIÓN
+-- Archivo 5: Trabajos de planificación en segundo plano
+-- ============================================
+
+USE ruta_de_entrega;
+
+CREATE TABLE trabajos_planificacion (
+    id_trabajo INT AUTO_INCREMENT PRIMARY KEY,
+    fecha DATE,
+    clave VARCHAR(64),
+    parametros TEXT,
+    estado VARCHAR(20) DEFAULT 'pendiente',
+    etapa VARCHAR(30) NULL,
+    progreso INT DEFAULT 0,
+    resultado LONGTEXT NULL,
+    rutas_guardadas TEXT NULL,
+    error TEXT NULL,
+    intentos INT DEFAULT 0,
+    creado_en DATETIME DEFAULT CURRENT_TIMESTAMP,
+    iniciado_en DATETIME NULL,
+    terminado_en DATETIME NULL,
+    INDEX idx_trabajos_fecha (fecha),
+    UNIQUE INDEX idx_trabajos_clave (clave),
+    INDEX idx_trabajos_estado (estado)
+);
@@ -92,7 +92,7 @@ export default function RutaOptimizar() {
                 <span className="text-gray-600">{punto.direccion}</span>
                 <br />
                 <span className="text-sm text-gray-500">
-                  {punto.distancia_km} km — {punto.duracion_min} min
+                  {punto.distancia_km ?? "sin ruta"} km — {punto.duracion_min ?? "sin ruta"} min
                 </span>
               </li>
             ))}